@@ -0,0 +1,313 @@
+"""Factum — пакетная обработка без GUI.
+
+Обрабатывает много наборов документов (по одному на единицу оборудования)
+тем же 6-этапным pipeline, что и GUI, с параллельными заданиями.
+
+Источник заданий:
+    - корневая папка: каждая подпапка — одна единица оборудования
+      (файлы собираются рекурсивно; папки на "." и "_" пропускаются);
+      если подпапок с документами нет — вся папка одно задание;
+    - манифест JSON: список объектов
+      {"name": "...", "folder": "..."} или {"name": "...", "files": [...]},
+      необязательно "output": путь к карточке. Относительные пути —
+      от папки манифеста.
+
+Примеры:
+    python batch.py D:/Оборудование --jobs 3 --output-dir D:/Карточки
+    python batch.py --manifest jobs.json --summary итог.json
+    python batch.py D:/Оборудование --dry-run   # оценка без запросов к API
+    python batch.py D:/Оборудование --max-minutes 20   # бюджет на задание
+    python batch.py D:/Оборудование --no-incremental   # без прошлого анализа карточек
+
+Код возврата: 0 — все задания успешны, 1 — есть ошибки,
+2 — ошибка аргументов, 130 — прервано (Ctrl+C).
+"""
+
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+# Добавить корень проекта в PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import load_config
+from scanner.folder_scanner import ScannedFile, scan_path
+from gemini.quota import PRIORITY_BATCH
+from pipeline import Pipeline
+from processing.estimate import ThroughputHistory, estimate_batch_seconds, estimate_job
+
+logger = logging.getLogger("factum.batch")
+
+
+@dataclass
+class BatchJob:
+    """Одно задание: набор файлов одной единицы оборудования."""
+    name: str
+    files: list[ScannedFile]
+    output_path: Path
+    # Результат
+    status: str = "ожидает"  # ожидает, успешно, ошибка, пропущено, отменено
+    error: str = ""
+    seconds: float = 0.0
+
+
+def _scan_tree(folder: Path) -> list[ScannedFile]:
+    """Поддерживаемые файлы папки и всех вложенных папок."""
+    files = scan_path(folder)
+    for sub in sorted(p for p in folder.rglob("*") if p.is_dir()):
+        if not any(part.startswith((".", "_")) for part in sub.relative_to(folder).parts):
+            files.extend(scan_path(sub))
+    return files
+
+
+def _card_path(output_dir: Path, name: str) -> Path:
+    safe = re.sub(r'[<>:"/\\|?*]+', "_", name).strip() or "Карточка"
+    return output_dir / f"{safe}.docx"
+
+
+def discover_jobs(root: Path, output_dir: Path) -> list[BatchJob]:
+    """Задания из корневой папки: по одному на подпапку с документами."""
+    jobs = []
+    for folder in sorted(p for p in root.iterdir() if p.is_dir()):
+        if folder.name.startswith((".", "_")):
+            continue
+        files = _scan_tree(folder)
+        if files:
+            jobs.append(BatchJob(folder.name, files, _card_path(output_dir, folder.name)))
+        else:
+            logger.warning(f"Папка без поддерживаемых документов пропущена: {folder}")
+
+    if not jobs:
+        files = scan_path(root)
+        if files:
+            jobs.append(BatchJob(root.name, files, _card_path(output_dir, root.name)))
+    return jobs
+
+
+def load_manifest(path: Path, output_dir: Path) -> list[BatchJob]:
+    """Задания из JSON-манифеста."""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError("Манифест должен быть списком заданий")
+
+    base = path.parent
+    jobs = []
+    for n, entry in enumerate(entries, 1):
+        if "folder" in entry:
+            folder = base / entry["folder"]
+            files = _scan_tree(folder)
+            name = entry.get("name") or folder.name
+        else:
+            files = []
+            for item in entry.get("files", []):
+                files.extend(scan_path(base / item))
+            name = entry.get("name") or f"Задание_{n}"
+        output = base / entry["output"] if entry.get("output") else _card_path(output_dir, name)
+        if not files:
+            logger.warning(f"Задание {name}: нет поддерживаемых документов, пропущено")
+            continue
+        jobs.append(BatchJob(name, files, output))
+    return jobs
+
+
+def run_job(job: BatchJob, pipeline: Pipeline) -> BatchJob:
+    """Выполнить задание и записать в него итог."""
+    started = time.monotonic()
+    result = pipeline.run()
+    job.seconds = time.monotonic() - started
+    if result.success:
+        job.status = "успешно"
+    elif pipeline.cancelled:
+        job.status = "отменено"
+        job.error = result.error
+    else:
+        job.status = "ошибка"
+        job.error = result.error
+    return job
+
+
+def print_summary(jobs: list[BatchJob], elapsed: float) -> None:
+    """Итоговая таблица заданий."""
+    width = max([len(j.name) for j in jobs] + [7])
+    print()
+    print(f"{'Задание':<{width}}  {'Статус':<9}  {'Время':>8}  Карточка / ошибка")
+    print("-" * (width + 40))
+    for job in jobs:
+        detail = job.error if job.error else str(job.output_path)
+        print(f"{job.name:<{width}}  {job.status:<9}  {job.seconds:>7.0f}с  {detail}")
+    print("-" * (width + 40))
+
+    counts: dict[str, int] = {}
+    for job in jobs:
+        counts[job.status] = counts.get(job.status, 0) + 1
+    totals = ", ".join(f"{status}: {n}" for status, n in counts.items())
+    print(f"Заданий: {len(jobs)} ({totals}). Общее время: {elapsed:.0f} с")
+
+
+def write_summary(path: Path, jobs: list[BatchJob]) -> None:
+    data = [
+        {
+            "name": job.name,
+            "status": job.status,
+            "output": str(job.output_path),
+            "error": job.error,
+            "seconds": round(job.seconds, 1),
+            "files": [str(f.path) for f in job.files],
+        }
+        for job in jobs
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def print_estimates(jobs: list[BatchJob], config: dict, parallel: int) -> None:
+    """Прогноз по заданиям и по пакету целиком (dry run)."""
+    history = ThroughputHistory().load()
+    estimates = [estimate_job(job.files, config, history) for job in jobs]
+    width = max([len(j.name) for j in jobs] + [7])
+    print()
+    print(f"{'Задание':<{width}}  {'Страниц':>7}  {'Чанков':>6}  {'Запросов':>8}  "
+          f"{'Токенов, вход':>13}  {'$':>7}  {'Время':>8}")
+    print("-" * (width + 62))
+    for job, e in zip(jobs, estimates):
+        print(f"{job.name:<{width}}  {e.pages:>7}  {e.chunks:>6}  {e.calls:>8}  "
+              f"{e.input_tokens:>13}  {e.cost:>7.2f}  {e.seconds / 60:>4.0f} мин")
+    print("-" * (width + 62))
+
+    seconds = estimate_batch_seconds(estimates, parallel, config.get("api_max_concurrency", 4))
+    print(f"Итого: страниц {sum(e.pages for e in estimates)}, запросов ~{sum(e.calls for e in estimates)}, "
+          f"токенов ~{sum(e.input_tokens + e.output_tokens for e in estimates)}, "
+          f"~${sum(e.cost for e in estimates):.2f}")
+    print(f"Время пакета при --jobs {parallel}: ~{seconds / 60:.0f} мин")
+    if estimates:
+        print(estimates[0].summary()[-1])
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="batch.py",
+        description="Factum: пакетный анализ документации оборудования без GUI.",
+    )
+    parser.add_argument("root", nargs="?", type=Path,
+                        help="Корневая папка: подпапка = единица оборудования")
+    parser.add_argument("--manifest", type=Path, help="JSON-манифест заданий вместо папки")
+    parser.add_argument("--output-dir", type=Path,
+                        help="Папка для карточек (по умолчанию output_dir из конфигурации или ./cards)")
+    parser.add_argument("--jobs", type=int, default=2, help="Параллельных заданий (по умолчанию 2)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Продолжить прерванные задания по контрольным точкам")
+    parser.add_argument("--no-incremental", action="store_true",
+                        help="Анализировать заново, не используя прошлый анализ карточек")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="Пропустить задания, для которых карточка уже есть")
+    parser.add_argument("--summary", type=Path, help="Сохранить итог в JSON")
+    parser.add_argument("--max-minutes", type=float,
+                        help="Бюджет времени на задание, мин (по умолчанию job_time_budget_minutes)")
+    parser.add_argument("--max-tokens", type=int,
+                        help="Бюджет токенов на задание (по умолчанию job_token_budget)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Только оценка: страницы, запросы, токены, стоимость, время")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Подробный лог этапов")
+    args = parser.parse_args(argv)
+    if (args.root is None) == (args.manifest is None):
+        parser.error("укажите корневую папку или --manifest (одно из двух)")
+    if args.jobs < 1:
+        parser.error("--jobs должно быть не меньше 1")
+    if (args.max_minutes or 0) < 0 or (args.max_tokens or 0) < 0:
+        parser.error("бюджет задания не может быть отрицательным")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%H:%M:%S",
+    )
+
+    config = load_config()
+    if args.max_minutes is not None:
+        config["job_time_budget_minutes"] = args.max_minutes
+    if args.max_tokens is not None:
+        config["job_token_budget"] = args.max_tokens
+    if not config.get("api_key") and not args.dry_run:
+        logger.error("API ключ не настроен (~/.factum/config.json, поле \"api_key\")")
+        return 1
+
+    output_dir = args.output_dir or Path(config.get("output_dir") or "cards")
+    if not args.dry_run:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    try:
+        if args.manifest:
+            jobs = load_manifest(args.manifest, output_dir)
+        else:
+            jobs = discover_jobs(args.root, output_dir)
+    except (OSError, ValueError) as e:
+        logger.error(f"Не удалось получить список заданий: {e}")
+        return 1
+    if not jobs:
+        logger.error("Заданий не найдено")
+        return 1
+
+    pending = []
+    for job in jobs:
+        if args.skip_existing and job.output_path.exists():
+            job.status = "пропущено"
+            continue
+        pending.append(job)
+    logger.info(f"Заданий: {len(jobs)}, к обработке: {len(pending)}, параллельно: {args.jobs}")
+    if args.dry_run:
+        print_estimates(pending, config, args.jobs)
+        return 0
+
+    pipelines: list[Pipeline] = []
+    for job in pending:
+        job.output_path.parent.mkdir(parents=True, exist_ok=True)
+        pipelines.append(Pipeline(
+            job.files, job.output_path, resume=args.resume, config=config,
+            priority=PRIORITY_BATCH, incremental=not args.no_incremental,
+            on_log=lambda message, name=job.name: logger.info(f"[{name}] {message.strip()}"),
+        ))
+
+    started = time.monotonic()
+    interrupted = False
+    pool = ThreadPoolExecutor(max_workers=args.jobs, thread_name_prefix="job")
+    futures = {
+        pool.submit(run_job, job, pipeline): job for job, pipeline in zip(pending, pipelines)
+    }
+    try:
+        for future in as_completed(futures):
+            job = future.result()
+            logger.info(f"[{job.name}] {job.status} за {job.seconds:.0f} с {job.error}".rstrip())
+    except KeyboardInterrupt:
+        interrupted = True
+        logger.warning("Прервано — отмена заданий (результаты сохранены в контрольных точках)")
+        for future in futures:
+            future.cancel()
+        for pipeline in pipelines:
+            pipeline.cancel()
+    pool.shutdown(wait=True)
+    for future, job in futures.items():
+        if future.cancelled():
+            job.status = "отменено"
+
+    print_summary(jobs, time.monotonic() - started)
+    if args.summary:
+        write_summary(args.summary, jobs)
+
+    if interrupted:
+        return 130
+    return 1 if any(job.status in ("ошибка", "отменено") for job in jobs) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
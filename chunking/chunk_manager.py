@@ -1,11 +1,11 @@
 """Управление чанками: создание из разных форматов, метаинформация."""
 
 from pathlib import Path
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 
 from scanner.folder_scanner import ScannedFile
 from scanner.file_classifier import classify_file
-from chunking.pdf_chunker import split_pdf, PdfChunk
+from chunking.pdf_chunker import split_pdf, extract_page_range, PdfChunk
 
 
 @dataclass
@@ -103,3 +103,45 @@ def create_chunks(files: list[ScannedFile], chunk_size: int = 7, overlap: int =
             ))
 
     return chunks
+
+
+def split_chunk(chunk: Chunk) -> list[Chunk]:
+    """Разделить PDF-чанк пополам по диапазону страниц.
+
+    Используется, когда ответ Gemini на чанк обрезан по лимиту выходных
+    токенов: каждая половина обрабатывается отдельно вместо исходного чанка.
+
+    Returns:
+        Две половины чанка, или пустой список, если делить нечего
+        (не PDF или одна страница).
+    """
+    if (chunk.file_format != "PDF" or not isinstance(chunk.data, bytes)
+            or chunk.page_start is None or chunk.page_end is None
+            or chunk.page_end <= chunk.page_start):
+        return []
+
+    mid = (chunk.page_start + chunk.page_end) // 2
+    halves = []
+    for start, end in ((chunk.page_start, mid), (mid + 1, chunk.page_end)):
+        data = extract_page_range(
+            chunk.data,
+            from_page=start - chunk.page_start,
+            to_page=end - chunk.page_start,
+        )
+        halves.append(replace(chunk, page_start=start, page_end=end, data=data))
+    return halves
+
+
+def head_chunk(chunk: Chunk, pages: int) -> Chunk:
+    """Первые pages страниц PDF-чанка (для быстрого определения контекста).
+
+    Не-PDF чанки и чанки не длиннее pages возвращаются как есть.
+    """
+    if (chunk.file_format != "PDF" or not isinstance(chunk.data, bytes)
+            or chunk.page_start is None or chunk.page_end is None
+            or chunk.page_end - chunk.page_start + 1 <= pages):
+        return chunk
+
+    end = chunk.page_start + pages - 1
+    data = extract_page_range(chunk.data, from_page=0, to_page=pages - 1)
+    return replace(chunk, page_end=end, data=data)
@@ -47,12 +47,7 @@ def split_pdf(path: Path, chunk_size: int = 7, overlap: int = 2) -> list[PdfChun
     total_pages = len(doc)
     chunks = []
 
-    # Шаг сдвига: chunk_size минус overlap
-    step = max(1, chunk_size - overlap)
-
-    for start_idx in range(0, total_pages, step):
-        end_idx = min(start_idx + chunk_size - 1, total_pages - 1)
-
+    for start_idx, end_idx in chunk_ranges(total_pages, chunk_size, overlap):
         chunk_doc = fitz.open()
         chunk_doc.insert_pdf(doc, from_page=start_idx, to_page=end_idx)
 
@@ -67,9 +62,57 @@ def split_pdf(path: Path, chunk_size: int = 7, overlap: int = 2) -> list[PdfChun
             total_pages=total_pages,
         ))
 
+    doc.close()
+    return chunks
+
+
+def chunk_ranges(total_pages: int, chunk_size: int = 7, overlap: int = 2) -> list[tuple[int, int]]:
+    """Границы чанков split_pdf: пары (первая, последняя страница), 0-based."""
+    ranges = []
+
+    # Шаг сдвига: chunk_size минус overlap
+    step = max(1, chunk_size - overlap)
+
+    for start_idx in range(0, total_pages, step):
+        end_idx = min(start_idx + chunk_size - 1, total_pages - 1)
+        ranges.append((start_idx, end_idx))
+
         # Если дошли до конца — не создаём лишний чанк
         if end_idx >= total_pages - 1:
             break
 
+    return ranges
+
+
+def page_count(path: Path) -> int:
+    """Число страниц PDF без нарезки."""
+    with fitz.open(str(path)) as doc:
+        return len(doc)
+
+
+def extract_page_range(pdf_bytes: bytes, from_page: int, to_page: int) -> bytes:
+    """Вырезать диапазон страниц из PDF, заданного байтами.
+
+    Args:
+        pdf_bytes: Содержимое PDF (например, данные чанка).
+        from_page: Первая страница (0-based, внутри pdf_bytes).
+        to_page: Последняя страница (0-based, включительно).
+
+    Returns:
+        Байты нового PDF только с указанными страницами.
+    """
+    src = fitz.open(stream=pdf_bytes, filetype="pdf")
+    part = fitz.open()
+    part.insert_pdf(src, from_page=from_page, to_page=to_page)
+    result = part.tobytes()
+    part.close()
+    src.close()
+    return result
+
+
+def page_texts(pdf_bytes: bytes) -> list[str]:
+    """Текстовый слой каждой страницы PDF (пустая строка для сканов без текста)."""
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    texts = [page.get_text() for page in doc]
     doc.close()
-    return chunks
+    return texts
@@ -24,6 +24,7 @@ SUPPORTED_EXTENSIONS = {
 }
 
 FIXED_MODEL = "gemini-2.5-pro"
+FAST_MODEL = "gemini-2.5-flash"  # Контекст и первый проход при маршрутизации моделей
 
 DEFAULT_CONFIG = {
     "api_key": "",
@@ -31,6 +32,79 @@ DEFAULT_CONFIG = {
     "chunk_size": 10,
     "overlap": 2,
     "output_dir": "",
+    # Параллельные узкие запросы по группам чек-листа вместо одного на весь чек-лист
+    "sharded_extraction": False,
+    "extraction_shards": [["A", "B"], ["C"], ["D"], ["E", "F"], ["G", "H"]],
+    # Маршрутизация: быстрая модель для разведки, FIXED_MODEL — для плотных чанков.
+    # False — все запросы принудительно идут в FIXED_MODEL.
+    "model_routing": True,
+    "fast_model": FAST_MODEL,
+    "routing_dense_fields": 8,
+    "routing_low_confidence_share": 0.3,
+    # Контекст определяется по первым страницам файлов параллельно с упреждающим
+    # извлечением паспортов; чанки с параметрами D–F затем повторяются с контекстом
+    "pipelined_context": True,
+    "context_pages": 3,
+    # Досрочное завершение этапа 3: чанки, которые уже не могут изменить карточку
+    # по иерархии источников — "off" / "skip" (пропустить) / "defer" (в конец очереди).
+    # "skip" теряет расхождения с источниками ниже рангом (пометки КОНФЛИКТ в карточке)
+    "early_stop": "off",
+    "early_stop_keep_ties": True,  # Источник того же ранга может дать расхождение — не пропускать
+    "early_stop_max_skip": 0,  # Лимит пропущенных чанков, 0 — без ограничения
+    # Локальное извлечение шаблонных параметров (напряжение, мощность, IP, масса, габариты,
+    # микроклимат) по текстовому слою: "off" / "reduce" (надёжно найденные не запрашиваются
+    # у модели) / "skip" (+ чанки, целиком разобранные локально, не отправляются)
+    "local_extraction": "reduce",
+    # Проверка цитат по текстовому слою перед верификацией: подтверждённые параметры
+    # не перепроверяются моделью, страницы исправляются, ненайденные помечаются
+    "local_quote_check": True,
+    # Полнотекстовый индекс страниц в ~/.factum/page_index.db (поиск страниц по словам);
+    # документы, не встречавшиеся дольше page_index_days дней, удаляются
+    "page_index": True,
+    "page_index_days": 90,
+    # Целевой поиск пропущенных параметров по страницам-кандидатам из индекса: "off" /
+    # "fill" (перед полной верификацией) / "replace" (пропуски не требуют верификации моделью:
+    # без неё не ищутся косвенные параметры, не проверяются OCR и суммирование мощности D.1)
+    "gap_fill": "fill",
+    "gap_fill_max_requests": 8,  # Целевых запросов на задание
+    # Порядок этапа 3: "priority" — по ожидаемой отдаче, "file" — в порядке файлов
+    "chunk_order": "priority",
+    # Промежуточное превью карточки на этапе 3: не чаще раза в N секунд, 0 — отключить
+    "live_preview_interval": 5.0,
+    # Контрольные точки в ~/.factum/jobs: прерванный анализ можно продолжить
+    "checkpoints": True,
+    # Проект карточки в ~/.factum/projects: при добавлении/удалении файлов
+    # извлекаются только новые файлы, верификация — по добавленным документам
+    "incremental_projects": True,
+    # Общий для всех заданий лимит одновременных запросов к Gemini API
+    "api_max_concurrency": 4,
+    # Чанков одного задания в работе одновременно на этапе 3
+    "extraction_concurrency": 4,
+    # Автомат защиты API: после N сбоев сети/сервера подряд запросы не
+    # отправляются (ждут паузу, при затянувшемся сбое чанк пропускается),
+    # через паузу — пробный запрос
+    "circuit_failure_threshold": 5,
+    "circuit_cooldown_seconds": 30,
+    # Бюджет задания: предельное время (мин) и токены (вход + выход), 0 — без ограничения.
+    # Чанки идут по убыванию отдачи; не вошедшие в бюджет перечисляются в примечаниях
+    "job_time_budget_minutes": 0,
+    "job_token_budget": 0,
+    "budget_reserve_share": 0.2,  # Доля бюджета на верификацию и DOCX
+    "budget_downgrade_share": 0.6,  # После этой доли — быстрая модель без эскалации
+    # Цены API для предварительной оценки задания: USD за 1 млн токенов [вход, выход]
+    "api_prices": {
+        FIXED_MODEL: [1.25, 10.0],
+        FAST_MODEL: [0.30, 2.50],
+    },
+    # HTTP-сервис заданий (serve.py): адрес, число воркеров, лимит загрузки
+    "service_host": "127.0.0.1",
+    "service_port": 8765,
+    "service_workers": 2,
+    "service_max_upload_mb": 500,
+    # Аренда задания узлом сервиса: срок (продлевается heartbeat-ом) и число
+    # попыток, после которого задание с упавших узлов считается ошибочным
+    "service_lease_seconds": 60,
+    "service_max_attempts": 3,
 }
 
 
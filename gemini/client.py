@@ -1,66 +1,226 @@
-"""Обёртка Gemini API: загрузка файлов, запросы с retry, structured output."""
+"""Обёртка Gemini API: загрузка файлов, запросы с retry, structured output.
 
-import json
-import time
+Запросы асинхронные (client.aio): методы клиента — корутины, ожидание
+повтора — asyncio.sleep, поэтому отмена задачи прерывает и запрос в
+работе, и паузу перед повтором.
+"""
+
+import asyncio
 import logging
+import threading
+from contextvars import ContextVar
+from functools import lru_cache
 from pathlib import Path
 
 from google import genai
 from google.genai import types
 
-from gemini.schema import ChunkExtraction, CHECKLIST_FIELDS
+from gemini.schema import ChunkExtraction, CHECKLIST_FIELDS, SECTION_GROUPS
+from gemini.json_salvage import salvage_json, salvage_fields
+from gemini.wire import FIELD_TO_PARAM_ID, decode_extraction
+from gemini.routing import ModelRouter, RoutingDecision
+from gemini.quota import QuotaJob, get_scheduler
+from gemini.errors import (
+    AUTH, NON_RETRYABLE, OVERSIZE, QUOTA, TRANSIENT, ApiError, CircuitOpenError, classify_error,
+    get_breaker,
+)
 from gemini.prompts import (
     CONTEXT_SYSTEM_PROMPT,
     EXTRACTION_SYSTEM_PROMPT,
     VERIFICATION_SYSTEM_PROMPT,
     make_context_prompt,
     make_extraction_prompt,
+    make_extraction_system_prompt,
     make_verification_prompt,
 )
-from chunking.chunk_manager import Chunk
+from chunking.chunk_manager import Chunk, split_chunk
 
 logger = logging.getLogger(__name__)
 
+# Состояние последнего запроса — своё у каждой задачи asyncio,
+# т.к. запросы разных чанков и групп выполняются одновременно
+_last_error: ContextVar[str] = ContextVar("gemini_last_error", default="")
+_last_truncated: ContextVar[bool] = ContextVar("gemini_last_truncated", default=False)
+_last_repairs: ContextVar[list[str] | None] = ContextVar("gemini_last_repairs", default=None)
+_last_route: ContextVar[str] = ContextVar("gemini_last_route", default="")
+_last_error_kind: ContextVar[str] = ContextVar("gemini_last_error_kind", default="")
+
 MAX_RETRIES = 3
 RETRY_DELAY_BASE = 5  # seconds
-
-# Маппинг param_id → имя поля в ChunkExtraction (для fallback-конвертации)
-_PARAM_ID_TO_FIELD = {}
-for _field_name, _label in CHECKLIST_FIELDS:
-    # "A.1. Наименование..." → "A.1"
-    _param_id = _label.split(".")[0] + "." + _label.split(".")[1].split(" ")[0] if "." in _label else ""
-    _param_id = _param_id.strip()
-    _PARAM_ID_TO_FIELD[_param_id] = _field_name
-    # Также без пробелов
-    _PARAM_ID_TO_FIELD[_param_id.replace(" ", "")] = _field_name
-
-
-def _convert_list_to_dict(raw_list: list) -> dict:
-    """Конвертировать список [{param_id: 'A.1', value: ...}] в словарь {a1_name: ...}."""
-    result = {}
-    for item in raw_list:
-        if not isinstance(item, dict):
+_CIRCUIT_MIN_WAIT = 0.05  # seconds: пауза, если пробный запрос уже идёт
+
+# Виды запросов для учёта токенов (GeminiClient.usage_by_stage)
+STAGE_CONTEXT = "context"
+STAGE_EXTRACTION = "extraction"
+STAGE_VERIFICATION = "verification"
+
+
+@lru_cache(maxsize=None)
+def _extraction_system_prompt(groups: tuple[str, ...] | None) -> str:
+    """System prompt извлечения для набора групп (кэшируется)."""
+    if groups is None:
+        return EXTRACTION_SYSTEM_PROMPT
+    return make_extraction_system_prompt(list(groups))
+
+
+def _group_fields(groups: list[str]) -> set[str]:
+    """Имена полей ChunkExtraction, входящих в указанные группы чек-листа."""
+    return {f for g in groups for f in SECTION_GROUPS[g][1]}
+
+
+def _replace_group_values(results: list[tuple[Chunk, ChunkExtraction]],
+                          fresh: list[tuple[Chunk, ChunkExtraction]],
+                          fields: set[str]) -> list[tuple[Chunk, ChunkExtraction]]:
+    """Заменить значения полей fields в results значениями из fresh.
+
+    Пары остаются по одной на часть чанка: значение из fresh переносится
+    в часть с тем же диапазоном страниц, иначе — в часть, содержащую его
+    страницу (номер страницы пересчитывается от начала этой части).
+    Часть fresh, не пересекающаяся ни с одной частью results, добавляется.
+    """
+    for _, extraction in results:
+        for field_name in fields:
+            setattr(extraction, field_name, None)
+
+    merged = list(results)
+    for fresh_part, fresh_extraction in fresh:
+        same = next((pair for pair in merged if _same_range(pair[0], fresh_part)), None)
+        overlapping = [pair for pair in merged if _overlaps(pair[0], fresh_part)]
+        if same is None and not overlapping:
+            merged.append((fresh_part, fresh_extraction))
             continue
-        param_id = item.get("param_id", "").strip()
-        field_name = _PARAM_ID_TO_FIELD.get(param_id)
-        if field_name:
-            # Убираем param_id из объекта, оставляем value и source
-            entry = {k: v for k, v in item.items() if k != "param_id"}
-            result[field_name] = entry
-        else:
-            logger.warning(f"Неизвестный param_id: {param_id}")
-    return result
+        for field_name in fields:
+            value = getattr(fresh_extraction, field_name)
+            if value is None:
+                continue
+            page = None
+            if value.source.page is not None and fresh_part.page_start is not None:
+                page = fresh_part.page_start + value.source.page - 1
+            target = same or next(
+                (pair for pair in overlapping
+                 if page is not None and pair[0].page_start <= page <= pair[0].page_end),
+                overlapping[0],
+            )
+            part, extraction = target
+            if getattr(extraction, field_name) is not None:
+                continue  # Уже перенесено из другой части fresh
+            value = value.model_copy(deep=True)
+            if page is not None and part.page_start is not None:
+                value.source.page = page - part.page_start + 1
+            setattr(extraction, field_name, value)
+    return merged
+
+
+def _same_range(a: Chunk, b: Chunk) -> bool:
+    return (a.source_file, a.page_start, a.page_end) == (b.source_file, b.page_start, b.page_end)
+
+
+def _overlaps(a: Chunk, b: Chunk) -> bool:
+    if a.source_file != b.source_file:
+        return False
+    if a.page_start is None or b.page_start is None:
+        return a.page_start == b.page_start
+    return a.page_start <= b.page_end and b.page_start <= a.page_end
+
+
+class _RequestFailed(Exception):
+    """Ошибка запроса к API с её классом (gemini.errors)."""
+
+    def __init__(self, kind: str, error: Exception):
+        super().__init__(str(error))
+        self.kind = kind
+
+
+def _empty_usage() -> dict:
+    return {"calls": 0, "input_tokens": 0, "output_tokens": 0}
+
+
+def _is_truncated(response) -> bool:
+    """Ответ остановлен по лимиту выходных токенов (finish_reason = MAX_TOKENS)."""
+    candidates = getattr(response, "candidates", None) or []
+    if not candidates:
+        return False
+    return candidates[0].finish_reason == types.FinishReason.MAX_TOKENS
 
 
 class GeminiClient:
     """Клиент для работы с Gemini API."""
 
-    def __init__(self, api_key: str, model: str = "gemini-2.5-flash"):
+    def __init__(self, api_key: str, model: str = "gemini-2.5-flash",
+                 shards: list[list[str]] | None = None,
+                 router: ModelRouter | None = None,
+                 quota: QuotaJob | None = None):
+        """
+        Args:
+            api_key: Ключ Gemini API.
+            model: Модель (если маршрутизация не задана или отключена).
+            shards: Разбиение чек-листа на группы для параллельных узких
+                запросов к одному чанку (например, [["A", "B"], ["C"], ...]).
+                None — один запрос на весь чек-лист.
+            router: Маршрутизатор быстрой/сильной модели. None — всё через model.
+            quota: Задание в общем планировщике запросов (gemini.quota).
+                None — запросы без общей очереди и лимита.
+        """
         self.client = genai.Client(api_key=api_key)
         self.model = model
-        self.last_error: str = ""  # Последняя ошибка для отображения в GUI
-
-    def determine_equipment_context(self, first_chunks: list[Chunk]) -> dict | None:
+        self.shards = shards
+        self.router = router
+        self.quota = quota
+        self._usage_lock = threading.Lock()
+        # Накопленный расход токенов (по usage_metadata ответов): всего и по видам запросов
+        self.usage = _empty_usage()
+        self.usage_by_stage: dict[str, dict] = {}
+
+    @property
+    def last_error(self) -> str:
+        """Последняя ошибка для отображения в GUI."""
+        return _last_error.get()
+
+    @last_error.setter
+    def last_error(self, value: str) -> None:
+        _last_error.set(value)
+
+    @property
+    def last_error_kind(self) -> str:
+        """Класс последней ошибки API (gemini.errors), "" — ошибки не было."""
+        return _last_error_kind.get()
+
+    @last_error_kind.setter
+    def last_error_kind(self, value: str) -> None:
+        _last_error_kind.set(value)
+
+    @property
+    def last_truncated(self) -> bool:
+        """Последний ответ обрезан по лимиту выходных токенов."""
+        return _last_truncated.get()
+
+    @last_truncated.setter
+    def last_truncated(self, value: bool) -> None:
+        _last_truncated.set(value)
+
+    @property
+    def last_repairs(self) -> list[str]:
+        """Исправления JSON последнего ответа."""
+        repairs = _last_repairs.get()
+        if repairs is None:
+            repairs = []
+            _last_repairs.set(repairs)
+        return repairs
+
+    @last_repairs.setter
+    def last_repairs(self, value: list[str]) -> None:
+        _last_repairs.set(value)
+
+    @property
+    def last_route(self) -> str:
+        """Решение маршрутизатора по последнему чанку (для лога)."""
+        return _last_route.get()
+
+    @last_route.setter
+    def last_route(self, value: str) -> None:
+        _last_route.set(value)
+
+    async def determine_equipment_context(self, first_chunks: list[Chunk]) -> dict | None:
         """Определить контекст оборудования по первым чанкам каждого файла.
 
         Args:
@@ -87,18 +247,99 @@ class GeminiClient:
 
         parts.append(types.Part.from_text(text=make_context_prompt(file_names)))
 
-        return self._call_with_retry(
+        return await self._call_with_retry(
             system_prompt=CONTEXT_SYSTEM_PROMPT,
             parts=parts,
+            model=self.router.context_model if self.router else None,
+            stage=STAGE_CONTEXT,
         )
 
-    def extract_from_chunk(self, chunk: Chunk,
-                           equipment_context: str = "") -> ChunkExtraction | None:
+    async def extract_chunk(self, chunk: Chunk, equipment_context: str = "",
+                            skip_fields: list[str] | None = None,
+                            ) -> list[tuple[Chunk, ChunkExtraction]]:
+        """Извлечь параметры из чанка с учётом маршрутизации моделей.
+
+        Без маршрутизатора (или при отключённой) — один проход моделью self.model.
+        Иначе первый проход делает быстрая модель; плотные чанки и чанки
+        с низкой уверенностью повторяются сильной моделью. Обрезанный ответ
+        быстрой модели сразу передаёт чанк сильной модели — без деления
+        чанка на быстрой модели, результат которого всё равно заменится. Понижённый
+        маршрутизатор (бюджет на исходе) — один проход быстрой моделью.
+        skip_fields — поля, уже извлечённые локально: у модели не запрашиваются.
+
+        Returns:
+            Список пар (чанк, извлечение) — см. extract_with_resplit.
+        """
+        label = f"{chunk.source_file}, {chunk.page_range_display}"
+        if self.router is not None and self.router.downgraded:
+            results = await self._extract_pass(chunk, equipment_context, self.router.fast_model, skip_fields)
+            decision = RoutingDecision(label, self.router.fast_model, False, "бюджет задания: без эскалации")
+            self.router.record(decision)
+            self.last_route = str(decision)
+            return results
+        if self.router is None or not self.router.enabled:
+            results = await self._extract_pass(chunk, equipment_context,
+                                               self.router.strong_model if self.router else None,
+                                               skip_fields)
+            if self.router is not None:
+                decision = RoutingDecision(label, self.router.strong_model, False,
+                                           "маршрутизация отключена")
+                self.router.record(decision)
+                self.last_route = str(decision)
+            return results
+
+        first = await self._extract_pass(chunk, equipment_context, self.router.fast_model, skip_fields,
+                                         resplit=False)
+        truncated = self.last_truncated
+        escalate, reason = self.router.assess(first, truncated)
+        if not escalate:
+            decision = RoutingDecision(label, self.router.fast_model, False, reason)
+            self.router.record(decision)
+            self.last_route = str(decision)
+            return first
+
+        results = await self._extract_pass(chunk, equipment_context, self.router.strong_model, skip_fields)
+        if results:
+            decision = RoutingDecision(label, self.router.strong_model, True, reason)
+        elif truncated:
+            # Сильная модель не ответила, а первый проход обрезан — делим чанк на быстрой модели
+            results = await self._extract_pass(chunk, equipment_context, self.router.fast_model, skip_fields)
+            decision = RoutingDecision(label, self.router.fast_model, True,
+                                       f"{reason}; сильная модель не ответила")
+        else:
+            # Сильная модель не ответила — оставляем результат первого прохода
+            results = first
+            decision = RoutingDecision(label, self.router.fast_model, True,
+                                       f"{reason}; сильная модель не ответила")
+        self.router.record(decision)
+        self.last_route = str(decision)
+        return results
+
+    async def _extract_pass(self, chunk: Chunk, equipment_context: str, model: str | None,
+                            skip_fields: list[str] | None = None,
+                            resplit: bool = True) -> list[tuple[Chunk, ChunkExtraction]]:
+        """Один проход по чанку: целиком или по группам (self.shards)."""
+        if self.shards:
+            return await self.extract_sharded(chunk, equipment_context, self.shards, model=model,
+                                              skip_fields=skip_fields, resplit=resplit)
+        return await self.extract_with_resplit(chunk, equipment_context, model=model,
+                                               skip_fields=skip_fields, resplit=resplit)
+
+    async def extract_from_chunk(self, chunk: Chunk,
+                                 equipment_context: str = "",
+                                 groups: list[str] | None = None,
+                                 model: str | None = None,
+                                 skip_fields: list[str] | None = None,
+                                 fields: list[str] | None = None) -> ChunkExtraction | None:
         """Извлечь параметры из одного чанка.
 
         Args:
             chunk: Чанк для обработки.
             equipment_context: Текстовый контекст оборудования (тип, подсистемы и т.д.)
+            groups: Буквы групп чек-листа для узкого запроса (None — весь чек-лист).
+            model: Модель для запроса (None — self.model).
+            skip_fields: Поля, уже извлечённые локально (не запрашиваются).
+            fields: Целевой запрос — только эти поля (поиск пропусков).
 
         Returns:
             ChunkExtraction с извлечёнными параметрами, или None при ошибке.
@@ -109,6 +350,10 @@ class GeminiClient:
             page_start=chunk.page_start,
             page_end=chunk.page_end,
             equipment_context=equipment_context,
+            groups=groups,
+            known=[FIELD_TO_PARAM_ID[f] for f in skip_fields
+                   if not groups or f in _group_fields(groups)] if skip_fields else None,
+            targets=[label for f, label in CHECKLIST_FIELDS if f in fields] if fields else None,
         )
 
         # Формируем содержимое запроса
@@ -127,18 +372,27 @@ class GeminiClient:
 
         # НЕ используем response_schema — схема слишком сложная для Gemini.
         # Вместо этого просим JSON в промпте и парсим через Pydantic.
-        raw = self._call_with_retry(
-            system_prompt=EXTRACTION_SYSTEM_PROMPT,
+        raw = await self._call_with_retry(
+            system_prompt=_extraction_system_prompt(tuple(groups) if groups else None),
             parts=parts,
+            model=model,
         )
 
         if raw is None:
             return None
 
-        # Fallback: если Gemini вернул список вместо словаря
-        if isinstance(raw, list):
-            logger.info("Gemini вернул список — конвертируем в словарь")
-            raw = _convert_list_to_dict(raw)
+        # Компактный ответ (A.1 → {"v", "p", ...}) разворачиваем в поля ChunkExtraction
+        raw = decode_extraction(raw)
+
+        # Узкий запрос: поля чужих групп отбрасываем — их извлекает другой запрос
+        if groups:
+            allowed = _group_fields(groups)
+            raw = {k: v for k, v in raw.items() if k in allowed}
+        if fields and isinstance(raw, dict):
+            raw = {k: v for k, v in raw.items() if k in fields}
+        # Поля, извлечённые локально, берутся из локального результата
+        if skip_fields and isinstance(raw, dict):
+            raw = {k: v for k, v in raw.items() if k not in skip_fields}
 
         # Заполнить file и doc_type из метаданных чанка, если Gemini не вернул
         if isinstance(raw, dict):
@@ -161,16 +415,164 @@ class GeminiClient:
         try:
             return ChunkExtraction.model_validate(raw)
         except Exception as e:
-            logger.error(f"Ошибка валидации ответа: {e}")
-            self.last_error = f"Невалидный JSON от Gemini: {e}"
-            return None
+            logger.warning(f"Ошибка валидации ответа, восстанавливаем по полям: {e}")
+            validation_error = e
+
+        # Одно битое поле не должно стоить всего ответа
+        if isinstance(raw, dict):
+            kept, dropped = salvage_fields(raw, default_source={
+                "file": chunk.source_file,
+                "doc_type": chunk.source_type,
+            })
+            if kept:
+                if dropped:
+                    self.last_repairs.append(f"отброшены поля: {', '.join(dropped)}")
+                return ChunkExtraction.model_validate(kept)
+
+        logger.error(f"Ошибка валидации ответа: {validation_error}")
+        self.last_error = f"Невалидный JSON от Gemini: {validation_error}"
+        return None
 
-    def verify_extraction(self, aggregated_json: str,
-                          chunks: list[Chunk],
-                          equipment_context: str = "") -> dict | None:
-        """Верификация агрегированных данных по исходным документам."""
+    async def extract_fields(self, chunk: Chunk, fields: list[str],
+                             equipment_context: str = "") -> ChunkExtraction | None:
+        """Целевой запрос: только поля fields по нескольким страницам (поиск пропусков).
+
+        Запрос короткий, поэтому выполняется сильной моделью без маршрутизации.
+        """
+        groups = [g for g, (_, names) in SECTION_GROUPS.items() if set(names) & set(fields)]
+        model = self.router.strong_model if self.router else None
+        return await self.extract_from_chunk(chunk, equipment_context, groups=groups,
+                                             model=model, fields=fields)
+
+    async def extract_with_resplit(self, chunk: Chunk,
+                                   equipment_context: str = "",
+                                   groups: list[str] | None = None,
+                                   model: str | None = None,
+                                   skip_fields: list[str] | None = None,
+                                   resplit: bool = True,
+                                   ) -> list[tuple[Chunk, ChunkExtraction]]:
+        """Извлечь параметры из чанка, деля его при обрезке ответа.
+
+        Если ответ обрезан по лимиту выходных токенов (плотный чанк),
+        диапазон страниц делится пополам и половины обрабатываются
+        вместо исходного чанка — рекурсивно, вплоть до одной страницы.
+        resplit=False — обрезанный ответ не делится: часть пропускается,
+        last_truncated остаётся установленным (эскалация на сильную модель).
+        Слишком большой запрос (OVERSIZE) делится всегда.
+
+        Returns:
+            Список пар (чанк, извлечение). Чанк может быть частью исходного,
+            чтобы страницы в source пересчитывались от его page_start.
+        """
+        result = await self.extract_from_chunk(chunk, equipment_context=equipment_context,
+                                               groups=groups, model=model, skip_fields=skip_fields)
+        if result is not None:
+            return [(chunk, result)]
+
+        if not self.last_truncated and self.last_error_kind != OVERSIZE:
+            return []
+        if self.last_truncated and not resplit:
+            logger.info(f"Ответ обрезан: {chunk.source_file}, {chunk.page_range_display} — без деления")
+            return []
+
+        halves = split_chunk(chunk)
+        if not halves:
+            logger.warning(
+                f"{self.last_error}, делить дальше нельзя: "
+                f"{chunk.source_file}, {chunk.page_range_display}"
+            )
+            return []
+
+        reason = "Ответ обрезан" if self.last_truncated else "Запрос слишком велик"
+        logger.info(
+            f"{reason} — делим {chunk.source_file}, {chunk.page_range_display} "
+            f"на {halves[0].page_range_display} и {halves[1].page_range_display}"
+        )
+        results: list[tuple[Chunk, ChunkExtraction]] = []
+        truncated = False
+        for half in halves:
+            results.extend(await self.extract_with_resplit(half, equipment_context, groups, model,
+                                                           skip_fields, resplit))
+            truncated = truncated or self.last_truncated
+        self.last_truncated = truncated
+        return results
+
+    async def reextract_groups(self, chunk: Chunk, equipment_context: str,
+                               groups: list[str],
+                               results: list[tuple[Chunk, ChunkExtraction]],
+                               ) -> list[tuple[Chunk, ChunkExtraction]]:
+        """Повторно извлечь группы groups из чанка и заменить ими значения в results.
+
+        Используется для чанков, обработанных упреждающе до определения
+        контекста оборудования. Значения переносятся в извлечения results
+        (одна пара на часть чанка). Если повтор не удался — results без изменений.
+        """
+        model = self.router.strong_model if self.router else None
+        fresh = await self.extract_with_resplit(chunk, equipment_context, groups, model)
+        if not fresh:
+            return results
+
+        return _replace_group_values(results, fresh, _group_fields(groups))
+
+    async def extract_sharded(self, chunk: Chunk, equipment_context: str,
+                              shards: list[list[str]], model: str | None = None,
+                              skip_fields: list[str] | None = None,
+                              resplit: bool = True,
+                              ) -> list[tuple[Chunk, ChunkExtraction]]:
+        """Извлечь параметры из чанка параллельными запросами по группам чек-листа.
+
+        Каждый запрос содержит только свою часть чек-листа, поэтому ответы
+        короче и приходят быстрее. Результаты групп по исходному чанку
+        объединяются в один ChunkExtraction; части чанка, разделённого
+        из-за обрезки ответа, возвращаются отдельными парами.
+        """
+        async def run_shard(groups: list[str]):
+            results = await self.extract_with_resplit(chunk, equipment_context, groups, model,
+                                                      skip_fields, resplit)
+            return results, self.last_error, list(self.last_repairs), self.last_truncated
+
+        # Каждая группа — своя задача со своим состоянием последнего запроса
+        outcomes = await asyncio.gather(*(run_shard(groups) for groups in shards))
+
+        merged = ChunkExtraction()
+        merged_any = False
+        results: list[tuple[Chunk, ChunkExtraction]] = []
+        errors: list[str] = []
+        repairs: list[str] = []
+
+        for groups, (shard_results, error, shard_repairs, _) in zip(shards, outcomes):
+            repairs.extend(shard_repairs)
+            if not shard_results:
+                errors.append(f"группы {', '.join(groups)}: {error or 'неизвестная ошибка'}")
+            for part, extraction in shard_results:
+                if part is not chunk:
+                    results.append((part, extraction))
+                    continue
+                for field_name, _ in CHECKLIST_FIELDS:
+                    value = getattr(extraction, field_name)
+                    if value is not None:
+                        setattr(merged, field_name, value)
+                merged_any = True
+
+        if merged_any:
+            results.insert(0, (chunk, merged))
+
+        self.last_error = "; ".join(errors)
+        self.last_repairs = repairs
+        self.last_truncated = any(truncated for *_, truncated in outcomes)
+        return results
+
+    async def verify_extraction(self, aggregated_json: str,
+                                chunks: list[Chunk],
+                                equipment_context: str = "",
+                                delta_files: list[str] | None = None) -> dict | None:
+        """Верификация агрегированных данных по исходным документам.
+
+        delta_files — chunks содержат только эти (добавленные) файлы.
+        """
         user_prompt = make_verification_prompt(aggregated_json,
-                                               equipment_context=equipment_context)
+                                               equipment_context=equipment_context,
+                                               delta_files=delta_files)
 
         parts = []
 
@@ -197,59 +599,136 @@ class GeminiClient:
 
         parts.append(types.Part.from_text(text=user_prompt))
 
-        return self._call_with_retry(
+        return await self._call_with_retry(
             system_prompt=VERIFICATION_SYSTEM_PROMPT,
             parts=parts,
+            model=self.router.verification_model if self.router else None,
+            stage=STAGE_VERIFICATION,
         )
 
-    def _call_with_retry(self, system_prompt: str, parts: list) -> dict | None:
+    async def _call_with_retry(self, system_prompt: str, parts: list,
+                               model: str | None = None,
+                               stage: str = STAGE_EXTRACTION) -> dict | None:
         """Выполнить запрос к Gemini API с retry при ошибках.
 
-        Всегда запрашивает JSON, парсит вручную.
+        Всегда запрашивает JSON, парсит вручную. model — None означает self.model,
+        stage — вид запроса для учёта токенов (usage_by_stage).
         """
         self.last_error = ""
+        self.last_error_kind = ""
+        self.last_truncated = False
+        self.last_repairs = []
 
         for attempt in range(MAX_RETRIES):
             try:
-                response = self.client.models.generate_content(
-                    model=self.model,
-                    contents=[types.Content(role="user", parts=parts)],
-                    config=types.GenerateContentConfig(
-                        system_instruction=system_prompt,
-                        temperature=0.1,
-                        response_mime_type="application/json",
-                    ),
-                )
+                response = await self._send(system_prompt, parts, model, stage)
+
+                # Обрезанный по лимиту токенов ответ повторять бессмысленно:
+                # тот же запрос снова упрётся в лимит
+                if _is_truncated(response):
+                    logger.warning("Ответ Gemini обрезан по лимиту выходных токенов")
+                    self.last_error = "Ответ обрезан по лимиту выходных токенов"
+                    self.last_truncated = True
+                    return None
 
                 if not response.text:
                     logger.warning(f"Пустой ответ от Gemini (попытка {attempt + 1})")
                     self.last_error = "Пустой ответ от Gemini"
                     continue
 
-                # Парсим JSON
-                try:
-                    return json.loads(response.text)
-                except json.JSONDecodeError:
-                    # Попробуем извлечь JSON из markdown-блока
-                    text = response.text.strip()
-                    if text.startswith("```json"):
-                        text = text[7:]
-                    if text.startswith("```"):
-                        text = text[3:]
-                    if text.endswith("```"):
-                        text = text[:-3]
-                    return json.loads(text.strip())
-
+                # Парсим JSON; типовые дефекты чиним локально, без повтора запроса
+                salvaged = salvage_json(response.text)
+                if salvaged.repairs:
+                    logger.info(f"JSON ответа исправлен: {'; '.join(salvaged.repairs)}")
+                self.last_repairs = salvaged.repairs
+                if not salvaged.ok:
+                    raise ValueError("Ответ Gemini не удалось разобрать как JSON")
+                return salvaged.data
+
+            except ApiError:
+                # Неверный ключ — задание прерывается
+                raise
+            except CircuitOpenError as e:
+                # API недоступен: запрос ждёт окончания паузы автомата защиты,
+                # при затянувшемся сбое пропускается только этот запрос
+                self.last_error = str(e)
+                self.last_error_kind = TRANSIENT
+                if attempt < MAX_RETRIES - 1:
+                    logger.warning(f"{e}. Повтор через {e.retry_after:.0f} сек.")
+                    await asyncio.sleep(max(e.retry_after, _CIRCUIT_MIN_WAIT))
+                continue
             except Exception as e:
-                delay = RETRY_DELAY_BASE * (2 ** attempt)
+                kind = e.kind if isinstance(e, _RequestFailed) else TRANSIENT
                 error_msg = str(e)
+                self.last_error = error_msg
+                self.last_error_kind = kind
+                if kind == AUTH:
+                    raise ApiError(AUTH, error_msg) from e
+                if kind in NON_RETRYABLE:
+                    logger.error(f"Ошибка Gemini API ({kind}), повтор бесполезен: {error_msg}")
+                    return None
+
+                delay = RETRY_DELAY_BASE * (2 ** attempt)
                 logger.error(
-                    f"Ошибка Gemini API (попытка {attempt + 1}/{MAX_RETRIES}): {error_msg}. "
+                    f"Ошибка Gemini API ({kind}, попытка {attempt + 1}/{MAX_RETRIES}): {error_msg}. "
                     f"Повтор через {delay} сек."
                 )
-                self.last_error = error_msg
                 if attempt < MAX_RETRIES - 1:
-                    time.sleep(delay)
+                    if self.quota is not None and kind == QUOTA:
+                        # Пауза общая для всех заданий — ожидание в очереди планировщика
+                        get_scheduler().backoff(delay)
+                    else:
+                        await asyncio.sleep(delay)
 
         logger.error("Все попытки исчерпаны")
         return None
+
+    async def _send(self, system_prompt: str, parts: list, model: str | None,
+                    stage: str = STAGE_EXTRACTION):
+        """Один запрос к API через общий планировщик и автомат защиты.
+
+        Raises:
+            CircuitOpenError: автомат защиты разомкнут.
+            _RequestFailed: ошибка API с её классом.
+        """
+        breaker = get_breaker()
+        probe = breaker.before_call()
+        try:
+            async with get_scheduler().aslot(self.quota):
+                response = await self.client.aio.models.generate_content(
+                    model=model or self.model,
+                    contents=[types.Content(role="user", parts=parts)],
+                    config=types.GenerateContentConfig(
+                        system_instruction=system_prompt,
+                        temperature=0.1,
+                        response_mime_type="application/json",
+                    ),
+                )
+        except Exception as e:
+            kind = classify_error(e)
+            if kind == TRANSIENT:
+                breaker.record_failure(str(e))
+            else:
+                # API ответил — сеть и сервис в порядке
+                breaker.record_success()
+            raise _RequestFailed(kind, e) from e
+        except BaseException:
+            # Отмена задачи во время пробного запроса
+            if probe:
+                breaker.abandon_probe()
+            raise
+
+        breaker.record_success()
+        self._record_usage(response, stage)
+        return response
+
+    def _record_usage(self, response, stage: str = STAGE_EXTRACTION) -> None:
+        """Учесть токены запроса и ответа в self.usage и self.usage_by_stage."""
+        meta = getattr(response, "usage_metadata", None)
+        input_tokens = (getattr(meta, "prompt_token_count", 0) or 0) if meta is not None else 0
+        output_tokens = (getattr(meta, "candidates_token_count", 0) or 0) if meta is not None else 0
+        with self._usage_lock:
+            for usage in (self.usage, self.usage_by_stage.setdefault(stage, _empty_usage())):
+                usage["calls"] += 1
+                usage["input_tokens"] += input_tokens
+                usage["output_tokens"] += output_tokens
@@ -0,0 +1,204 @@
+"""Классификация ошибок Gemini API и автомат защиты (circuit breaker).
+
+Классы ошибок определяют реакцию клиента:
+    auth        — ключ отклонён: повтор бесполезен, задание прерывается;
+    quota       — превышение квоты (429): повтор после общей паузы;
+    transient   — сеть, таймаут, 5xx: повтор с нарастающей паузой;
+    bad_request — запрос отклонён (4xx, модель недоступна): без повтора;
+    oversize    — запрос слишком велик: без повтора, чанк делится.
+
+Автомат защиты общий для процесса: после N подряд transient-ошибок он
+размыкается, и запросы не отправляются — каждый ждёт окончания паузы
+вместо 3 попыток с нарастающими паузами. Через cooldown один пробный
+запрос (half-open) проверяет API; успех замыкает автомат. Разомкнутый
+автомат задерживает или пропускает отдельный запрос, но не прерывает
+задание: задание прерывает только отклонённый ключ (ApiError).
+"""
+
+import logging
+import re
+import threading
+import time
+
+from gemini.quota import is_rate_limited
+
+logger = logging.getLogger(__name__)
+
+AUTH = "auth"
+QUOTA = "quota"
+TRANSIENT = "transient"
+BAD_REQUEST = "bad_request"
+OVERSIZE = "oversize"
+
+# Классы, при которых повтор того же запроса бесполезен
+NON_RETRYABLE = (AUTH, BAD_REQUEST, OVERSIZE)
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOLDOWN_SECONDS = 30.0
+
+_AUTH_STATUSES = ("UNAUTHENTICATED", "PERMISSION_DENIED")
+_AUTH_TEXT = re.compile(r"api[ _]key|unauthenticated|permission denied", re.IGNORECASE)
+_OVERSIZE_TEXT = re.compile(
+    r"payload size|too large|exceeds the (?:maximum|limit)|token count|request entity",
+    re.IGNORECASE,
+)
+
+_MESSAGES = {
+    AUTH: "Gemini API отклонил ключ — проверьте API ключ в настройках",
+    QUOTA: "Квота Gemini API исчерпана",
+    TRANSIENT: "Gemini API недоступен (сеть или сервер)",
+    BAD_REQUEST: "Gemini API отклонил запрос",
+    OVERSIZE: "Запрос превышает допустимый размер",
+}
+
+
+class ApiError(Exception):
+    """Ошибка API, после которой задание продолжать бессмысленно."""
+
+    def __init__(self, kind: str, detail: str = ""):
+        self.kind = kind
+        self.detail = detail
+        message = _MESSAGES.get(kind, kind)
+        super().__init__(f"{message}: {detail}" if detail else message)
+
+
+class CircuitOpenError(Exception):
+    """Автомат защиты разомкнут — запрос не отправлялся.
+
+    retry_after — через сколько секунд имеет смысл повторить запрос.
+    """
+
+    def __init__(self, detail: str = "", retry_after: float = 0.0):
+        self.kind = TRANSIENT
+        self.retry_after = retry_after
+        message = _MESSAGES[TRANSIENT]
+        super().__init__(f"{message}: {detail}" if detail else message)
+
+
+def classify_error(error: Exception) -> str:
+    """Класс ошибки запроса к Gemini API.
+
+    Учитывает код HTTP и статус google.genai.errors.APIError; сетевые
+    ошибки и таймауты клиента HTTP (без кода) — transient.
+    """
+    code = getattr(error, "code", None)
+    status = str(getattr(error, "status", "") or "")
+    text = str(error)
+
+    if is_rate_limited(error):
+        return QUOTA
+    if isinstance(code, int):
+        if code in (401, 403) or status in _AUTH_STATUSES:
+            return AUTH
+        if code == 413 or (code == 400 and _OVERSIZE_TEXT.search(text)):
+            return OVERSIZE
+        if code == 400 and _AUTH_TEXT.search(text):
+            # Неверный ключ Gemini возвращает как 400 INVALID_ARGUMENT
+            return AUTH
+        if code == 408 or code >= 500:
+            return TRANSIENT
+        if 400 <= code < 500:
+            return BAD_REQUEST
+    return TRANSIENT
+
+
+class CircuitBreaker:
+    """Автомат защиты: closed → open после серии сбоев → half-open → closed."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 cooldown: float = DEFAULT_COOLDOWN_SECONDS):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._last_error = ""
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def before_call(self) -> bool:
+        """Разрешить запрос. True — это пробный запрос half-open.
+
+        Raises:
+            CircuitOpenError: автомат разомкнут, запрос отправлять нельзя.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return False
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                logger.info("Автомат защиты API: пробный запрос")
+                return True
+            # Идёт пробный запрос — его итог станет известен не позже следующей паузы
+            retry_after = self.cooldown
+            if self._state == self.OPEN:
+                retry_after = max(0.0, self._opened_at + self.cooldown - time.monotonic())
+            raise CircuitOpenError(
+                f"автомат защиты разомкнут после серии сбоев ({self._last_error})", retry_after
+            )
+
+    def record_success(self) -> None:
+        """API ответил (в том числе отказом не из-за сбоя)."""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Автомат защиты API замкнут: запросы возобновлены")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: str) -> None:
+        """Сбой класса transient."""
+        with self._lock:
+            self._last_error = error
+            self._failures += 1
+            probe_failed = self._state == self.HALF_OPEN
+            if probe_failed or self._failures >= self.failure_threshold:
+                if self._state == self.CLOSED:
+                    logger.warning(
+                        f"Автомат защиты API разомкнут: {self._failures} сбоев подряд, "
+                        f"пауза {self.cooldown:.0f} с"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def abandon_probe(self) -> None:
+        """Пробный запрос прерван без результата — следующий запрос снова пробный."""
+        with self._lock:
+            if self._probe_in_flight:
+                self._probe_in_flight = False
+                self._state = self.OPEN
+
+
+_breaker: CircuitBreaker | None = None
+_breaker_lock = threading.Lock()
+
+
+def get_breaker(failure_threshold: int | None = None,
+                cooldown: float | None = None) -> CircuitBreaker:
+    """Автомат защиты процесса (создаётся при первом обращении).
+
+    Параметры меняют настройки уже созданного автомата.
+    """
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(failure_threshold or DEFAULT_FAILURE_THRESHOLD,
+                                      cooldown if cooldown is not None else DEFAULT_COOLDOWN_SECONDS)
+        else:
+            if failure_threshold:
+                _breaker.failure_threshold = max(1, failure_threshold)
+            if cooldown is not None:
+                _breaker.cooldown = cooldown
+        return _breaker
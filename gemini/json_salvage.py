@@ -0,0 +1,239 @@
+"""Толерантный разбор JSON-ответов Gemini с исправлением типовых дефектов.
+
+Gemini иногда возвращает почти корректный JSON: с висячими запятыми,
+одинарными кавычками, текстом вокруг объекта или обрезанным хвостом.
+Повторный запрос из-за одной лишней запятой стоит десятков секунд, поэтому
+ответ сначала чинится локально, а повтор делается, только если из ответа
+не удалось получить ничего пригодного.
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any
+
+from pydantic import ValidationError
+
+from gemini.schema import ChunkExtraction, ExtractedValue
+
+logger = logging.getLogger(__name__)
+
+# Символы, после которых закрывающая кавычка действительно закрывает строку
+_STRING_TERMINATORS = set(",:}]")
+
+_EXTRACTION_FIELDS = set(ChunkExtraction.model_fields)
+
+
+@dataclass
+class SalvageResult:
+    """Результат толерантного разбора."""
+    data: Any = None  # Разобранный JSON или None, если восстановить не удалось
+    repairs: list[str] = field(default_factory=list)  # Что было исправлено
+
+    @property
+    def ok(self) -> bool:
+        return self.data is not None
+
+
+def salvage_json(text: str) -> SalvageResult:
+    """Разобрать JSON, исправляя типовые дефекты ответа модели.
+
+    Исправляется:
+        - markdown-ограждение ```json и текст до/после JSON;
+        - одинарные кавычки вместо двойных;
+        - неэкранированные кавычки и переводы строк внутри строк;
+        - висячие запятые перед } и ];
+        - незакрытые скобки (обрезанный ответ) — недописанный
+          последний элемент отбрасывается.
+
+    Returns:
+        SalvageResult с данными (или None) и списком исправлений.
+    """
+    result = SalvageResult()
+    if not text:
+        return result
+
+    try:
+        result.data = json.loads(text)
+        return result
+    except json.JSONDecodeError:
+        pass
+
+    repairs: list[str] = []
+
+    def note(repair: str) -> None:
+        if repair not in repairs:
+            repairs.append(repair)
+
+    start = _find_json_start(text)
+    if start < 0:
+        result.repairs = repairs
+        return result
+    if text[:start].strip():
+        note("отброшен текст перед JSON")
+
+    out: list[str] = []
+    stack: list[str] = []
+    # Точки отката для обрезанного ответа: (длина out, стек скобок) перед запятой
+    cuts: list[tuple[int, tuple[str, ...]]] = []
+    in_string = False
+    quote = '"'
+    complete = False
+    i = start
+    n = len(text)
+
+    while i < n:
+        ch = text[i]
+
+        if in_string:
+            if ch == "\\":
+                out.append(text[i:i + 2])
+                i += 2
+                continue
+            if ch == quote:
+                if _closes_string(text, i + 1):
+                    out.append('"')
+                    in_string = False
+                else:
+                    # Кавычка посреди строки — часть значения
+                    out.append('\\"' if ch == '"' else ch)
+                    note("экранированы кавычки внутри строки")
+                i += 1
+                continue
+            if ch == '"':
+                # Двойная кавычка внутри строки в одинарных кавычках
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+                note("экранированы переводы строк")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in "\"'":
+            if ch == "'":
+                note("одинарные кавычки заменены на двойные")
+            in_string = True
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            if _drop_trailing_comma(out):
+                note("удалены висячие запятые")
+            if not stack:
+                break
+            out.append(stack.pop())
+            if not stack:
+                complete = True
+                i += 1
+                break
+        elif ch == ",":
+            if _drop_trailing_comma(out):
+                note("удалены висячие запятые")
+            cuts.append((len(out), tuple(stack)))
+            out.append(",")
+        elif ch == "`":
+            # Остатки markdown-ограждения внутри обрезанного ответа
+            note("отброшен текст после JSON")
+            break
+        else:
+            out.append(ch)
+        i += 1
+
+    if complete:
+        if text[i:].strip():
+            note("отброшен текст после JSON")
+        data = _try_loads("".join(out))
+    else:
+        note("закрыты незавершённые скобки (обрезанный ответ)")
+        data = None
+        if not in_string and _ends_with_closed_value(out):
+            data = _try_loads("".join(out) + _closers(stack))
+        # Недописанный последний элемент (строку, число) не дописываем,
+        # а откатываемся к предыдущей запятой
+        for cut_len, cut_stack in reversed(cuts):
+            if data is not None:
+                break
+            data = _try_loads("".join(out[:cut_len]) + _closers(cut_stack))
+            if data is not None:
+                note("отброшен недописанный последний элемент")
+
+    result.data = data
+    result.repairs = repairs
+    return result
+
+
+def salvage_fields(raw: dict, default_source: dict | None = None,
+                   ) -> tuple[dict, list[str]]:
+    """Оставить только поля извлечения, проходящие валидацию ExtractedValue.
+
+    Одно битое поле не должно приводить к потере всего ответа.
+    Голое значение (строка/число) без объекта оборачивается в
+    {"value": ..., "source": default_source}.
+
+    Returns:
+        (поля, прошедшие валидацию; имена отброшенных полей)
+    """
+    kept: dict = {}
+    dropped: list[str] = []
+
+    for field_name, val in raw.items():
+        if field_name not in _EXTRACTION_FIELDS or val is None:
+            continue
+        if isinstance(val, (str, int, float)) and not isinstance(val, bool):
+            val = {"value": str(val), "source": dict(default_source or {})}
+        try:
+            ExtractedValue.model_validate(val)
+        except ValidationError as e:
+            logger.warning(f"Поле {field_name} отброшено при разборе ответа: {e.error_count()} ошибок")
+            dropped.append(field_name)
+            continue
+        kept[field_name] = val
+
+    return kept, dropped
+
+
+def _find_json_start(text: str) -> int:
+    """Позиция первой { или [ — начало JSON в ответе."""
+    positions = [p for p in (text.find("{"), text.find("[")) if p >= 0]
+    return min(positions) if positions else -1
+
+
+def _closes_string(text: str, pos: int) -> bool:
+    """Кавычка закрывает строку, если за ней (после пробелов) разделитель JSON."""
+    while pos < len(text) and text[pos] in " \t\r\n":
+        pos += 1
+    return pos >= len(text) or text[pos] in _STRING_TERMINATORS
+
+
+def _drop_trailing_comma(out: list[str]) -> bool:
+    """Удалить запятую в конце out (с учётом пробелов). True, если удалена."""
+    idx = len(out) - 1
+    while idx >= 0 and out[idx].isspace():
+        idx -= 1
+    if idx >= 0 and out[idx] == ",":
+        del out[idx]
+        return True
+    return False
+
+
+def _ends_with_closed_value(out: list[str]) -> bool:
+    """Последний непробельный символ out закрывает объект или массив."""
+    for piece in reversed(out):
+        if not piece.isspace():
+            return piece[-1] in "}]"
+    return False
+
+
+def _closers(stack: list[str] | tuple[str, ...]) -> str:
+    return "".join(reversed(stack))
+
+
+def _try_loads(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
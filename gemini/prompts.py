@@ -36,17 +36,16 @@ def make_context_prompt(file_list: list[str]) -> str:
 # ЭТАП 3: ИЗВЛЕЧЕНИЕ ПАРАМЕТРОВ
 # =============================================================================
 
-EXTRACTION_SYSTEM_PROMPT = """Ты — ведущий технический аналитик проектного института. Твоя задача — извлечь ВСЕ технические параметры оборудования из предоставленного фрагмента документации.
-
-ПРАВИЛА:
+_EXTRACTION_RULES = """ПРАВИЛА:
 1. Извлекай ТОЛЬКО данные, которые явно присутствуют в документе. Не домысливай.
-2. Для каждого найденного параметра укажи:
-   - value: значение с единицами измерения
-   - page: номер страницы в этом фрагменте (1 = первая страница фрагмента)
-   - section: название раздела/заголовка документа, где найдено значение
-   - quote: цитата из оригинала (до 50 символов) — фрагмент текста, откуда взято значение
-   - confidence: "high" если значение чёткое, "medium" если текст/скан среднего качества, "low" если плохо читается
-3. Если параметр НЕ найден в этом фрагменте — НЕ включай его (оставь null).
+2. Для каждого найденного параметра укажи (короткие ключи):
+   - v: значение с единицами измерения
+   - p: номер страницы в этом фрагменте (1 = первая страница фрагмента)
+   - s: название раздела/заголовка документа, где найдено значение
+   - q: цитата из оригинала (до 50 символов) — фрагмент текста, откуда взято значение
+   - c: "h" если значение чёткое, "m" если текст/скан среднего качества, "l" если плохо читается
+   - n: примечание — только если нужно (см. правила ниже)
+3. Если параметр НЕ найден в этом фрагменте — НЕ включай его (никаких null и пустых объектов).
 4. Единицы измерения приводи к СИ. Оригинальные единицы — в скобках: "0,6 МПа (6 бар)".
 5. Размеры: формат Д × Ш × В через " × " с пробелами. Единица в конце: "3 429 × 1 890 × 2 010 мм".
 6. Десятичный разделитель: запятая. Разделитель тысяч: пробел. Пример: "5 800 кг".
@@ -71,7 +70,7 @@ EXTRACTION_SYSTEM_PROMPT = """Ты — ведущий технический а
     b) Путаница ЦИФР на старых/нечётких сканах: 3↔5↔8, 6↔0, 1↔7.
        Особенно проверяй цифровые диапазоны (например, "30–80%", "3–5 МПа"):
        если первая цифра диапазона плохо читается — перечитай её внимательно.
-    c) При подозрении — установи confidence="low" и добавь в note:
+    c) При подозрении — установи c="l" и добавь в n:
        "возможна ошибка OCR: символ [X] мог быть прочитан как [Y]"
        с указанием конкретных подозрительных символов.
     d) Индексы моделей: кириллическая буква среди цифр — вероятно ошибка распознавания.
@@ -83,32 +82,30 @@ EXTRACTION_SYSTEM_PROMPT = """Ты — ведущий технический а
     - F: Что подать от ВНЕШНЕЙ водопроводной сети
     Если документ содержит и внешние (подключение к сетям здания), и внутренние
     (параметры внутренних узлов) значения — извлекай ВНЕШНИЕ, т.к. они нужны проектировщику.
+"""
 
-ЧЕК-ЛИСТ ПАРАМЕТРОВ (A.1–H.4):
-
-### A. Идентификация
+# Чек-лист по группам — для полного промпта и для промптов отдельных групп
+CHECKLIST_GROUP_TEXT = {
+    "A": """### A. Идентификация
 A.1. Наименование и назначение
 A.2. Модель / полный артикул
 A.3. Производитель, страна, ссылка на сайт
-A.4. Год выпуска и серийный номер. Если год выпуска не указан явно — ищи дату издания документации (на обложке, титульном листе) как приближение, с пометкой "дата издания документации" в note
-
-### B. Габариты и логистика заноса
+A.4. Год выпуска и серийный номер. Если год выпуска не указан явно — ищи дату издания документации (на обложке, титульном листе) как приближение, с пометкой "дата издания документации" в n""",
+    "B": """### B. Габариты и логистика заноса
 B.1. Габариты (Д×Ш×В, мм) — в рабочем и транспортном положении
 B.2. Минимальный монтажный проём (Ш×В, мм)
 B.3. Масса нетто и масса с жидкостями (кг). При наличии нескольких модификаций/комплектаций — указать вес КАЖДОЙ. Если вес указан по частям (корпус + конвейер + бак) — рассчитай суммарный
 B.4. Масса тяжелейшей части при транспортировке (кг)
-B.5. Точки строповки и центр тяжести
-
-### C. Строительные требования (АС)
+B.5. Точки строповки и центр тяжести""",
+    "C": """### C. Строительные требования (АС)
 C.1. Тип установки: фундамент / виброопоры / анкерное крепление
 C.2. Размеры фундамента или опорной рамы (Д×Ш×Г, мм)
 C.3. Глубина приямков или высота подиума
 C.4. Статические и динамические нагрузки
 C.5. Зона обслуживания: мин. расстояния от стен / соседнего оборудования
 C.6. Требования к полу: ровность, допуски, нагрузка на перекрытие
-C.7. Требования к строительным конструкциям / отделке
-
-### D. Электроснабжение и тепло (ЭМ / ОВ)
+C.7. Требования к строительным конструкциям / отделке""",
+    "D": """### D. Электроснабжение и тепло (ЭМ / ОВ)
 D.1. Суммарная установленная мощность P_уст (кВт) — сумма ВСЕХ двигателей/приводов, включая вспомогательные (АСИ, насосы СОЖ, гидростанция, конвейер стружки и т.д.). Если перечислены отдельные приводы — укажи КАЖДЫЙ и рассчитай Σ. Проверь таблицы полностью — не пропускай строки. Отдельно P_потр если указана.
 D.2. ВСЕ напряжения внешнего питания: силовое (380 В) И управление (220 В) если различаются; фазность (3ф/1ф), частота (Гц), ток (А)
 D.3. Категория надёжности электроснабжения (I, II, III), ИБП
@@ -116,15 +113,13 @@ D.4. Тип пуска, cos φ, Ки, компенсация реактивно
 D.5. Тепловыделения (кВт) — в воздух и в систему охлаждения
 D.6. Степень защиты (IP), класс зоны
 D.7. Тип заземления (TN-S, TN-C-S), точка подключения контура
-D.8. Точка ввода кабеля: направление, координаты
-
-### E. Сжатый воздух и газы (ТХ)
+D.8. Точка ввода кабеля: направление, координаты""",
+    "E": """### E. Сжатый воздух и газы (ТХ)
 E.1. Давление сжатого воздуха на входе (МПа) — рабочее и пиковое. Искать во ВСЕХ разделах: пневматика, смазка, охлаждение, зажим
 E.2. Расход (м³/ч или н.л/мин) — средний и максимальный
 E.3. Качество среды: класс чистоты, масло, точка росы
-E.4. Точка подключения: Ø, тип резьбы/фланца, координаты
-
-### F. Водоснабжение и канализация (ВК)
+E.4. Точка подключения: Ø, тип резьбы/фланца, координаты""",
+    "F": """### F. Водоснабжение и канализация (ВК)
 F.1. Назначение воды (охлаждение, промывка, технологическая)
 F.2. Требования к качеству воды
 F.3. Расход воды, давление, температура
@@ -132,55 +127,68 @@ F.4. Точка подключения: Ø, тип соединения, коо
 F.5. Канализация: расход стоков, температура, состав
 F.6. Точка слива: самотёк/давление, высота, Ø
 F.7. СОЖ: объём системы, марка, сепарация
-F.8. Периодичность потребления
-
-### G. Вентиляция, экология и шум (ОВ)
+F.8. Периодичность потребления""",
+    "G": """### G. Вентиляция, экология и шум (ОВ)
 G.1. Локальные отсосы: Ø патрубков, объём, разрежение
 G.2. Состав выбросов: ПДК, температура газов, взрывоопасность
 G.3. Уровень звукового давления (дБА) на расстоянии 1 м
-G.4. Вибрация: уровни, виброизоляция
-
-### H. Автоматизация и безопасность (АТХ / СС)
+G.4. Вибрация: уровни, виброизоляция""",
+    "H": """### H. Автоматизация и безопасность (АТХ / СС)
 H.1. IT-инфраструктура: порты, протоколы
 H.2. Интеграция в систему безопасности (E-Stop, блокировка)
 H.3. Световая и звуковая сигнализация
-H.4. Микроклимат: ВСЕ режимы — рабочий, рекомендуемый, хранение. Формат: "Рабочая: T°C, W% RH; Хранение: T°C, W% RH". Если один диапазон — уточни тип
-
-ФОРМАТ ОТВЕТА — строго JSON-объект (НЕ массив!) с ключами ниже.
-Для каждого найденного параметра — объект с полями value и source.
-Ненайденные параметры — не включай (или null).
+H.4. Микроклимат: ВСЕ режимы — рабочий, рекомендуемый, хранение. Формат: "Рабочая: T°C, W% RH; Хранение: T°C, W% RH". Если один диапазон — уточни тип""",
+}
 
-Ключи: a1_name, a2_model, a3_manufacturer, a4_year_serial,
-b1_dimensions, b2_opening, b3_weight, b4_heaviest_part, b5_rigging,
-c1_installation, c2_foundation, c3_pits, c4_loads, c5_service_zone, c6_floor, c7_construction,
-d1_power, d2_voltage, d3_reliability, d4_startup, d5_heat, d6_protection, d7_grounding, d8_cable_entry,
-e1_pressure, e2_flow, e3_quality, e4_connection,
-f1_purpose, f2_quality, f3_flow, f4_connection, f5_drainage, f6_drain_point, f7_coolant, f8_periodicity,
-g1_exhaust, g2_emissions, g3_noise, g4_vibration,
-h1_it, h2_safety, h3_signaling, h4_climate.
+_EXTRACTION_FORMAT = """ФОРМАТ ОТВЕТА — строго компактный JSON-объект (НЕ массив!), без отступов и переносов строк.
+Ключ — код параметра чек-листа (A.1 … H.4), значение — объект с ключами v, p, s, q, c, n.
+Ненайденные параметры — не включай. Пустые ключи (s, q, n) — не включай.
 
 Пример ответа:
-{
-  "a1_name": {
-    "value": "Токарный станок с ЧПУ",
-    "source": {"file": "passport.pdf", "doc_type": "Паспорт", "page": 1, "section": "Введение", "quote": "CNC Lathe", "confidence": "high"}
-  },
-  "a2_model": {
-    "value": "CTX 450",
-    "source": {"file": "passport.pdf", "doc_type": "Паспорт", "page": 1, "section": "Введение", "quote": "Model: CTX 450", "confidence": "high"}
-  },
-  "b3_weight": {
-    "value": "5 800 кг",
-    "source": {"file": "passport.pdf", "doc_type": "Паспорт", "page": 3, "section": "Характеристики", "quote": "Weight: 5800 kg", "confidence": "high"}
-  }
-}
+{"A.1":{"v":"Токарный станок с ЧПУ","p":1,"s":"Введение","q":"CNC Lathe","c":"h"},"A.2":{"v":"CTX 450","p":1,"s":"Введение","q":"Model: CTX 450","c":"h"},"B.3":{"v":"5 800 кг","p":3,"s":"Характеристики","q":"Weight: 5800 kg","c":"h"}}
 """
 
 
+def make_extraction_system_prompt(groups: list[str] | None = None) -> str:
+    """Сформировать system prompt извлечения.
+
+    Args:
+        groups: Буквы групп чек-листа (например, ["D", "E"]) для узкого
+            промпта одной части чек-листа. None — весь чек-лист A.1–H.4.
+    """
+    if groups is None:
+        scope = "ВСЕ технические параметры оборудования"
+        header = "ЧЕК-ЛИСТ ПАРАМЕТРОВ (A.1–H.4):"
+        groups = list(CHECKLIST_GROUP_TEXT)
+    else:
+        groups_str = ", ".join(groups)
+        scope = f"технические параметры оборудования групп {groups_str}"
+        header = (f"ЧЕК-ЛИСТ ПАРАМЕТРОВ (только группы {groups_str}; "
+                  f"параметры других групп НЕ извлекай и НЕ включай в ответ):")
+
+    checklist = "\n\n".join(CHECKLIST_GROUP_TEXT[g] for g in groups)
+    return (
+        f"Ты — ведущий технический аналитик проектного института. Твоя задача — "
+        f"извлечь {scope} из предоставленного фрагмента документации.\n\n"
+        f"{_EXTRACTION_RULES}\n{header}\n\n{checklist}\n\n{_EXTRACTION_FORMAT}"
+    )
+
+
+EXTRACTION_SYSTEM_PROMPT = make_extraction_system_prompt()
+
+
 def make_extraction_prompt(source_file: str, source_type: str,
                            page_start: int | None, page_end: int | None,
-                           equipment_context: str = "") -> str:
-    """Сформировать user prompt для извлечения параметров из чанка."""
+                           equipment_context: str = "",
+                           groups: list[str] | None = None,
+                           known: list[str] | None = None,
+                           targets: list[str] | None = None) -> str:
+    """Сформировать user prompt для извлечения параметров из чанка.
+
+    groups — буквы групп чек-листа для узкого запроса (None — весь чек-лист).
+    known — коды параметров, уже извлечённых локально по текстовому слою.
+    targets — названия параметров целевого запроса (поиск пропусков): только они.
+    """
     page_info = ""
     if page_start is not None:
         if page_start == page_end:
@@ -207,19 +215,42 @@ def make_extraction_prompt(source_file: str, source_type: str,
 отличить внешние требования к подключению от внутренних параметров узлов.
 """
 
+    task = "Извлеки ВСЕ технические параметры оборудования из этого фрагмента по чек-листу A.1–H.4."
+    if groups is not None:
+        task = (f"Извлеки технические параметры оборудования из этого фрагмента "
+                f"ТОЛЬКО по группам чек-листа {', '.join(groups)}.")
+    if targets:
+        task = (f"Найди в этом фрагменте ТОЛЬКО следующие параметры: {'; '.join(targets)}.\n"
+                f"При общем анализе документов они не найдены, но на этих страницах встречаются "
+                f"связанные слова — внимательно проверь таблицы, сноски и примечания. "
+                f"Остальные параметры не включай.")
+    if known:
+        task += (f"\nПараметры {', '.join(known)} уже извлечены из текстового слоя — "
+                 f"НЕ включай их в ответ.")
+
     return f"""{page_info}
 Тип документа: {source_type}.
 {context_block}
-Извлеки ВСЕ технические параметры оборудования из этого фрагмента по чек-листу A.1–H.4.
-Для каждого найденного параметра заполни: value, page (номер страницы в ЭТОМ фрагменте, начиная с 1), section, quote, confidence.
-Параметры, которых НЕТ в этом фрагменте — оставь null.
-Помни: номер страницы в поле "page" — это номер страницы ВНУТРИ этого фрагмента (1 = первая страница фрагмента)."""
+{task}
+Для каждого найденного параметра заполни: v, p (номер страницы в ЭТОМ фрагменте, начиная с 1), s, q, c.
+Параметры, которых НЕТ в этом фрагменте — не включай.
+Помни: номер страницы в поле "p" — это номер страницы ВНУТРИ этого фрагмента (1 = первая страница фрагмента)."""
 
 
 VERIFICATION_SYSTEM_PROMPT = """Ты — ведущий технический аналитик проектного института. Тебе предоставлены:
-1. Агрегированные данные из карточки оборудования (JSON).
+1. Агрегированные данные из карточки оборудования (компактный JSON):
+   - "src": список файлов-источников (тип документа в скобках);
+   - "val": найденные параметры по кодам чек-листа (A.1 … H.4), ключи:
+     v — значение, f — индекс файла в "src", p — страница, s — раздел,
+     q — цитата, c — уверенность ("m"/"l"; отсутствует = высокая), st — статус,
+     n — примечание о возможной ошибке OCR;
+   - "missing": коды параметров, для которых значение не найдено;
+   - "ok" (если есть): параметры, цитаты которых уже подтверждены по тексту
+     документа, — код и значение; их не проверяй и не исправляй.
 2. Исходные документы.
 
+В поле "field" ответа указывай код параметра (например, "D.5").
+
 Твои задачи:
 1. ПРОВЕРКА ПОЛНОТЫ: Какие параметры из чек-листа A.1–H.4 отсутствуют? Есть ли данные, которые были пропущены при первичном извлечении?
 2. ПРОВЕРКА КОНФЛИКТОВ: Есть ли противоречия между значениями из разных источников?
@@ -245,12 +276,12 @@ VERIFICATION_SYSTEM_PROMPT = """Ты — ведущий технический 
    - H.4: Если указан только один диапазон влажности — проверь, нет ли в документе
      другого (рабочий vs. рекомендуемый vs. хранение). Приоритет — рабочий диапазон.
 7. ПРОВЕРКА ВОЗМОЖНЫХ ОШИБОК OCR:
-   - Для значений с confidence="low" или note, содержащим "OCR" — перечитай
+   - Для значений с c="l" или n, содержащим "OCR" — перечитай
      соответствующее место в документе и сравни с извлечённым значением.
    - Для числовых диапазонов (X–Y): проверь, что нижняя граница < верхней
      и обе правдоподобны для данного параметра.
    - Если найдена вероятная ошибка — добавь исправление в corrections:
-     {"field": "h4_climate", "issue": "OCR: '5' вероятно '3' (50→30)", "corrected_value": "..."}
+     {"field": "H.4", "issue": "OCR: '5' вероятно '3' (50→30)", "corrected_value": "..."}
 8. ПРОВЕРКА ПОЛНОТЫ СУММИРОВАНИЯ:
    - D.1: Пересчитай суммарную мощность по ВСЕМ строкам таблицы двигателей,
      включая вспомогательные приводы (АСИ, насосы, конвейеры). Сравни с извлечённой Σ.
@@ -258,18 +289,22 @@ VERIFICATION_SYSTEM_PROMPT = """Ты — ведущий технический 
 
 Формат ответа — JSON:
 {
-  "missing_params": [{"field": "d5_heat", "suggestion": "Возможно указано на стр. 15 руководства"}],
-  "conflicts": [{"field": "b3_weight", "values": ["5800 кг (паспорт)", "5750 кг (руководство)"]}],
-  "indirect_params": [{"field": "f1_purpose", "reasoning": "Указано охлаждение шпинделя → нужна вода", "suggested_value": "Охлаждение шпинделя"}],
-  "corrections": [{"field": "d2_voltage", "issue": "Номер страницы некорректен", "corrected_page": 14}, {"field": "h4_climate", "issue": "OCR: '5' вероятно '3' (50→30)", "corrected_value": "Рабочая: 20°C, 30–80% RH"}],
-  "additional_values": [{"field": "e3_quality", "value": "Класс 1.4.1 по ISO 8573-1", "page": 18, "section": "Пневмосистема", "quote": "Air quality class 1.4.1", "file": "passport.pdf"}]
+  "missing_params": [{"field": "D.5", "suggestion": "Возможно указано на стр. 15 руководства"}],
+  "conflicts": [{"field": "B.3", "values": ["5800 кг (паспорт)", "5750 кг (руководство)"]}],
+  "indirect_params": [{"field": "F.1", "reasoning": "Указано охлаждение шпинделя → нужна вода", "suggested_value": "Охлаждение шпинделя"}],
+  "corrections": [{"field": "D.2", "issue": "Номер страницы некорректен", "corrected_page": 14}, {"field": "H.4", "issue": "OCR: '5' вероятно '3' (50→30)", "corrected_value": "Рабочая: 20°C, 30–80% RH"}],
+  "additional_values": [{"field": "E.3", "value": "Класс 1.4.1 по ISO 8573-1", "page": 18, "section": "Пневмосистема", "quote": "Air quality class 1.4.1", "file": "passport.pdf"}]
 }
 """
 
 
 def make_verification_prompt(aggregated_json: str,
-                             equipment_context: str = "") -> str:
-    """Сформировать промпт для верификации агрегированных данных."""
+                             equipment_context: str = "",
+                             delta_files: list[str] | None = None) -> str:
+    """Сформировать промпт для верификации агрегированных данных.
+
+    delta_files — дельта-верификация: приложены только добавленные документы.
+    """
     context_block = ""
     if equipment_context:
         context_block = f"""
@@ -284,10 +319,20 @@ def make_verification_prompt(aggregated_json: str,
   внутреннего редуктора — нужно найти входное давление магистрали.
 """
 
+    delta_block = ""
+    if delta_files:
+        delta_block = f"""
+ДЕЛЬТА-ВЕРИФИКАЦИЯ: карточка уже проверялась по остальным документам.
+Приложены только добавленные документы: {", ".join(delta_files)}.
+Не отмечай параметр в missing_params только потому, что его нет в приложенных
+документах. Ищи новые значения, конфликты с карточкой и ошибки, связанные
+с добавленными документами.
+"""
+
     return f"""Вот агрегированные данные карточки оборудования:
 
 {aggregated_json}
-{context_block}
+{context_block}{delta_block}
 Проверь эти данные по исходным документам (приложены).
 Выполни все 8 задач: полнота, конфликты, косвенные параметры, проверка ссылок,
 логическая непротиворечивость, полнота значений, ошибки OCR, полнота суммирования.
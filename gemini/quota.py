@@ -0,0 +1,228 @@
+"""Общий для процесса планировщик запросов к Gemini API.
+
+Несколько одновременных заданий (карточка в GUI, пакетная обработка)
+делят одну квоту API. Без общего планировщика каждый GeminiClient
+повторяет и тормозит запросы сам по себе: задания мешают друг другу и
+тратят квоту на ответы 429.
+
+Планировщик:
+    - ограничивает число одновременных запросов всего процесса;
+    - выдаёт освободившийся слот по классу приоритета (интерактивное
+      задание GUI раньше фонового пакетного), внутри класса — заданию с
+      меньшим числом запросов в работе и дольше всех ждущему (fair share);
+    - при ответе 429 приостанавливает выдачу слотов всем заданиям сразу;
+    - ведёт учёт запросов и ожидания по каждому заданию.
+
+Слот можно ждать из потока (slot) и из корутины (aslot): асинхронное
+ожидание не блокирует цикл событий, поэтому запросы одного задания в
+цикле asyncio не мешают друг другу освобождать слоты.
+"""
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+@dataclass(eq=False)
+class QuotaJob:
+    """Задание в планировщике и его учёт запросов."""
+    name: str
+    priority: int = PRIORITY_INTERACTIVE
+    requests: int = 0  # Выданных слотов
+    in_flight: int = 0
+    waited_seconds: float = 0.0  # Суммарное ожидание слота
+    last_served: int = 0  # Порядковый номер последней выдачи (для очерёдности)
+
+    def summary(self) -> str:
+        return f"запросов {self.requests}, ожидание квоты {self.waited_seconds:.0f} с"
+
+
+@dataclass(eq=False)
+class _Ticket:
+    job: QuotaJob
+    serial: int
+    wake: Callable[[], None] | None = None  # Пробуждение асинхронного ожидания
+
+
+class RequestScheduler:
+    """Очередь запросов всех заданий процесса с общим лимитом параллельности."""
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.max_concurrency = max(1, max_concurrency)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting: list[_Ticket] = []
+        self._jobs: list[QuotaJob] = []
+        self._paused_until = 0.0
+        self._serial = itertools.count(1)
+
+    def register(self, name: str, priority: int = PRIORITY_INTERACTIVE) -> QuotaJob:
+        job = QuotaJob(name=name, priority=priority)
+        with self._cond:
+            self._jobs.append(job)
+        logger.info(f"Планировщик квоты: задание {name} (приоритет {priority})")
+        return job
+
+    def unregister(self, job: QuotaJob) -> None:
+        with self._cond:
+            if job in self._jobs:
+                self._jobs.remove(job)
+
+    @property
+    def jobs(self) -> list[QuotaJob]:
+        with self._cond:
+            return list(self._jobs)
+
+    @contextmanager
+    def slot(self, job: QuotaJob | None):
+        """Занять слот на время одного запроса к API."""
+        if job is None:
+            yield
+            return
+        self.acquire(job)
+        try:
+            yield
+        finally:
+            self.release(job)
+
+    @asynccontextmanager
+    async def aslot(self, job: QuotaJob | None):
+        """Занять слот из корутины (ожидание не блокирует цикл событий)."""
+        if job is None:
+            yield
+            return
+        await self.acquire_async(job)
+        try:
+            yield
+        finally:
+            self.release(job)
+
+    def acquire(self, job: QuotaJob) -> None:
+        started = time.monotonic()
+        ticket = _Ticket(job, next(self._serial))
+        with self._cond:
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    pause = self._paused_until - time.monotonic()
+                    if pause > 0:
+                        self._cond.wait(pause)
+                        continue
+                    if self._in_flight < self.max_concurrency and self._next() is ticket:
+                        break
+                    self._cond.wait()
+            finally:
+                self._waiting.remove(ticket)
+            self._grant(job, started)
+
+    async def acquire_async(self, job: QuotaJob) -> None:
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        event = asyncio.Event()
+        ticket = _Ticket(job, next(self._serial), wake=lambda: loop.call_soon_threadsafe(event.set))
+        with self._cond:
+            self._waiting.append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    pause = self._paused_until - time.monotonic()
+                    if pause <= 0 and self._in_flight < self.max_concurrency and self._next() is ticket:
+                        self._waiting.remove(ticket)
+                        self._grant(job, started)
+                        return
+                    # Пробуждение после этой точки не потеряется: event.set придёт в цикл
+                    event.clear()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(event.wait(), pause)
+                    except TimeoutError:
+                        pass
+                else:
+                    await event.wait()
+        except BaseException:
+            # Отмена корутины: убрать заявку, чтобы слот достался следующему
+            with self._cond:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    self._wake()
+            raise
+
+    def _grant(self, job: QuotaJob, started: float) -> None:
+        """Выдать слот (под self._cond)."""
+        self._in_flight += 1
+        job.in_flight += 1
+        job.requests += 1
+        job.last_served = next(self._serial)
+        job.waited_seconds += time.monotonic() - started
+        # Свободных слотов может быть больше одного — разбудить следующих
+        self._wake()
+
+    def release(self, job: QuotaJob) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            job.in_flight -= 1
+            self._wake()
+
+    def backoff(self, seconds: float) -> None:
+        """Приостановить выдачу слотов всем заданиям (ответ 429 — квота исчерпана)."""
+        with self._cond:
+            until = time.monotonic() + seconds
+            if until > self._paused_until:
+                self._paused_until = until
+                logger.warning(f"Квота API исчерпана — пауза запросов всех заданий {seconds:.0f} с")
+            self._wake()
+
+    def _wake(self) -> None:
+        """Разбудить ждущих слот: потоки и корутины (под self._cond)."""
+        self._cond.notify_all()
+        for ticket in self._waiting:
+            if ticket.wake is not None:
+                ticket.wake()
+
+    def _next(self) -> _Ticket:
+        """Чей запрос следующий: класс приоритета, затем fair share внутри класса."""
+        return min(
+            self._waiting,
+            key=lambda t: (t.job.priority, t.job.in_flight, t.job.last_served, t.serial),
+        )
+
+
+_scheduler: RequestScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(max_concurrency: int | None = None) -> RequestScheduler:
+    """Планировщик процесса (создаётся при первом обращении).
+
+    max_concurrency меняет лимит уже созданного планировщика.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler(max_concurrency or DEFAULT_MAX_CONCURRENCY)
+        elif max_concurrency:
+            with _scheduler._cond:
+                _scheduler.max_concurrency = max(1, max_concurrency)
+                _scheduler._wake()
+        return _scheduler
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Ошибка API — превышение квоты (HTTP 429 / RESOURCE_EXHAUSTED)."""
+    code = getattr(error, "code", None)
+    if code == 429:
+        return True
+    text = str(error)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text
@@ -0,0 +1,106 @@
+"""Двухуровневая маршрутизация моделей: быстрая для разведки, сильная для плотных чанков.
+
+Определение контекста и первый проход по чанку выполняет быстрая модель.
+По результату первого прохода чанк классифицируется: плотный (много
+параметров или ответ пришлось делить из-за лимита токенов) или с низкой
+уверенностью значений — такой чанк повторно обрабатывается сильной моделью
+(config.FIXED_MODEL). Остальные чанки принимаются по ответу быстрой модели.
+
+При исчерпании бюджета задания (processing.budget) маршрутизатор
+понижается: чанки обрабатываются одним проходом быстрой модели.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+
+from gemini.schema import ChunkExtraction, CHECKLIST_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RoutingDecision:
+    """Решение маршрутизатора по одному чанку."""
+    chunk: str  # "файл, стр. N–M"
+    model: str  # Модель, чей результат принят
+    escalated: bool
+    reason: str
+
+    def __str__(self) -> str:
+        return f"{self.model} ({self.reason})"
+
+
+class ModelRouter:
+    """Выбор модели для этапов pipeline и эскалация плотных чанков."""
+
+    def __init__(self, fast_model: str, strong_model: str, enabled: bool = True,
+                 dense_fields: int = 8, low_confidence_share: float = 0.3):
+        """
+        Args:
+            fast_model: Быстрая модель (контекст, первый проход).
+            strong_model: Сильная модель (плотные чанки, верификация).
+            enabled: False — все запросы идут в strong_model (принудительно одна модель).
+            dense_fields: Чанк плотный, если первый проход нашёл столько параметров или больше.
+            low_confidence_share: Доля значений medium/low, при которой чанк эскалируется.
+        """
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.enabled = enabled
+        self.dense_fields = dense_fields
+        self.low_confidence_share = low_confidence_share
+        self.decisions: list[RoutingDecision] = []
+        # Бюджет задания на исходе: только быстрая модель, без эскалации
+        self.downgraded = False
+        self._lock = threading.Lock()
+
+    @property
+    def context_model(self) -> str:
+        return self.fast_model if self.enabled else self.strong_model
+
+    @property
+    def verification_model(self) -> str:
+        return self.strong_model
+
+    def assess(self, results: list[tuple[object, ChunkExtraction]],
+               truncated: bool) -> tuple[bool, str]:
+        """Нужно ли повторить чанк сильной моделью по итогам первого прохода.
+
+        Args:
+            results: Пары (чанк, извлечение) первого прохода.
+            truncated: Ответ первого прохода обрезался по лимиту токенов.
+
+        Returns:
+            (эскалировать, причина)
+        """
+        if truncated:
+            return True, "плотный: ответ обрезан по лимиту токенов"
+        if not results:
+            return True, "первый проход не дал результата"
+
+        values = [
+            getattr(extraction, f) for _, extraction in results for f, _ in CHECKLIST_FIELDS
+        ]
+        values = [v for v in values if v is not None]
+        if len(values) >= self.dense_fields:
+            return True, f"плотный, параметров: {len(values)}"
+
+        uncertain = sum(1 for v in values if v.source.confidence in ("medium", "low"))
+        if values and uncertain / len(values) >= self.low_confidence_share:
+            return True, f"низкая уверенность: {uncertain} из {len(values)}"
+
+        return False, f"разреженный, параметров: {len(values)}"
+
+    def record(self, decision: RoutingDecision) -> None:
+        with self._lock:
+            self.decisions.append(decision)
+        logger.info(f"Маршрутизация {decision.chunk}: {decision}")
+
+    def summary(self) -> str:
+        """Сводка решений: сколько чанков принято от какой модели."""
+        counts: dict[str, int] = {}
+        for d in self.decisions:
+            counts[d.model] = counts.get(d.model, 0) + 1
+        escalated = sum(1 for d in self.decisions if d.escalated)
+        by_model = ", ".join(f"{m}: {n}" for m, n in counts.items())
+        return f"{by_model}; эскалировано: {escalated}"
@@ -0,0 +1,192 @@
+"""Компактный формат обмена с Gemini (экономия выходных и входных токенов).
+
+Извлечение: модель отвечает объектом с ключами-кодами чек-листа (A.1 … H.4)
+и короткими ключами полей, без null-значений:
+
+    {"A.2":{"v":"CTX 450","p":1,"s":"Введение","q":"Model: CTX 450","c":"h"}}
+
+Верификация: агрегированные данные передаются так же компактно — без
+подписей параметров, без пустых полей, с таблицей файлов-источников.
+Декодер принимает и прежний развёрнутый формат (имена полей ChunkExtraction).
+"""
+
+import json
+import logging
+
+from gemini.schema import CHECKLIST_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Короткие ключи значения → поля ExtractedValue
+VALUE_KEYS = {"v": "value", "st": "status", "n": "note"}
+# Короткие ключи источника → поля SourceRef
+SOURCE_KEYS = {"p": "page", "s": "section", "q": "quote", "c": "confidence",
+               "f": "file", "t": "doc_type"}
+
+CONFIDENCE_SHORT = {"high": "h", "medium": "m", "low": "l"}
+CONFIDENCE_FULL = {v: k for k, v in CONFIDENCE_SHORT.items()}
+
+# Маппинг param_id → имя поля в ChunkExtraction и обратно
+PARAM_ID_TO_FIELD: dict[str, str] = {}
+FIELD_TO_PARAM_ID: dict[str, str] = {}
+for _field_name, _label in CHECKLIST_FIELDS:
+    # "A.1. Наименование..." → "A.1"
+    _param_id = _label.split(".")[0] + "." + _label.split(".")[1].split(" ")[0] if "." in _label else ""
+    _param_id = _param_id.strip()
+    PARAM_ID_TO_FIELD[_param_id] = _field_name
+    # Также без пробелов и без точки ("A1")
+    PARAM_ID_TO_FIELD[_param_id.replace(" ", "")] = _field_name
+    PARAM_ID_TO_FIELD[_param_id.replace(".", "")] = _field_name
+    FIELD_TO_PARAM_ID[_field_name] = _param_id
+
+
+def field_name_for(key: str) -> str | None:
+    """Имя поля ChunkExtraction по ключу ответа: 'A.1', 'a.1', 'A1' или 'a1_name'."""
+    key = (key or "").strip()
+    if key in FIELD_TO_PARAM_ID:
+        return key
+    return PARAM_ID_TO_FIELD.get(key.upper())
+
+
+def decode_extraction(raw: dict | list) -> dict:
+    """Развернуть компактный ответ извлечения в словарь полей ChunkExtraction.
+
+    Поддерживает:
+        - компактный объект {"A.1": {"v": ..., "p": ...}};
+        - развёрнутый объект {"a1_name": {"value": ..., "source": {...}}};
+        - список [{"param_id": "A.1", ...}] (Gemini иногда возвращает массив).
+    """
+    if isinstance(raw, list):
+        logger.info("Gemini вернул список — конвертируем в словарь")
+        items = {}
+        for item in raw:
+            if not isinstance(item, dict):
+                continue
+            key = item.get("param_id") or item.get("id") or ""
+            items[key] = {k: v for k, v in item.items() if k not in ("param_id", "id")}
+        raw = items
+
+    if not isinstance(raw, dict):
+        return {}
+
+    result = {}
+    for key, val in raw.items():
+        field_name = field_name_for(key)
+        if field_name is None:
+            logger.warning(f"Неизвестный param_id: {key}")
+            continue
+        if val is None:
+            continue
+        result[field_name] = _expand_value(val)
+    return result
+
+
+def _expand_value(val) -> dict:
+    """Компактное значение → объект ExtractedValue (развёрнутое не трогаем)."""
+    if not isinstance(val, dict):
+        return {"value": str(val)}
+    if "value" in val or "source" in val:
+        return val
+
+    expanded: dict = {}
+    source: dict = {}
+    for short, full in VALUE_KEYS.items():
+        if short in val:
+            expanded[full] = val[short]
+    for short, full in SOURCE_KEYS.items():
+        if short in val:
+            source[full] = val[short]
+    if "confidence" in source:
+        conf = str(source["confidence"] or "").strip().lower()
+        source["confidence"] = CONFIDENCE_FULL.get(conf, conf)
+    expanded["source"] = source
+    return expanded
+
+
+def encode_extraction(extraction) -> dict:
+    """ChunkExtraction → компактный объект (обратное к decode_extraction)."""
+    data: dict = {}
+    for field_name, _label in CHECKLIST_FIELDS:
+        ev = getattr(extraction, field_name, None)
+        if ev is None:
+            continue
+        entry: dict = {"v": ev.value}
+        for short, full in SOURCE_KEYS.items():
+            value = getattr(ev.source, full)
+            if value is None or value == "":
+                continue
+            if full == "confidence":
+                value = CONFIDENCE_SHORT.get(value, value)
+            entry[short] = value
+        if ev.status:
+            entry["st"] = ev.status
+        if ev.note:
+            entry["n"] = ev.note
+        data[FIELD_TO_PARAM_ID[field_name]] = entry
+    return data
+
+
+def encode_resolved(resolved: dict, confirmed: set[str] | None = None) -> str:
+    """Компактный JSON агрегированных данных для верификации.
+
+    Пустые параметры перечисляются только кодами в "missing", источники
+    вынесены в таблицу "src" и указываются индексом. Параметры из confirmed
+    (цитата подтверждена по текстовому слою) передаются только значением
+    в "ok" — без источника и повторной проверки.
+    """
+    sources: list[str] = []
+    source_index: dict[tuple[str, str], int] = {}
+    values: dict[str, dict] = {}
+    missing: list[str] = []
+    ok: dict[str, str] = {}
+
+    for field_name, _label in CHECKLIST_FIELDS:
+        param_id = FIELD_TO_PARAM_ID[field_name]
+        ev = resolved.get(field_name)
+        if ev is None:
+            missing.append(param_id)
+            continue
+        if confirmed and field_name in confirmed:
+            ok[param_id] = ev.value
+            continue
+
+        entry: dict = {"v": ev.value}
+        src = ev.source
+        if src.file:
+            key = (src.file, src.doc_type)
+            if key not in source_index:
+                source_index[key] = len(sources)
+                sources.append(f"{src.file} ({src.doc_type})" if src.doc_type else src.file)
+            entry["f"] = source_index[key]
+        if src.page is not None:
+            entry["p"] = src.page
+        if src.section:
+            entry["s"] = src.section
+        if src.quote:
+            entry["q"] = src.quote
+        if src.confidence and src.confidence != "high":
+            entry["c"] = CONFIDENCE_SHORT.get(src.confidence, src.confidence)
+        if ev.status:
+            entry["st"] = ev.status
+        if ev.note and "OCR" in ev.note.upper():
+            entry["n"] = ev.note
+        values[param_id] = entry
+
+    data = {"src": sources, "val": values, "missing": missing}
+    if ok:
+        data["ok"] = ok
+    return dumps_compact(data)
+
+
+def dumps_compact(data) -> str:
+    """JSON без пробелов и отступов."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов текста (≈ 3 символа на токен для RU/EN).
+
+    Только для оценки задания до запуска (processing.estimate); фактический
+    расход берётся из usage_metadata ответов (GeminiClient.usage_by_stage).
+    """
+    return (len(text) + 2) // 3
@@ -13,7 +13,9 @@ from PyQt6.QtGui import QIcon, QDragEnterEvent, QDropEvent
 
 from config import load_config, SUPPORTED_EXTENSIONS
 from scanner.folder_scanner import scan_path, ScannedFile
-from worker import PipelineWorker
+from processing.checkpoint import JobCheckpoint
+from processing.project import ProjectState
+from worker import EstimateWorker, PipelineWorker
 
 
 class MainWindow(QMainWindow):
@@ -25,6 +27,7 @@ class MainWindow(QMainWindow):
 
         self.files: list[ScannedFile] = []
         self.worker: PipelineWorker | None = None
+        self.estimate_worker: EstimateWorker | None = None
         self.last_output_path: str = ""
 
         self._init_ui()
@@ -69,6 +72,13 @@ class MainWindow(QMainWindow):
         self.btn_analyze.setEnabled(False)
         action_layout.addWidget(self.btn_analyze)
 
+        self.btn_estimate = QPushButton("Оценить")
+        self.btn_estimate.setMinimumHeight(40)
+        self.btn_estimate.setToolTip("Страницы, запросы, токены, стоимость и время — без запросов к API")
+        self.btn_estimate.clicked.connect(self._on_estimate)
+        self.btn_estimate.setEnabled(False)
+        action_layout.addWidget(self.btn_estimate)
+
         self.btn_cancel = QPushButton("Отмена")
         self.btn_cancel.setMinimumHeight(40)
         self.btn_cancel.clicked.connect(self._on_cancel)
@@ -158,6 +168,7 @@ class MainWindow(QMainWindow):
         self.files.clear()
         self.file_list.clear()
         self.btn_analyze.setEnabled(False)
+        self.btn_estimate.setEnabled(False)
         self.preview.clear()
         self.log_text.clear()
         self.status_label.setText("")
@@ -186,8 +197,39 @@ class MainWindow(QMainWindow):
 
         self.last_output_path = save_path
 
+        # Прерванный анализ того же набора файлов — предложить продолжить
+        resume = False
+        if config.get("checkpoints", True):
+            checkpoint = JobCheckpoint.for_files(
+                self.files, config.get("chunk_size", 7), config.get("overlap", 2),
+            )
+            saved = checkpoint.load()
+            if saved.has_progress:
+                answer = QMessageBox.question(
+                    self, "Незавершённый анализ",
+                    f"Найден прерванный анализ этих файлов "
+                    f"(обработано чанков: {len(saved.chunks)}).\n"
+                    "Продолжить с места остановки?",
+                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                )
+                resume = answer == QMessageBox.StandardButton.Yes
+
+        # Карточка уже анализировалась — предложить использовать прошлый анализ
+        incremental = True
+        if config.get("incremental_projects", True) and ProjectState.for_card(Path(save_path)).load().exists:
+            answer = QMessageBox.question(
+                self, "Прошлый анализ карточки",
+                "Эта карточка уже анализировалась.\n"
+                "Использовать прошлые результаты (заново обрабатываются только "
+                "новые и изменённые файлы)?\n\n"
+                "«Нет» — новый анализ всех файлов.",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            )
+            incremental = answer == QMessageBox.StandardButton.Yes
+
         # Запуск pipeline
         self.btn_analyze.setEnabled(False)
+        self.btn_estimate.setEnabled(False)
         self.btn_cancel.setEnabled(True)
         self.btn_cancel.setVisible(True)
         self.btn_save.setEnabled(False)
@@ -197,13 +239,23 @@ class MainWindow(QMainWindow):
         self.log_text.clear()
         self.preview.clear()
 
-        self.worker = PipelineWorker(self.files, Path(save_path))
+        self.worker = PipelineWorker(self.files, Path(save_path), resume=resume, incremental=incremental)
         self.worker.progress.connect(self._on_progress)
         self.worker.finished.connect(self._on_finished)
         self.worker.log.connect(self._on_log)
         self.worker.preview_ready.connect(self._on_preview)
         self.worker.start()
 
+    def _on_estimate(self):
+        if not self.files or self.estimate_worker:
+            return
+        self.btn_estimate.setEnabled(False)
+        self.status_label.setText("Оценка задания...")
+        self.status_label.setStyleSheet("")
+        self.estimate_worker = EstimateWorker(list(self.files))
+        self.estimate_worker.finished.connect(self._on_estimate_finished)
+        self.estimate_worker.start()
+
     def _on_cancel(self):
         if self.worker:
             self.worker.cancel()
@@ -241,6 +293,7 @@ class MainWindow(QMainWindow):
 
     def _on_finished(self, success: bool, output_path: str, error: str):
         self.btn_analyze.setEnabled(True)
+        self.btn_estimate.setEnabled(self.estimate_worker is None)
         self.btn_cancel.setEnabled(False)
         self.btn_cancel.setVisible(False)
         self.progress_bar.setVisible(False)
@@ -259,11 +312,28 @@ class MainWindow(QMainWindow):
 
         self.worker = None
 
+    def _on_estimate_finished(self, estimate, error: str):
+        self.estimate_worker = None
+        self.btn_estimate.setEnabled(bool(self.files) and self.worker is None)
+        self.status_label.setText("")
+        if estimate is None:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось оценить задание:\n{error}")
+            return
+        lines = estimate.summary()
+        self._on_log("Предварительная оценка:")
+        for line in lines:
+            self._on_log(f"  {line}")
+        QMessageBox.information(self, "Оценка задания", "\n".join(lines))
+
     def _on_log(self, message: str):
         self.log_text.append(message)
 
     def _on_preview(self, html: str):
+        # Промежуточные превью приходят во время анализа — не сбрасывать прокрутку
+        scroll = self.preview.verticalScrollBar()
+        position = scroll.value()
         self.preview.setHtml(html)
+        scroll.setValue(position)
 
     # --- Helpers ---
     def _add_files_from_path(self, path: Path):
@@ -276,3 +346,4 @@ class MainWindow(QMainWindow):
                 self.file_list.addItem(item)
 
         self.btn_analyze.setEnabled(len(self.files) > 0)
+        self.btn_estimate.setEnabled(len(self.files) > 0 and self.worker is None)
@@ -1,4 +1,4 @@
-"""Диалог настроек: API ключ, модель, размер чанка."""
+"""Диалог настроек: API ключ, модель, размер чанка, бюджет задания."""
 
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
@@ -58,6 +58,34 @@ class SettingsDialog(QDialog):
         proc_group.setLayout(proc_layout)
         layout.addWidget(proc_group)
 
+        # --- Бюджет задания ---
+        budget_group = QGroupBox("Бюджет задания")
+        budget_layout = QFormLayout()
+
+        self.budget_minutes_spin = QSpinBox()
+        self.budget_minutes_spin.setRange(0, 24 * 60)
+        self.budget_minutes_spin.setValue(int(self.config.get("job_time_budget_minutes") or 0))
+        self.budget_minutes_spin.setSuffix(" мин")
+        self.budget_minutes_spin.setSpecialValueText("без ограничения")
+        budget_layout.addRow("Время:", self.budget_minutes_spin)
+
+        self.budget_tokens_spin = QSpinBox()
+        self.budget_tokens_spin.setRange(0, 100_000)
+        self.budget_tokens_spin.setValue(int(self.config.get("job_token_budget") or 0) // 1000)
+        self.budget_tokens_spin.setSuffix(" тыс. токенов")
+        self.budget_tokens_spin.setSpecialValueText("без ограничения")
+        budget_layout.addRow("Токены:", self.budget_tokens_spin)
+
+        budget_hint = QLabel(
+            "Сначала обрабатываются паспорта и плотные страницы.\n"
+            "Не вошедшие в бюджет источники перечисляются в примечаниях карточки."
+        )
+        budget_hint.setStyleSheet("color: gray; font-size: 9pt;")
+        budget_layout.addRow("", budget_hint)
+
+        budget_group.setLayout(budget_layout)
+        layout.addWidget(budget_group)
+
         # --- Кнопки ---
         btn_layout = QHBoxLayout()
         btn_layout.addStretch()
@@ -75,5 +103,7 @@ class SettingsDialog(QDialog):
     def _save(self):
         self.config["api_key"] = self.api_key_input.text().strip()
         self.config["chunk_size"] = self.chunk_spin.value()
+        self.config["job_time_budget_minutes"] = self.budget_minutes_spin.value()
+        self.config["job_token_budget"] = self.budget_tokens_spin.value() * 1000
         save_config(self.config)
         self.accept()
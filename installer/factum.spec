@@ -28,6 +28,7 @@ a = Analysis(
         # === Модули проекта ===
         'config',
         'worker',
+        'pipeline',
         'scanner',
         'scanner.folder_scanner',
         'scanner.file_classifier',
@@ -39,15 +40,36 @@ a = Analysis(
         'gemini.schema',
         'gemini.prompts',
         'gemini.client',
+        'gemini.json_salvage',
+        'gemini.wire',
+        'gemini.routing',
+        'gemini.quota',
+        'gemini.errors',
         'processing',
         'processing.aggregator',
         'processing.conflict_resolver',
         'processing.validator',
         'processing.units',
+        'processing.saturation',
+        'processing.scheduler',
+        'processing.checkpoint',
+        'processing.project',
+        'processing.estimate',
+        'processing.budget',
+        'processing.local_extractor',
+        'processing.gap_fill',
+        'processing.page_index',
+        'processing.page_text',
+        'processing.quote_check',
+        'processing.terms',
         'output',
         'output.docx_generator',
         'output.canonical',
         'output.formatter',
+        'output.json_export',
+        'service',
+        'service.store',
+        'service.server',
         'gui',
         'gui.main_window',
         'gui.settings_dialog',
@@ -0,0 +1,19 @@
+"""Экспорт карточки в JSON (для сервиса и внешних систем)."""
+
+from gemini.schema import ExtractedValue, CHECKLIST_FIELDS
+from gemini.wire import FIELD_TO_PARAM_ID
+
+
+def card_to_dict(resolved: dict[str, ExtractedValue | None], notes: list[str]) -> dict:
+    """Карточка как словарь: параметры по кодам чек-листа (A.1 … H.4) и примечания.
+
+    Отсутствующий параметр — null.
+    """
+    params = {}
+    for field_name, label in CHECKLIST_FIELDS:
+        ev = resolved.get(field_name)
+        entry = {"label": label, "value": None}
+        if ev is not None:
+            entry.update(ev.model_dump(exclude_defaults=True))
+        params[FIELD_TO_PARAM_ID[field_name]] = entry
+    return {"params": params, "notes": list(notes)}
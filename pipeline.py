@@ -0,0 +1,1070 @@
+"""6-этапный pipeline обработки документов без зависимости от Qt.
+
+Используется GUI (через QThread-воркер worker.PipelineWorker) и
+пакетным запуском из командной строки (batch.py).
+
+Ядро асинхронное: run() запускает цикл asyncio в вызывающем (фоновом)
+потоке, запросы к API идут одновременно, а cancel() из другого потока
+отменяет задачу pipeline — запросы в работе прерываются сразу.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from config import load_config, FIXED_MODEL, FAST_MODEL
+from scanner.folder_scanner import ScannedFile
+from chunking.chunk_manager import create_chunks, head_chunk, Chunk
+from gemini.client import STAGE_EXTRACTION, STAGE_VERIFICATION, GeminiClient
+from gemini.routing import ModelRouter
+from gemini.quota import PRIORITY_INTERACTIVE, QuotaJob, get_scheduler
+from gemini.errors import ApiError, get_breaker
+from gemini.wire import FIELD_TO_PARAM_ID, encode_resolved
+from gemini.schema import ChunkExtraction, CHECKLIST_FIELDS, SECTION_GROUPS
+from processing.aggregator import IncrementalAggregator, apply_verification
+from processing.conflict_resolver import SOURCE_PRIORITY
+from processing.checkpoint import CheckpointState, JobCheckpoint, chunk_key, restore_parts
+from processing.project import ProjectDelta, ProjectState, analysis_version, merge_verification
+from processing.saturation import SaturationTracker
+from processing.scheduler import order_chunks
+from processing.estimate import RunStats, ThroughputHistory
+from processing.budget import JobBudget
+from processing.local_extractor import (
+    LOCAL_EXTRACTION_POLICIES, LocalExtraction, extract_local, merge_local,
+)
+from processing.gap_fill import GAP_FILL_POLICIES, DEFAULT_MAX_REQUESTS, plan_gap_requests
+from processing.page_index import PageIndex, get_page_index
+from processing.page_text import PageTextStore
+from processing.quote_check import needs_model_check, summary as quote_summary, verify_quotes
+from processing.validator import validate_completeness
+from output.docx_generator import generate_card
+from output.json_export import card_to_dict
+
+logger = logging.getLogger(__name__)
+
+# Группы, для которых контекст оборудования отличает внешние подключения
+# от внутренних параметров узлов (см. промпт извлечения)
+_CONTEXT_SENSITIVE_GROUPS = ["D", "E", "F"]
+
+
+@dataclass
+class PipelineResult:
+    """Итог обработки одного набора файлов."""
+    success: bool
+    output_path: str = ""
+    error: str = ""
+    card: dict | None = None  # Карточка в JSON (output.json_export.card_to_dict)
+
+
+def _ignore(*args) -> None:
+    pass
+
+
+class Pipeline:
+    """6-этапный pipeline обработки.
+
+    Этапы:
+        1. Подготовка чанков
+        2. Определение контекста оборудования
+        3. Извлечение параметров
+        4. Агрегация
+        5. Верификация
+        6. Формирование DOCX
+
+    Callbacks:
+        on_progress(stage, current, total, message):
+            stage: 1-6, current: текущий шаг, total: всего шагов, message: описание
+        on_log(message):
+            Сообщение для лога
+        on_preview(html):
+            HTML-превью карточки (промежуточное на этапе 3 и итоговое)
+    """
+
+    def __init__(self, files: list[ScannedFile], output_path: Path, resume: bool = False,
+                 config: dict | None = None, priority: int = PRIORITY_INTERACTIVE,
+                 incremental: bool = True,
+                 checkpoint_dir: Path | None = None,
+                 on_progress: Callable[[int, int, int, str], None] | None = None,
+                 on_log: Callable[[str], None] | None = None,
+                 on_preview: Callable[[str], None] | None = None):
+        self.files = files
+        self.output_path = output_path
+        self.resume = resume  # Продолжить прерванное задание по контрольным точкам
+        self.config = config  # None — загрузить из ~/.factum/config.json
+        self.priority = priority  # Класс приоритета в общем планировщике запросов
+        # Использовать прошлый анализ проекта карточки; False — анализ заново
+        # (результат всё равно сохраняется в проект для следующих запусков)
+        self.incremental = incremental
+        # Папка контрольных точек; None — ~/.factum/jobs по отпечатку файлов.
+        # Узлы сервиса задают общую папку, чтобы задание продолжалось на другой машине
+        self.checkpoint_dir = checkpoint_dir
+        self._progress = on_progress or _ignore
+        self._log = on_log or _ignore
+        self._preview = on_preview or _ignore
+        self._is_cancelled = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+        self._last_chunk_error = ""
+        self._local_policy = "off"  # Локальное извлечение (processing.local_extractor)
+        self._local_fields = 0
+        self._local_chunks = 0  # Чанков, разобранных без запроса к модели
+        self._gap_policy = "off"  # Целевой поиск пропусков (processing.gap_fill)
+
+    def cancel(self):
+        """Отменить обработку (можно вызывать из любого потока)."""
+        self._is_cancelled = True
+        loop, task = self._loop, self._task
+        if loop is not None and task is not None:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # Цикл уже завершён
+
+    @property
+    def cancelled(self) -> bool:
+        return self._is_cancelled
+
+    def run(self) -> PipelineResult:
+        config = self.config if self.config is not None else load_config()
+        scheduler = get_scheduler(config.get("api_max_concurrency"))
+        get_breaker(config.get("circuit_failure_threshold"), config.get("circuit_cooldown_seconds"))
+        quota = scheduler.register(Path(self.output_path).stem, self.priority)
+        try:
+            return asyncio.run(self._arun(config, quota))
+        except ApiError as e:
+            # Неверный ключ — остальные запросы не отправляются
+            logger.error(f"Задание прервано: {e}")
+            self._log(f"ОШИБКА: {e}")
+            if config.get("checkpoints", True):
+                self._log("  Готовые результаты сохранены — задание можно продолжить")
+            return PipelineResult(False, "", str(e))
+        except Exception as e:
+            logger.exception("Ошибка pipeline")
+            return PipelineResult(False, "", str(e))
+        finally:
+            scheduler.unregister(quota)
+
+    async def _arun(self, config: dict, quota: QuotaJob) -> PipelineResult:
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        try:
+            if self._is_cancelled:
+                return PipelineResult(False, "", "Отменено")
+            return await self._run_pipeline(config, quota)
+        except asyncio.CancelledError:
+            self._log("Обработка отменена")
+            return PipelineResult(False, "", "Отменено")
+        finally:
+            self._loop = self._task = None
+
+    async def _run_pipeline(self, config: dict, quota: QuotaJob) -> PipelineResult:
+        api_key = config.get("api_key", "")
+        model = FIXED_MODEL
+        chunk_size = config.get("chunk_size", 7)
+        overlap = config.get("overlap", 2)
+
+        if not api_key:
+            return PipelineResult(False, "", "API ключ не настроен. Откройте Настройки.")
+
+        shards = config.get("extraction_shards") if config.get("sharded_extraction") else None
+        self._local_policy = config.get("local_extraction", "reduce")
+        if self._local_policy not in LOCAL_EXTRACTION_POLICIES:
+            raise ValueError(f"Неизвестный режим локального извлечения: {self._local_policy}")
+        self._gap_policy = config.get("gap_fill", "fill")
+        if self._gap_policy not in GAP_FILL_POLICIES:
+            raise ValueError(f"Неизвестный режим поиска пропусков: {self._gap_policy}")
+        router = ModelRouter(
+            fast_model=config.get("fast_model", FAST_MODEL),
+            strong_model=model,
+            enabled=config.get("model_routing", True),
+            dense_fields=config.get("routing_dense_fields", 8),
+            low_confidence_share=config.get("routing_low_confidence_share", 0.3),
+        )
+        client = GeminiClient(api_key=api_key, model=model, shards=shards, router=router, quota=quota)
+
+        started = time.monotonic()
+        budget = JobBudget.from_config(config)
+
+        # === ЭТАП 1: ПОДГОТОВКА ЧАНКОВ ===
+        self._progress(1, 0, 1, "Подготовка чанков...")
+        self._log(f"Этап 1/6: Подготовка. Файлов: {len(self.files)}, чанк: {chunk_size} стр., перекрытие: {overlap} стр.")
+
+        chunks = create_chunks(self.files, chunk_size=chunk_size, overlap=overlap)
+        self._log(f"  Создано чанков: {len(chunks)}")
+
+        # Индекс страниц: заново читаются только новые и изменённые файлы
+        page_index: PageIndex | None = None
+        fingerprints: dict[str, str] = {}
+        if config.get("page_index", True):
+            try:
+                page_index = get_page_index(config.get("page_index_days"))
+                fingerprints, indexed = await asyncio.to_thread(page_index.update, self.files, chunks)
+                self._log(f"  Индекс страниц: проиндексировано файлов {indexed}, "
+                          f"из индекса {len(fingerprints) - indexed}")
+            except Exception as e:
+                page_index = None
+                logger.warning(f"Индекс страниц недоступен: {e}")
+                self._log(f"  Индекс страниц недоступен: {e}")
+        if budget.enabled:
+            self._log(f"  Бюджет задания: {budget.describe()} — чанки с наибольшей отдачей обрабатываются первыми")
+
+        # Контрольные точки: результаты запросов дописываются в журнал задания
+        checkpoint = None
+        saved = CheckpointState()
+        if config.get("checkpoints", True):
+            if self.checkpoint_dir is not None:
+                checkpoint = JobCheckpoint(self.checkpoint_dir / f"c{chunk_size}-o{overlap}")
+            else:
+                checkpoint = JobCheckpoint.for_files(self.files, chunk_size, overlap)
+            if self.resume:
+                saved = checkpoint.load()
+                self._log(
+                    f"  Продолжение задания: контекст {'сохранён' if saved.context else 'не сохранён'}, "
+                    f"готово чанков: {len(saved.chunks)}, "
+                    f"верификация {'сохранена' if saved.verification is not None else 'не выполнена'}"
+                )
+            else:
+                checkpoint.reset(self.files)
+
+        # Проект карточки: чанки неизменённых файлов берутся из прошлого анализа
+        project = None
+        delta = ProjectDelta()
+        models = f"{router.fast_model} → {router.strong_model}" if router.enabled else router.strong_model
+        version = analysis_version(config)
+        if config.get("incremental_projects", True):
+            project = ProjectState.for_card(self.output_path)
+            if not self.incremental:
+                self._log("  Проект карточки: новый анализ, прошлые результаты не используются")
+            elif project.load().exists:
+                delta = project.delta(self.files, chunk_size, overlap, models, version)
+                if delta.stale:
+                    self._log(f"  Проект карточки: анализ заново — {delta.stale}")
+                for key, parts in project.cached_chunks(delta.kept).items():
+                    saved.chunks.setdefault(key, parts)
+                self._log(
+                    f"  Проект карточки: без изменений {len(delta.kept)}, "
+                    f"добавлено {len(delta.added)}, удалено {len(delta.removed)} файл(ов)"
+                )
+        restored = {i for i, c in enumerate(chunks) if chunk_key(c) in saved.chunks}
+
+        # Порядок обработки: по ожидаемой отдаче или в порядке файлов
+        if config.get("chunk_order", "priority") == "priority" or budget.enabled:
+            order = await asyncio.to_thread(order_chunks, chunks)
+            self._log("  Порядок обработки: по ожидаемой отдаче (тип документа, позиция, плотность, размер)")
+        else:
+            order = list(range(len(chunks)))
+        if shards:
+            groups_str = " | ".join("".join(g) for g in shards)
+            self._log(f"  Параллельное извлечение по группам: {groups_str}")
+        if self._local_policy != "off":
+            self._log("  Локальное извлечение по текстовому слою: напряжение, мощность, IP, масса, "
+                      "габариты, микроклимат")
+        if router.enabled:
+            self._log(f"  Маршрутизация моделей: {router.fast_model} → {router.strong_model}")
+        else:
+            self._log(f"  Модель: {router.strong_model} (маршрутизация отключена)")
+
+        if self._is_cancelled:
+            return PipelineResult(False, "", "Отменено")
+
+        # === ЭТАП 2: ОПРЕДЕЛЕНИЕ КОНТЕКСТА ОБОРУДОВАНИЯ ===
+        extract_started = time.monotonic()
+        self._progress(2, 0, 1, "Определение контекста оборудования...")
+        self._log("Этап 2/6: Определение типа и подсистем оборудования")
+
+        context_pages = config.get("context_pages", 3)
+        first_chunks = [head_chunk(c, context_pages) for c in _get_first_chunks(chunks)]
+        self._log(f"  Анализ начальных страниц (до {context_pages}): {len(first_chunks)} файл(ов)")
+
+        # Пока определяется контекст, паспорта извлекаются упреждающе без него
+        speculative: dict[int, list[tuple[Chunk, ChunkExtraction]]] = {}
+        speculative_local: dict[int, LocalExtraction] = {}
+        if saved.context:
+            ctx_dict = saved.context
+            self._log("  Контекст восстановлен из контрольной точки")
+        elif delta.kept and project.context:
+            ctx_dict = project.context
+            self._log("  Контекст взят из прошлого анализа проекта")
+        elif config.get("pipelined_context", True):
+            ctx_task = asyncio.create_task(client.determine_equipment_context(first_chunks))
+            speculative = await self._extract_speculatively(
+                client, chunks, [i for i in order if i not in restored], ctx_task, speculative_local,
+            )
+            ctx_dict = await ctx_task
+        else:
+            ctx_dict = await client.determine_equipment_context(first_chunks)
+        if checkpoint and ctx_dict and not saved.context:
+            checkpoint.record_context(ctx_dict)
+
+        equipment_context = ""
+        if ctx_dict:
+            equipment_context = _format_context(ctx_dict)
+            self._log(f"  Контекст определён:\n{_indent_text(equipment_context)}")
+        else:
+            self._log("  ⚠ Контекст не определён, продолжаем без него")
+
+        self._progress(2, 1, 1, "Контекст определён")
+
+        if self._is_cancelled:
+            return PipelineResult(False, "", "Отменено")
+
+        # === ЭТАП 3: ИЗВЛЕЧЕНИЕ ПАРАМЕТРОВ ===
+        total_chunks = len(chunks)
+        extractions: list[tuple[Chunk, ChunkExtraction]] = []
+        # Карточка собирается по мере извлечения, а не пакетно после этапа 3
+        aggregator = IncrementalAggregator()
+        live = _LivePreview(self._preview, config.get("live_preview_interval", 5.0))
+
+        tracker = SaturationTracker(
+            policy=config.get("early_stop", "off"),
+            keep_ties=config.get("early_stop_keep_ties", True),
+            max_skip=config.get("early_stop_max_skip", 0),
+        )
+
+        completed: dict[int, list[tuple[Chunk, ChunkExtraction]]] = {}
+
+        def accept(i: int, results: list[tuple[Chunk, ChunkExtraction]]) -> None:
+            completed[i] = results
+            extractions.extend(results)
+            for part, extraction in results:
+                tracker.add(part, extraction)
+                aggregator.add(part, extraction)
+
+        # Чанки, обработанные до прерывания
+        if restored:
+            self._log(f"  Восстановлено из контрольной точки чанков: {len(restored)}")
+        for i in sorted(restored):
+            accept(i, restore_parts(chunks[i], saved.chunks[chunk_key(chunks[i])]))
+
+        # Упреждающие результаты: группы, зависящие от контекста, повторяем с ним
+        for i, results in speculative.items():
+            chunk = chunks[i]
+            if equipment_context and _has_fields(results, _CONTEXT_SENSITIVE_GROUPS):
+                self._log(
+                    f"  Повтор групп {', '.join(_CONTEXT_SENSITIVE_GROUPS)} с контекстом: "
+                    f"{chunk.source_file}, {chunk.page_range_display}"
+                )
+                results = await client.reextract_groups(
+                    chunk, equipment_context, _CONTEXT_SENSITIVE_GROUPS, results,
+                )
+                if i in speculative_local:
+                    results = merge_local(chunk, results, speculative_local[i])
+            accept(i, results)
+            budget.record_chunk()
+            if checkpoint and results:
+                checkpoint.record_chunk(chunk, results)
+        step = len(restored) + len(speculative)
+        live.update(aggregator, step, total_chunks)
+
+        # Отложенные чанки дописываются в конец очереди и обрабатываются последними.
+        # Одновременно в работе до concurrency чанков; результаты принимаются
+        # в порядке запуска, чтобы карточка не зависела от порядка ответов
+        queue = deque(i for i in order if i not in speculative and i not in restored)
+        deferred: set[int] = set()
+        concurrency = max(1, config.get("extraction_concurrency", 4))
+        launched: deque[int] = deque()
+        finished: dict[int, list[tuple[Chunk, ChunkExtraction]]] = {}
+        running: set[asyncio.Task] = set()
+
+        async def extract(i: int, n: int) -> tuple[int, list[tuple[Chunk, ChunkExtraction]]]:
+            chunk = chunks[i]
+            chunk_started = time.monotonic()
+            results, local = await self._extract_chunk(client, chunk, equipment_context)
+            budget.record_chunk(time.monotonic() - chunk_started)
+            self._log(f"  [{n}/{total_chunks}] {chunk.source_file}, {chunk.page_range_display}:")
+            self._log_extraction(client, results, local)
+            return i, results
+
+        while queue or running:
+            while queue and len(running) < concurrency:
+                i = queue.popleft()
+                chunk = chunks[i]
+                # Решение о пропуске — по уже принятым результатам: новые
+                # результаты могут только насытить карточку сильнее
+                if i not in deferred and tracker.should_skip(chunk):
+                    if tracker.policy == "defer":
+                        deferred.add(i)
+                        queue.append(i)
+                        self._log(
+                            f"  Отложен (не может изменить карточку): "
+                            f"{chunk.source_file}, {chunk.page_range_display}"
+                        )
+                    else:
+                        self._log(
+                            f"  Пропущен (не может изменить карточку): "
+                            f"{chunk.source_file}, {chunk.page_range_display}"
+                        )
+                    continue
+
+                # Бюджет задания: чанк запускается, только если укладывается
+                # в оставшееся время/токены по средним уже извлечённых чанков
+                spent = _spent_tokens(client)
+                if not budget.allows_chunk(spent, len(running)):
+                    if not budget.skipped:
+                        self._log("  Бюджет задания исчерпан: оставшиеся чанки не обрабатываются")
+                    budget.skip(chunk)
+                    logger.info(f"Пропущен (бюджет задания): {chunk.source_file}, {chunk.page_range_display}")
+                    continue
+                if budget.should_downgrade(spent) and not router.downgraded:
+                    router.downgraded = True
+                    self._log(
+                        f"  Бюджет задания израсходован на {budget.used_share(spent):.0%}: "
+                        f"дальше один проход {router.fast_model} без эскалации"
+                    )
+
+                step += 1
+                self._progress(3, step, total_chunks,
+                               f"Извлечение: {chunk.source_file}, {chunk.page_range_display}")
+                self._log(
+                    f"Этап 3/6: Извлечение [{step}/{total_chunks}] "
+                    f"{chunk.source_file}, {chunk.page_range_display}"
+                )
+                launched.append(i)
+                running.add(asyncio.create_task(extract(i, step)))
+
+            if not running:
+                break
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                i, results = task.result()
+                finished[i] = results
+            while launched and launched[0] in finished:
+                i = launched.popleft()
+                results = finished.pop(i)
+                accept(i, results)
+                if checkpoint and results:
+                    checkpoint.record_chunk(chunks[i], results)
+            live.update(aggregator, step, total_chunks)
+
+        live.update(aggregator, step, total_chunks, force=True)
+        extract_seconds = time.monotonic() - extract_started
+        extract_calls = client.usage["calls"]
+        if tracker.skipped:
+            action = "отложено" if tracker.policy == "defer" else "пропущено"
+            self._log(f"  Досрочное завершение ({tracker.policy}): {action} чанков: {tracker.skipped}")
+        if budget.skipped:
+            self._log(f"  Не обработано из-за бюджета задания чанков: {len(budget.skipped)}")
+
+        self._log(_format_usage(client.usage))
+        self._log_stage_usage(client, STAGE_EXTRACTION, "Извлечение")
+        if self._local_fields:
+            self._log(f"  Локальное извлечение: параметров {self._local_fields}, "
+                      f"чанков без запроса к модели: {self._local_chunks}")
+        if router.enabled:
+            self._log(f"  Маршрутизация: {router.summary()}")
+
+        if not extractions:
+            error_detail = self._last_chunk_error or "неизвестная ошибка"
+            return PipelineResult(False, "", f"Не удалось извлечь данные: {error_detail}")
+
+        # === ЭТАП 4: АГРЕГАЦИЯ ===
+        self._progress(4, 0, 1, "Агрегация данных...")
+        self._log("Этап 4/6: Агрегация данных из всех чанков")
+
+        resolved = aggregator.resolve()
+
+        present, missing, warnings = validate_completeness(resolved)
+        self._log(f"  Найдено: {len(present)}, пропущено: {len(missing)}, предупреждений: {len(warnings)}")
+
+        # Целевой поиск пропусков: узкие запросы по страницам-кандидатам из индекса
+        gap_searched = False
+        missing_fields = [f for f, _ in CHECKLIST_FIELDS if resolved.get(f) is None]
+        if (self._gap_policy != "off" and page_index is not None and missing_fields
+                and not budget.exhausted(_spent_tokens(client))):
+            gap_searched = True
+            if await self._fill_gaps(client, page_index, fingerprints, chunks, missing_fields,
+                                     aggregator, equipment_context, concurrency,
+                                     config.get("gap_fill_max_requests", DEFAULT_MAX_REQUESTS)):
+                resolved = aggregator.resolve()
+                present, missing, warnings = validate_completeness(resolved)
+                self._log(f"  После поиска пропусков: найдено {len(present)}, пропущено {len(missing)}")
+
+        # Проверка цитат по текстовому слою: подтверждённые не идут на верификацию
+        confirmed: set[str] = set()
+        if config.get("local_quote_check", True):
+            if page_index is not None:
+                store = await asyncio.to_thread(PageTextStore.from_index, page_index, fingerprints)
+            else:
+                store = await asyncio.to_thread(PageTextStore.from_chunks, chunks)
+            checks = verify_quotes(resolved, store)
+            confirmed = {f for f, check in checks.items() if not needs_model_check(resolved[f], check)}
+            self._log(f"  Цитаты по текстовому слою: {quote_summary(checks)}")
+
+        if self._is_cancelled:
+            return PipelineResult(False, "", "Отменено")
+
+        # === ЭТАП 5: ВЕРИФИКАЦИЯ ===
+        self._progress(5, 0, 1, "Верификация данных...")
+        self._log("Этап 5/6: Верификация — проверка полноты и конфликтов")
+
+        # Формируем компактный JSON для верификации
+        aggregated_json = encode_resolved(resolved, confirmed)
+        self._log(f"  Данные для верификации: {len(aggregated_json)} символов")
+        verification_skipped = False
+        verification_needed = True
+        if saved.verification is not None:
+            verification = saved.verification
+            self._log("  Верификация восстановлена из контрольной точки")
+        elif not missing and len(confirmed) == len(present):
+            verification = None
+            verification_needed = False
+            self._log("  Верификация не требуется: все цитаты подтверждены, пропусков нет")
+        elif gap_searched and self._gap_policy == "replace" and len(confirmed) == len(present):
+            verification = None
+            verification_needed = False
+            self._log("  Верификация не требуется: все цитаты подтверждены, пропуски искались целевыми запросами")
+        elif budget.exhausted(_spent_tokens(client)):
+            verification = None
+            verification_skipped = True
+            self._log("  Верификация пропущена: бюджет задания исчерпан")
+        elif delta.kept and project.verification is not None:
+            # Дельта-верификация: только по добавленным файлам, прежние
+            # замечания — для неизменившихся параметров и оставшихся файлов
+            added_chunks = [c for c in chunks if c.source_file in delta.added]
+            delta_result = None
+            if added_chunks:
+                self._log(f"  Дельта-верификация по добавленным файлам: {', '.join(delta.added)}")
+                delta_result = await client.verify_extraction(
+                    aggregated_json, added_chunks,
+                    equipment_context=equipment_context, delta_files=delta.added,
+                )
+            else:
+                self._log("  Новых файлов нет — используются замечания прошлой верификации")
+            verification = merge_verification(
+                project.verification, delta_result,
+                project.unchanged_fields(resolved), {f.name for f in self.files},
+            )
+            if checkpoint and verification:
+                checkpoint.record_verification(verification)
+        else:
+            verification = await client.verify_extraction(
+                aggregated_json, chunks, equipment_context=equipment_context
+            )
+            if checkpoint and verification:
+                checkpoint.record_verification(verification)
+
+        notes = []
+        if verification:
+            resolved, notes = apply_verification(resolved, verification)
+            self._log(f"  Верификация завершена. Дополнительных примечаний: {len(notes)}")
+        elif verification_skipped:
+            notes.append("Верификация не выполнена: исчерпан бюджет задания.")
+        elif verification_needed:
+            self._log("  Верификация не удалась, используем данные без доп. проверки")
+        # Источники, не вошедшие в бюджет, — в примечаниях карточки
+        notes.extend(budget.notes())
+
+        self._log(_format_usage(client.usage))
+        self._log_stage_usage(client, STAGE_VERIFICATION, "Верификация")
+        self._log(f"  Общая очередь API: {quota.summary()}")
+
+        if self._is_cancelled:
+            return PipelineResult(False, "", "Отменено")
+
+        # === ЭТАП 6: ФОРМИРОВАНИЕ DOCX ===
+        self._progress(6, 0, 1, "Формирование DOCX...")
+        self._log("Этап 6/6: Генерация DOCX-карточки")
+
+        doc = generate_card(
+            resolved=resolved,
+            notes=notes,
+            output_path=self.output_path,
+        )
+
+        # Генерация HTML-превью
+        html = _generate_html_preview(resolved, notes)
+        self._preview(html)
+
+        if checkpoint:
+            checkpoint.finish()
+        if project:
+            project.save(
+                self.files, chunk_size, overlap, chunks, completed,
+                # Неполный анализ — следующий запуск проекта верифицирует заново
+                ctx_dict, None if budget.skipped else verification, aggregator.resolve(),
+                models, version,
+            )
+        self._log(f"Карточка сохранена: {self.output_path}")
+        self._record_throughput(
+            client, len(completed) - len(restored), extract_calls, extract_seconds,
+            concurrency, time.monotonic() - started,
+        )
+        return PipelineResult(True, str(self.output_path), "", card=card_to_dict(resolved, notes))
+
+    async def _extract_chunk(self, client: GeminiClient, chunk: Chunk, equipment_context: str,
+                             ) -> tuple[list[tuple[Chunk, ChunkExtraction]], LocalExtraction | None]:
+        """Извлечь чанк: правила по текстовому слою, затем модель.
+
+        Надёжно найденные локально параметры у модели не запрашиваются;
+        в режиме "skip" чанк, целиком разобранный правилами, не отправляется.
+        """
+        local = None
+        if self._local_policy != "off":
+            try:
+                local = await asyncio.to_thread(extract_local, chunk)
+            except Exception as e:
+                logger.warning(f"Локальное извлечение {chunk.source_file}, {chunk.page_range_display}: {e}")
+        if local is not None:
+            self._local_fields += len(local.found)
+        if local is not None and self._local_policy == "skip" and local.self_sufficient(chunk):
+            self._local_chunks += 1
+            client.last_route = "локальные правила, без запроса к модели"
+            return [(chunk, local.extraction)], local
+
+        results = await client.extract_chunk(
+            chunk, equipment_context=equipment_context,
+            skip_fields=sorted(local.covered) if local else None,
+        )
+        if local is not None:
+            results = merge_local(chunk, results, local)
+        return results, local
+
+    async def _fill_gaps(self, client: GeminiClient, index: PageIndex, fingerprints: dict[str, str],
+                         chunks: list[Chunk], missing: list[str], aggregator: IncrementalAggregator,
+                         equipment_context: str, concurrency: int, max_requests: int) -> int:
+        """Целевые запросы по страницам-кандидатам пропущенных параметров.
+
+        Returns:
+            Число найденных параметров (значения добавлены в aggregator).
+        """
+        requests = await asyncio.to_thread(plan_gap_requests, index, fingerprints, chunks, missing,
+                                           max_requests=max_requests)
+        if not requests:
+            self._log(f"  Поиск пропусков: страниц-кандидатов для {len(missing)} параметр(ов) нет")
+            return 0
+        self._log(f"  Поиск пропусков: {len(missing)} параметр(ов), целевых запросов: {len(requests)}")
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(request):
+            async with semaphore:
+                return request, await client.extract_fields(request.chunk, request.fields, equipment_context)
+
+        found: set[str] = set()
+        for request, extraction in await asyncio.gather(*(run(r) for r in requests)):
+            if extraction is None:
+                continue
+            aggregator.add(request.chunk, extraction)
+            found |= {f for f in request.fields if getattr(extraction, f) is not None}
+        codes = [FIELD_TO_PARAM_ID[f] for f, _ in CHECKLIST_FIELDS if f in found]
+        self._log(f"  Поиск пропусков: найдено параметров {len(found)}"
+                  + (f" ({', '.join(codes)})" if codes else ""))
+        return len(found)
+
+    async def _extract_speculatively(self, client: GeminiClient, chunks: list[Chunk],
+                                     order: list[int], ctx_task: asyncio.Task,
+                                     local: dict[int, LocalExtraction],
+                                     ) -> dict[int, list[tuple[Chunk, ChunkExtraction]]]:
+        """Извлекать чанки паспортов без контекста, пока он определяется.
+
+        Args:
+            local: Заполняется результатами локального извлечения по чанкам.
+
+        Returns:
+            Индекс чанка → результаты извлечения (только обработанные чанки).
+        """
+        results: dict[int, list[tuple[Chunk, ChunkExtraction]]] = {}
+        for i in order:
+            chunk = chunks[i]
+            if ctx_task.done() or self._is_cancelled:
+                break
+            if SOURCE_PRIORITY.get(chunk.source_type, 99) != 0:
+                continue
+
+            self._log(
+                f"  Упреждающее извлечение [{i + 1}/{len(chunks)}] "
+                f"{chunk.source_file}, {chunk.page_range_display}"
+            )
+            results[i], chunk_local = await self._extract_chunk(client, chunk, "")
+            if chunk_local is not None:
+                local[i] = chunk_local
+            self._log_extraction(client, results[i], chunk_local)
+        return results
+
+    def _log_stage_usage(self, client: GeminiClient, stage: str, title: str) -> None:
+        """Измеренный расход токенов одного вида запросов (usage_metadata ответов)."""
+        usage = client.usage_by_stage.get(stage)
+        if usage and usage["calls"]:
+            self._log(_format_usage(usage, f"  {title}"))
+
+    def _record_throughput(self, client: GeminiClient, chunks: int, extract_calls: int,
+                           extract_seconds: float, concurrency: int, total_seconds: float) -> None:
+        """Дописать запуск в историю для оценки будущих заданий (processing.estimate)."""
+        if not chunks or not extract_calls:
+            return  # Всё восстановлено из контрольных точек — скорость не измерена
+        stats = RunStats(
+            chunks=chunks,
+            extract_calls=extract_calls,
+            extract_seconds=round(extract_seconds, 1),
+            concurrency=min(concurrency, get_scheduler().max_concurrency),
+            calls=client.usage["calls"],
+            input_tokens=client.usage["input_tokens"],
+            output_tokens=client.usage["output_tokens"],
+            overhead_seconds=round(total_seconds - extract_seconds, 1),
+        )
+        try:
+            ThroughputHistory().append(stats)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить историю запусков: {e}")
+
+    def _log_extraction(self, client: GeminiClient,
+                        results: list[tuple[Chunk, ChunkExtraction]],
+                        local: LocalExtraction | None = None) -> None:
+        """Записать в лог итог извлечения одного чанка."""
+        if client.last_route:
+            self._log(f"  Модель: {client.last_route}")
+        if local is not None and local.found:
+            codes = ", ".join(FIELD_TO_PARAM_ID[f] for f in local.found)
+            skipped = ", ".join(FIELD_TO_PARAM_ID[f] for f in local.found if f in local.covered)
+            self._log(f"  По текстовому слою: {codes}"
+                      + (f" (у модели не запрашивались: {skipped})" if skipped else ""))
+        if len(results) > 1:
+            parts = ", ".join(c.page_range_display for c, _ in results)
+            self._log(f"  Ответ обрезан — чанк разделён: {parts}")
+        if results:
+            # Подсчитать найденные параметры
+            found = sum(
+                1 for _, result in results
+                for f, _ in CHECKLIST_FIELDS if getattr(result, f) is not None
+            )
+            self._log(f"  Найдено параметров: {found}")
+            if client.last_repairs:
+                self._log(f"  JSON ответа исправлен: {'; '.join(client.last_repairs)}")
+        else:
+            # Состояние клиента своё у каждой задачи — ошибку запомнить для итога этапа 3
+            self._last_chunk_error = client.last_error
+            error_detail = client.last_error or "неизвестная ошибка"
+            self._log(f"  ОШИБКА: {error_detail}")
+
+
+def _has_fields(results: list[tuple[Chunk, ChunkExtraction]], groups: list[str]) -> bool:
+    """Есть ли в извлечениях значения параметров указанных групп."""
+    return any(
+        getattr(extraction, field_name) is not None
+        for _, extraction in results
+        for g in groups
+        for field_name in SECTION_GROUPS[g][1]
+    )
+
+
+def _get_first_chunks(chunks: list[Chunk]) -> list[Chunk]:
+    """Получить первый чанк каждого уникального файла."""
+    seen: set[str] = set()
+    result: list[Chunk] = []
+    for c in chunks:
+        if c.source_file not in seen:
+            seen.add(c.source_file)
+            result.append(c)
+    return result
+
+
+def _format_context(ctx: dict) -> str:
+    """Преобразовать dict контекста оборудования в текст для промпта."""
+    lines = []
+    if ctx.get("equipment_type"):
+        lines.append(f"Тип: {ctx['equipment_type']}")
+    if ctx.get("equipment_name"):
+        lines.append(f"Наименование: {ctx['equipment_name']}")
+    if ctx.get("purpose"):
+        lines.append(f"Назначение: {ctx['purpose']}")
+    if ctx.get("subsystems"):
+        subs = ctx["subsystems"]
+        if isinstance(subs, list):
+            lines.append(f"Подсистемы: {', '.join(subs)}")
+        else:
+            lines.append(f"Подсистемы: {subs}")
+    if ctx.get("power_class"):
+        lines.append(f"Класс мощности: {ctx['power_class']}")
+    if ctx.get("supply_type"):
+        lines.append(f"Тип питания: {ctx['supply_type']}")
+    if ctx.get("notes"):
+        lines.append(f"Примечания: {ctx['notes']}")
+    return "\n".join(lines)
+
+
+def _indent_text(text: str, prefix: str = "    ") -> str:
+    """Добавить отступ к каждой строке текста (для лога)."""
+    return "\n".join(f"{prefix}{line}" for line in text.split("\n"))
+
+
+def _spent_tokens(client: GeminiClient) -> int:
+    return client.usage["input_tokens"] + client.usage["output_tokens"]
+
+
+def _format_usage(usage: dict, title: str = "  Расход API") -> str:
+    """Строка лога с накопленным расходом токенов API (по usage_metadata ответов)."""
+    calls = usage["calls"]
+    line = (f"{title}: запросов {calls}, "
+            f"токенов на входе {usage['input_tokens']}, на выходе {usage['output_tokens']}")
+    if calls > 1:
+        line += (f" (на запрос: {usage['input_tokens'] // calls} / "
+                 f"{usage['output_tokens'] // calls})")
+    return line
+
+
+_HTML_HEAD = "<html><body style='font-family: Arial; font-size: 10pt;'>"
+_GROUP_ORDER = ["A", "B", "C", "D", "E", "F", "G", "H"]
+
+
+def _generate_html_preview(resolved: dict, notes: list[str]) -> str:
+    """Сгенерировать HTML-превью для отображения в GUI."""
+    html = [_HTML_HEAD, _html_title(resolved)]
+
+    for group_key in _GROUP_ORDER:
+        html.extend(_html_group(group_key, resolved))
+
+    # --- ПРИМЕЧАНИЯ ---
+    _html_notes_section(html, resolved, notes)
+
+    html.append("</body></html>")
+    return "\n".join(html)
+
+
+def _html_title(resolved: dict) -> str:
+    """Заголовок карточки: модель и производитель."""
+    model = ""
+    manufacturer = ""
+    ev_model = resolved.get("a2_model")
+    ev_manuf = resolved.get("a3_manufacturer")
+    if ev_model:
+        model = ev_model.value
+    if ev_manuf:
+        manufacturer = ev_manuf.value
+
+    return f"<h2 align='center'>КАРТОЧКА ОБОРУДОВАНИЯ: {model} — {manufacturer}</h2>"
+
+
+def _html_group(group_key: str, resolved: dict) -> list[str]:
+    """HTML-таблица одной группы раздела (A–H)."""
+    from output.canonical import source_display
+    from output.formatter import format_value
+
+    group_title, field_names = SECTION_GROUPS[group_key]
+    html = [f"<h3>{group_title}</h3>"]
+    html.append("<table border='1' cellpadding='4' cellspacing='0' width='100%'>")
+
+    if group_key == "A":
+        html.append("<tr><th>Параметр</th><th>Значение</th></tr>")
+    else:
+        html.append("<tr><th>Параметр</th><th>Значение</th><th>Источник</th></tr>")
+
+    for field_name in field_names:
+        label = dict(CHECKLIST_FIELDS).get(field_name, field_name)
+        ev = resolved.get(field_name)
+
+        if ev is None:
+            val = "<i>нет данных</i>"
+            src = "—"
+        elif ev.status and "конфликт" in ev.status.lower():
+            # Конфликтное значение — структурированное отображение
+            val = _html_conflict_value(ev)
+            src = source_display(
+                ev.source.file, ev.source.doc_type, ev.source.page,
+                ev.source.section, ev.source.quote, ev.source.confidence,
+            )
+        else:
+            val = format_value(ev.value)
+            if ev.status and ev.status.strip():
+                val += f" <span style='color:orange'>[{ev.status}]</span>"
+            src = source_display(
+                ev.source.file, ev.source.doc_type, ev.source.page,
+                ev.source.section, ev.source.quote, ev.source.confidence,
+            )
+
+        if group_key == "A":
+            html.append(f"<tr><td>{label}</td><td>{val}</td></tr>")
+        else:
+            html.append(f"<tr><td>{label}</td><td>{val}</td><td>{src}</td></tr>")
+
+    html.append("</table>")
+    return html
+
+
+class _LivePreview:
+    """Промежуточное HTML-превью карточки во время извлечения (этап 3).
+
+    Перерисовка не чаще min_interval секунд; HTML группы раздела
+    пересобирается, только если изменились её значения.
+    """
+
+    def __init__(self, emit, min_interval: float):
+        self._emit = emit
+        self.min_interval = min_interval
+        self._last = 0.0
+        # Группа → (значения группы, HTML таблицы)
+        self._groups: dict[str, tuple[tuple, list[str]]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.min_interval > 0
+
+    def update(self, aggregator: IncrementalAggregator, done: int, total: int,
+               force: bool = False) -> bool:
+        """Перерисовать превью по текущему состоянию агрегации.
+
+        Returns:
+            True, если превью отправлено в GUI.
+        """
+        if not self.enabled:
+            return False
+        now = time.monotonic()
+        if not force and now - self._last < self.min_interval:
+            return False
+        self._last = now
+
+        resolved = aggregator.resolve()
+        changed = []
+        for group_key in _GROUP_ORDER:
+            _, field_names = SECTION_GROUPS[group_key]
+            state = tuple(
+                resolved[f].model_dump_json() if resolved.get(f) else None
+                for f in field_names
+            )
+            cached = self._groups.get(group_key)
+            if cached is None or cached[0] != state:
+                self._groups[group_key] = (state, _html_group(group_key, resolved))
+                changed.append(group_key)
+        if not changed:
+            return False
+
+        found = sum(1 for v in resolved.values() if v is not None)
+        html = [_HTML_HEAD, _html_title(resolved)]
+        html.append(
+            f"<p align='center' style='color:#808080;'>Промежуточный результат: "
+            f"обработано чанков {done} из {total}, найдено параметров {found} "
+            f"из {len(CHECKLIST_FIELDS)}. Значения могут измениться.</p>"
+        )
+        for group_key in _GROUP_ORDER:
+            html.extend(self._groups[group_key][1])
+        html.append("</body></html>")
+        self._emit("\n".join(html))
+        logger.debug(f"Промежуточное превью: обновлены группы {', '.join(changed)}")
+        return True
+
+
+def _html_conflict_value(ev) -> str:
+    """HTML-отображение конфликтного значения с цветовым выделением."""
+    from output.formatter import format_value
+
+    parts = []
+    # Выбранное значение — зелёным
+    parts.append(
+        f"<b style='color:#008000;'>✔ {format_value(ev.value)}</b>"
+        f" <span style='color:#c87800; font-size:8pt;'>[конфликт]</span>"
+    )
+
+    # Остальные варианты — серым
+    if ev.conflict_values:
+        for entry in ev.conflict_values:
+            if entry.is_selected:
+                continue
+            src_text = entry.source.file
+            if entry.source.doc_type:
+                src_text += f", {entry.source.doc_type}"
+            if entry.source.page:
+                src_text += f", стр. {entry.source.page}"
+            parts.append(
+                f"<span style='color:#828282;'>✖ {format_value(entry.value)}</span>"
+                f" <span style='color:#a0a0a0; font-size:7pt;'>({src_text})</span>"
+            )
+
+    return "<br>".join(parts)
+
+
+def _html_notes_section(html: list, resolved: dict, extra_notes: list[str]):
+    """Секция ПРИМЕЧАНИЯ в HTML-превью с структурированными конфликтами."""
+    from gemini.schema import CHECKLIST_FIELDS as CK_FIELDS
+    from output.canonical import source_display, missing_param_note
+    from output.formatter import format_value
+
+    conflict_notes = []
+    other_notes = []
+
+    # 1. Конфликты
+    for field_name, label in CK_FIELDS:
+        ev = resolved.get(field_name)
+        if ev and ev.status and "конфликт" in ev.status.lower():
+            conflict_notes.append((label, ev))
+
+    # 2. Низкая уверенность
+    for field_name, label in CK_FIELDS:
+        ev = resolved.get(field_name)
+        if ev and ev.source.confidence == "low":
+            other_notes.append(f"{label} — считан с низким качеством, требует проверки.")
+
+    # 3. Пропуски
+    for field_name, label in CK_FIELDS:
+        ev = resolved.get(field_name)
+        if ev is None:
+            other_notes.append(missing_param_note(label))
+
+    # 4. Дополнительные примечания
+    for note in extra_notes:
+        if note not in other_notes:
+            other_notes.append(note)
+
+    has_content = conflict_notes or other_notes
+    if not has_content:
+        return
+
+    html.append("<h3>ПРИМЕЧАНИЯ</h3>")
+    note_num = 1
+
+    # --- Конфликты ---
+    if conflict_notes:
+        html.append(
+            "<p><b style='color:#c87800;'>⚠ РАСХОЖДЕНИЯ МЕЖДУ ИСТОЧНИКАМИ</b></p>"
+        )
+        for label, ev in conflict_notes:
+            html.append(f"<p><b>{note_num}. {label}</b></p>")
+            note_num += 1
+
+            if ev.conflict_values:
+                html.append(
+                    "<table border='1' cellpadding='3' cellspacing='0' "
+                    "style='margin-left:20px; margin-bottom:8px; width:95%;'>"
+                )
+                html.append("<tr><th>№</th><th>Значение</th><th>Источник</th></tr>")
+
+                for idx, entry in enumerate(ev.conflict_values, 1):
+                    marker = "✔" if entry.is_selected else str(idx)
+                    src = source_display(
+                        file=entry.source.file,
+                        doc_type=entry.source.doc_type,
+                        page=entry.source.page,
+                        section=entry.source.section,
+                        quote=entry.source.quote,
+                        confidence=entry.source.confidence,
+                    )
+
+                    if entry.is_selected:
+                        html.append(
+                            f"<tr style='background:#e6ffe6;'>"
+                            f"<td><b style='color:#008000;'>{marker}</b></td>"
+                            f"<td><b style='color:#008000;'>{format_value(entry.value)}</b></td>"
+                            f"<td>{src}</td></tr>"
+                        )
+                    else:
+                        html.append(
+                            f"<tr>"
+                            f"<td>{marker}</td>"
+                            f"<td style='color:#828282;'>{format_value(entry.value)}</td>"
+                            f"<td>{src}</td></tr>"
+                        )
+
+                html.append("</table>")
+            else:
+                # Нет структурированных данных — текстовое примечание
+                note_text = ev.note or "Расхождение между источниками."
+                html.append(f"<p style='margin-left:20px;'>{note_text}</p>")
+
+    # --- Остальные примечания ---
+    if other_notes:
+        html.append("<ol" + (f" start='{note_num}'" if note_num > 1 else "") + ">")
+        for note in other_notes:
+            html.append(f"<li>{note}</li>")
+        html.append("</ol>")
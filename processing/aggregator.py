@@ -3,7 +3,9 @@
 import logging
 from gemini.schema import ChunkExtraction, ExtractedValue, ConflictEntry, SourceRef, CHECKLIST_FIELDS
 from chunking.chunk_manager import Chunk
-from processing.conflict_resolver import resolve_conflict
+from gemini.wire import field_name_for
+from processing.conflict_resolver import CONFIDENCE_ORDER, resolve_conflict
+from processing.units import same_value, value_key, value_keys
 
 logger = logging.getLogger(__name__)
 
@@ -64,52 +66,90 @@ def _are_ocr_variants(a: str, b: str) -> bool:
     return 1 <= diffs <= 2
 
 
-def _deduplicate_overlaps(values: list[ExtractedValue], overlap: int = 2) -> list[ExtractedValue]:
-    """Убрать дубли из перекрывающихся чанков одного файла.
+# Классы цифр, которые OCR путает между собой (см. _OCR_DIGIT_PAIRS):
+# значения-OCR-варианты приводятся к одному ключу индекса
+_OCR_CANONICAL = str.maketrans({"5": "3", "8": "3", "0": "6", "7": "1"})
 
-    При overlap чанков одни и те же страницы обрабатываются Gemini дважды.
-    Gemini недетерминистичен — может извлечь РАЗНЫЕ значения с одних страниц.
-    Если два значения из одного файла, страницы близки (разница ≤ overlap)
-    И значения совпадают — это повторное извлечение (дубль).
-    Если значения РАЗНЫЕ (например, 380В и 220В с одной страницы) — оба сохраняем.
-    Если значения — OCR-варианты (3↔5, 6↔0 и т.д.) — оставляем более надёжное.
+
+def _dedup_key(value: str) -> str:
+    """Нормализованное значение для индекса дублей: точные дубли и OCR-варианты совпадают."""
+    return value.strip().translate(_OCR_CANONICAL)
+
+
+def _index_keys(value: str) -> list:
+    """Ключи индекса дублей: OCR-нормализованная строка и величины в базовых единицах."""
+    keys: list = [_dedup_key(value)]
+    quantity_key = value_key(value)
+    if isinstance(quantity_key, tuple):
+        keys.append(quantity_key)
+    return keys
+
+
+class _OverlapIndex:
+    """Отобранные значения одного параметра с индексом для поиска overlap-дублей.
+
+    Индекс: (файл, корзина страниц, нормализованное значение) → позиции в kept.
+    Значение регистрируется и по величинам в базовых единицах, поэтому
+    «0,4 кВ» и «400 В» с соседних страниц находят друг друга. Ширина
+    корзины равна overlap, поэтому близкие страницы ищутся в соседних
+    корзинах — добавление значения не требует сравнения со всеми отобранными.
     """
-    if len(values) <= 1:
-        return values
 
-    confidence_order = {"high": 0, "medium": 1, "low": 2}
-    kept: list[ExtractedValue] = []
-    for v in values:
-        is_overlap_dup = False
-        for i, existing in enumerate(kept):
+    def __init__(self, overlap: int = 2):
+        self.overlap = overlap
+        self.kept: list[ExtractedValue] = []
+        self._index: dict[tuple, list[int]] = {}
+
+    def _bucket(self, page: int) -> int:
+        return page // max(self.overlap, 1)
+
+    def _register(self, pos: int, v: ExtractedValue) -> None:
+        if v.source.file and v.source.page is not None:
+            for norm in _index_keys(v.value):
+                key = (v.source.file, self._bucket(v.source.page), norm)
+                self._index.setdefault(key, []).append(pos)
+
+    def _candidates(self, v: ExtractedValue) -> list[int]:
+        if not v.source.file or v.source.page is None:
+            return []
+        bucket = self._bucket(v.source.page)
+        found: set[int] = set()
+        for norm in _index_keys(v.value):
+            for b in (bucket - 1, bucket, bucket + 1):
+                found.update(self._index.get((v.source.file, b, norm), ()))
+        # Порядок отобранных значений — как при попарном сравнении
+        return sorted(found)
+
+    def add(self, v: ExtractedValue) -> None:
+        """Добавить значение: отбросить как дубль, заменить OCR-вариант или сохранить."""
+        for i in self._candidates(v):
+            existing = self.kept[i]
             # Общие условия overlap: один файл, обе страницы известны, страницы близки
+            # (после замены OCR-варианта в индексе могут остаться устаревшие позиции)
             if not (existing.source.file == v.source.file
-                    and existing.source.file
                     and existing.source.page is not None
-                    and v.source.page is not None
-                    and abs(existing.source.page - v.source.page) <= overlap):
+                    and abs(existing.source.page - v.source.page) <= self.overlap):
                 continue
 
-            # Точное совпадение — дубль
-            if existing.value.strip() == v.value.strip():
-                is_overlap_dup = True
+            # Совпадение (в том числе в пересчёте единиц: 0,4 кВ = 400 В) — дубль
+            if same_value(existing.value, v.value):
                 logger.debug(
                     f"Overlap-дубль отброшен для {v.source.file}: "
                     f"{v.value!r} (стр.{v.source.page}) "
                     f"≈ {existing.value!r} (стр.{existing.source.page})"
                 )
-                break
+                return
 
             # OCR-вариант — оставить более надёжное, пометить как low
             if _are_ocr_variants(existing.value, v.value):
-                is_overlap_dup = True
-                existing_conf = confidence_order.get(existing.source.confidence, 99)
-                v_conf = confidence_order.get(v.source.confidence, 99)
+                existing_conf = CONFIDENCE_ORDER.get(existing.source.confidence, 99)
+                v_conf = CONFIDENCE_ORDER.get(v.source.confidence, 99)
                 if v_conf < existing_conf:
                     # Новое значение надёжнее — заменить
                     v.note = (v.note + "; " if v.note else "") + f"OCR-вариант отброшен: {existing.value!r}"
                     v.source.confidence = "low"
-                    kept[i] = v
+                    self.kept[i] = v
+                    self._register(i, v)
                 else:
                     existing.note = (existing.note + "; " if existing.note else "") + f"OCR-вариант отброшен: {v.value!r}"
                     existing.source.confidence = "low"
@@ -118,11 +158,29 @@ def _deduplicate_overlaps(values: list[ExtractedValue], overlap: int = 2) -> lis
                     f"{v.value!r} (стр.{v.source.page}) vs "
                     f"{existing.value!r} (стр.{existing.source.page})"
                 )
-                break
+                return
+
+        self._register(len(self.kept), v)
+        self.kept.append(v)
+
+
+def _deduplicate_overlaps(values: list[ExtractedValue], overlap: int = 2) -> list[ExtractedValue]:
+    """Убрать дубли из перекрывающихся чанков одного файла.
+
+    При overlap чанков одни и те же страницы обрабатываются Gemini дважды.
+    Gemini недетерминистичен — может извлечь РАЗНЫЕ значения с одних страниц.
+    Если два значения из одного файла, страницы близки (разница ≤ overlap)
+    И значения совпадают — это повторное извлечение (дубль).
+    Если значения РАЗНЫЕ (например, 380В и 220В с одной страницы) — оба сохраняем.
+    Если значения — OCR-варианты (3↔5, 6↔0 и т.д.) — оставляем более надёжное.
+    """
+    if len(values) <= 1:
+        return values
 
-        if not is_overlap_dup:
-            kept.append(v)
-    return kept
+    index = _OverlapIndex(overlap)
+    for v in values:
+        index.add(v)
+    return index.kept
 
 
 def resolve_aggregated(
@@ -134,54 +192,165 @@ def resolve_aggregated(
         dict: field_name -> одно финальное ExtractedValue или None.
     """
     result: dict[str, ExtractedValue | None] = {}
-    notes: list[str] = []
 
     for field_name, label in CHECKLIST_FIELDS:
         values = aggregated.get(field_name, [])
 
         # Дедупликация overlap-дублей (из перекрывающихся чанков одного файла)
         values = _deduplicate_overlaps(values)
-
-        if not values:
-            result[field_name] = None
-            continue
-
-        if len(values) == 1:
-            result[field_name] = values[0]
-            continue
-
-        # Несколько значений — проверяем конфликт
-        unique_values = set(v.value.strip() for v in values)
-        if len(unique_values) == 1:
-            # Все одинаковые — берём с наивысшим приоритетом источника
-            best = resolve_conflict(values)
-            result[field_name] = best
-        else:
-            # Конфликт — разрешаем по иерархии, отмечаем
-            best = resolve_conflict(values)
-            # Собираем все конфликтующие значения
-            entries = []
-            for v in values:
-                entries.append(ConflictEntry(
-                    value=v.value,
-                    source=v.source.model_copy(),
-                    is_selected=(v.value.strip() == best.value.strip()
-                                 and v.source.file == best.source.file),
-                ))
-            best.conflict_values = entries
-            conflict_details = "; ".join(
-                f"{v.value} ({v.source.file}, {v.source.doc_type})"
-                for v in values
-            )
-            best.note = f"КОНФЛИКТ: {conflict_details}"
-            best.status = "конфликт"
-            result[field_name] = best
-            notes.append(f"{label} — расхождение: {conflict_details}")
-            logger.warning(f"Конфликт в {label}: {conflict_details}")
+        result[field_name] = _resolve_field(label, values)
 
     return result
 
 
+def _resolve_field(label: str, values: list[ExtractedValue]) -> ExtractedValue | None:
+    """Финальное значение параметра из значений без overlap-дублей."""
+    if not values:
+        return None
+
+    if len(values) == 1:
+        return values[0]
+
+    # Несколько значений — проверяем конфликт (с учётом единиц: 0,4 кВ = 400 В)
+    unique_values = set(value_keys([v.value for v in values]))
+    if len(unique_values) == 1:
+        # Все одинаковые — берём с наивысшим приоритетом источника
+        return resolve_conflict(values)
+
+    # Конфликт — разрешаем по иерархии, отмечаем
+    best = resolve_conflict(values)
+    # Собираем все конфликтующие значения
+    entries = []
+    for v in values:
+        entries.append(ConflictEntry(
+            value=v.value,
+            source=v.source.model_copy(),
+            is_selected=(same_value(v.value, best.value)
+                         and v.source.file == best.source.file),
+        ))
+    best.conflict_values = entries
+    conflict_details = "; ".join(
+        f"{v.value} ({v.source.file}, {v.source.doc_type})"
+        for v in values
+    )
+    best.note = f"КОНФЛИКТ: {conflict_details}"
+    best.status = "конфликт"
+    logger.warning(f"Конфликт в {label}: {conflict_details}")
+    return best
+
+
+class IncrementalAggregator:
+    """Агрегация по мере извлечения: добавление и отзыв чанков, текущая карточка.
+
+    В отличие от пакетных aggregate_extractions + resolve_aggregated, значения
+    дедуплицируются при добавлении (_OverlapIndex), а при запросе карточки
+    пересчитываются только параметры, изменившиеся с прошлого запроса.
+    Исходные извлечения не изменяются: хранятся и отдаются копии.
+    """
+
+    def __init__(self, overlap: int = 2):
+        self.overlap = overlap
+        # Ключ чанка → [(поле, значение с пересчитанной страницей)], в порядке добавления
+        self._entries: dict[tuple, list[tuple[str, ExtractedValue]]] = {}
+        self._fields: dict[str, _OverlapIndex] = {
+            field: _OverlapIndex(overlap) for field, _ in CHECKLIST_FIELDS
+        }
+        self._resolved: dict[str, ExtractedValue | None] = {
+            field: None for field, _ in CHECKLIST_FIELDS
+        }
+        self._dirty: set[str] = set()
+
+    @staticmethod
+    def chunk_key(chunk: Chunk) -> tuple:
+        """Ключ чанка: файл и диапазон страниц."""
+        return (chunk.source_file, chunk.page_start, chunk.page_end)
+
+    def add(self, chunk: Chunk, extraction: ChunkExtraction, replace: bool = False) -> tuple:
+        """Учесть извлечение из чанка.
+
+        Несколько извлечений одного чанка (повтор групп, одинаковые половины
+        при делении) объединяются. replace=True — заменить прежние извлечения
+        чанка (явный повтор того же чанка).
+
+        Returns:
+            Ключ чанка для retract().
+        """
+        key = self.chunk_key(chunk)
+        if replace and key in self._entries:
+            self.retract(key)
+
+        entries: list[tuple[str, ExtractedValue]] = []
+        for field_name, _ in CHECKLIST_FIELDS:
+            value: ExtractedValue | None = getattr(extraction, field_name, None)
+            if value is None:
+                continue
+            entries.append((field_name, _with_chunk_source(value, chunk)))
+        self._entries.setdefault(key, []).extend(entries)
+
+        for field_name, value in entries:
+            self._fields[field_name].add(value.model_copy(deep=True))
+            self._dirty.add(field_name)
+        return key
+
+    def retract(self, key: tuple) -> None:
+        """Отозвать все извлечения чанка (по ключу из add/chunk_key)."""
+        entries = self._entries.pop(key, None)
+        if not entries:
+            return
+        fields = {field_name for field_name, _ in entries}
+        # Отзыв может «вернуть» отброшенные ранее дубли — параметр пересобирается
+        for field_name in fields:
+            self._rebuild(field_name)
+        self._dirty |= fields
+
+    def retract_file(self, source_file: str) -> int:
+        """Отозвать все чанки файла. Returns: число отозванных чанков."""
+        keys = [k for k in self._entries if k[0] == source_file]
+        for key in keys:
+            self.retract(key)
+        return len(keys)
+
+    def resolve(self) -> dict[str, ExtractedValue | None]:
+        """Текущая карточка: field_name -> финальное значение или None (копии)."""
+        label_map = dict(CHECKLIST_FIELDS)
+        for field_name in self._dirty:
+            values = [v.model_copy(deep=True) for v in self._fields[field_name].kept]
+            self._resolved[field_name] = _resolve_field(label_map[field_name], values)
+        self._dirty.clear()
+        return {
+            field: (v.model_copy(deep=True) if v is not None else None)
+            for field, v in self._resolved.items()
+        }
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self._entries)
+
+    def _rebuild(self, field_name: str) -> None:
+        index = _OverlapIndex(self.overlap)
+        for entries in self._entries.values():
+            for name, value in entries:
+                if name == field_name:
+                    index.add(value.model_copy(deep=True))
+        self._fields[field_name] = index
+
+
+def _with_chunk_source(value: ExtractedValue, chunk: Chunk) -> ExtractedValue:
+    """Копия значения со страницей в оригинале и файлом/типом из метаданных чанка."""
+    value = value.model_copy(deep=True)
+    if value.source.page is not None and chunk.page_start is not None:
+        value.source.page = chunk.page_start + value.source.page - 1
+    value.source.file = chunk.source_file
+    value.source.doc_type = chunk.source_type
+    return value
+
+
+def _verification_field(item: dict) -> str:
+    """Имя поля из ответа верификации (код A.1 или имя поля a1_name)."""
+    field = item.get("field", "")
+    return field_name_for(field) or field
+
+
 def apply_verification(
     resolved: dict[str, ExtractedValue | None],
     verification: dict | None,
@@ -199,7 +368,7 @@ def apply_verification(
 
     # Применить исправления значений (OCR-коррекции из верификации)
     for item in verification.get("corrections", []):
-        field = item.get("field", "")
+        field = _verification_field(item)
         corrected_value = item.get("corrected_value")
         issue = item.get("issue", "")
         if field in resolved and resolved[field] is not None and corrected_value:
@@ -215,7 +384,7 @@ def apply_verification(
 
     # Добавить дополнительные значения
     for item in verification.get("additional_values", []):
-        field = item.get("field", "")
+        field = _verification_field(item)
         if field in resolved and resolved[field] is None:
             resolved[field] = ExtractedValue(
                 value=item.get("value", ""),
@@ -232,21 +401,21 @@ def apply_verification(
 
     # Собрать примечания о пропусках
     for item in verification.get("missing_params", []):
-        field = item.get("field", "")
+        field = _verification_field(item)
         suggestion = item.get("suggestion", "")
         label = dict(CHECKLIST_FIELDS).get(field, field)
         notes.append(f"{label} — в документации не указан. {suggestion}")
 
     # Собрать конфликты из верификации
     for item in verification.get("conflicts", []):
-        field = item.get("field", "")
+        field = _verification_field(item)
         values_str = ", ".join(item.get("values", []))
         label = dict(CHECKLIST_FIELDS).get(field, field)
         notes.append(f"{label} — расхождение: {values_str}")
 
     # Косвенные параметры
     for item in verification.get("indirect_params", []):
-        field = item.get("field", "")
+        field = _verification_field(item)
         reasoning = item.get("reasoning", "")
         suggested = item.get("suggested_value", "")
         label = dict(CHECKLIST_FIELDS).get(field, field)
@@ -0,0 +1,163 @@
+"""Бюджет задания: предельное время и расход токенов.
+
+Задание с бюджетом обрабатывает чанки в порядке ожидаемой отдачи
+(processing.scheduler: паспорта раньше руководств, плотные страницы
+раньше текста) и запускает очередной чанк, только если по средним
+показателям уже обработанных чанков он укладывается в бюджет. Часть
+бюджета (reserve_share) оставляется на верификацию и формирование DOCX.
+
+Когда израсходована доля downgrade_share бюджета извлечения, чанки
+обрабатываются одним проходом быстрой модели без эскалации. Чанки, не
+вошедшие в бюджет, перечисляются в примечаниях карточки.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+
+from chunking.chunk_manager import Chunk
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESERVE_SHARE = 0.2
+DEFAULT_DOWNGRADE_SHARE = 0.6
+
+
+@dataclass
+class BudgetSkip:
+    """Чанк, не обработанный из-за бюджета."""
+    source_file: str
+    page_start: int | None
+    page_end: int | None
+
+
+class JobBudget:
+    """Предельное время и токены одного задания (0 — без ограничения)."""
+
+    def __init__(self, max_seconds: float = 0, max_tokens: int = 0,
+                 reserve_share: float = DEFAULT_RESERVE_SHARE,
+                 downgrade_share: float = DEFAULT_DOWNGRADE_SHARE):
+        """
+        Args:
+            max_seconds: Предельное время задания от запуска pipeline.
+            max_tokens: Предельный расход токенов (вход + выход) всех запросов.
+            reserve_share: Доля бюджета, оставляемая на этапы 4–6.
+            downgrade_share: Доля бюджета извлечения, после которой чанки
+                обрабатываются быстрой моделью без эскалации.
+        """
+        self.max_seconds = max(0.0, max_seconds)
+        self.max_tokens = max(0, max_tokens)
+        self.reserve_share = min(max(reserve_share, 0.0), 0.9)
+        self.downgrade_share = downgrade_share
+        self.started = time.monotonic()
+        self.skipped: list[BudgetSkip] = []
+        self._chunks = 0
+        self._timed_chunks = 0
+        self._chunk_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, config: dict) -> "JobBudget":
+        return cls(
+            max_seconds=(config.get("job_time_budget_minutes") or 0) * 60,
+            max_tokens=config.get("job_token_budget") or 0,
+            reserve_share=config.get("budget_reserve_share", DEFAULT_RESERVE_SHARE),
+            downgrade_share=config.get("budget_downgrade_share", DEFAULT_DOWNGRADE_SHARE),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_seconds or self.max_tokens)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def describe(self) -> str:
+        limits = []
+        if self.max_seconds:
+            limits.append(f"время {self.max_seconds / 60:.0f} мин" if self.max_seconds >= 60
+                          else f"время {self.max_seconds:.0f} с")
+        if self.max_tokens:
+            limits.append(f"токены {self.max_tokens:,}".replace(",", " "))
+        return ", ".join(limits)
+
+    def record_chunk(self, seconds: float | None = None) -> None:
+        """Чанк извлечён; seconds — длительность его запросов (None — неизвестна)."""
+        self._chunks += 1
+        if seconds is not None:
+            self._timed_chunks += 1
+            self._chunk_seconds += seconds
+
+    def used_share(self, tokens: int) -> float:
+        """Израсходованная доля бюджета извлечения (по самому жёсткому пределу)."""
+        limit = 1.0 - self.reserve_share
+        shares = []
+        if self.max_seconds:
+            shares.append(self.elapsed / (self.max_seconds * limit))
+        if self.max_tokens:
+            shares.append(tokens / (self.max_tokens * limit))
+        return max(shares, default=0.0)
+
+    def allows_chunk(self, tokens: int, in_flight: int) -> bool:
+        """Уложится ли ещё один чанк в бюджет извлечения.
+
+        Args:
+            tokens: Токены, израсходованные заданием.
+            in_flight: Чанков в работе (их расход ещё не учтён в tokens).
+        """
+        if not self.enabled:
+            return True
+        limit = 1.0 - self.reserve_share
+        if self.max_seconds:
+            per_chunk = self._chunk_seconds / self._timed_chunks if self._timed_chunks else 0.0
+            if self.elapsed + per_chunk > self.max_seconds * limit:
+                return False
+        if self.max_tokens:
+            per_chunk = tokens / self._chunks if self._chunks else 0.0
+            if tokens + per_chunk * (in_flight + 1) > self.max_tokens * limit:
+                return False
+        return True
+
+    def should_downgrade(self, tokens: int) -> bool:
+        return self.enabled and self.used_share(tokens) >= self.downgrade_share
+
+    def exhausted(self, tokens: int) -> bool:
+        """Бюджет задания исчерпан полностью (с резервом)."""
+        if self.max_seconds and self.elapsed >= self.max_seconds:
+            return True
+        return bool(self.max_tokens and tokens >= self.max_tokens)
+
+    def skip(self, chunk: Chunk) -> None:
+        self.skipped.append(BudgetSkip(chunk.source_file, chunk.page_start, chunk.page_end))
+
+    def notes(self) -> list[str]:
+        """Примечания карточки: источники, не проанализированные из-за бюджета."""
+        if not self.skipped:
+            return []
+        pages: dict[str, list[tuple[int, int]]] = {}
+        whole: list[str] = []
+        for s in self.skipped:
+            if s.page_start is None:
+                whole.append(s.source_file)
+            else:
+                pages.setdefault(s.source_file, []).append((s.page_start, s.page_end or s.page_start))
+
+        sources = [f"{name} — весь файл" for name in whole]
+        for name, ranges in pages.items():
+            sources.append(f"{name} — {', '.join(_format_ranges(ranges))}")
+        return [
+            f"Анализ ограничен бюджетом задания ({self.describe()}): "
+            f"не проанализированы источники: {'; '.join(sources)}. "
+            "Параметры из этих страниц могут отсутствовать в карточке."
+        ]
+
+
+def _format_ranges(ranges: list[tuple[int, int]]) -> list[str]:
+    """Объединить пересекающиеся и смежные диапазоны страниц."""
+    merged: list[list[int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [f"стр. {s}" if s == e else f"стр. {s}–{e}" for s, e in merged]
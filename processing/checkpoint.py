@@ -0,0 +1,177 @@
+"""Контрольные точки pipeline: продолжение прерванного анализа.
+
+Результаты дорогих запросов к Gemini (контекст оборудования, извлечение
+по чанкам, верификация) дописываются в журнал задания по мере готовности.
+После сбоя, отмены или обрыва сети повторный запуск на том же наборе
+файлов продолжает с последнего завершённого шага.
+
+Задание — каталог CONFIG_DIR/jobs/<job_id>, где job_id зависит от набора
+файлов (путь, размер, время изменения) и параметров нарезки на чанки.
+Журнал journal.jsonl — по одной компактной JSON-записи на строку:
+
+    {"k":"ctx","d":{...}}                       контекст оборудования
+    {"k":"chunk","c":["a.pdf",1,10],"r":[...]}  извлечение чанка
+    {"k":"verify","d":{...}}                    ответ верификации
+    {"k":"done"}                                карточка сформирована
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+
+from config import CONFIG_DIR
+from scanner.folder_scanner import ScannedFile
+from chunking.chunk_manager import Chunk
+from gemini.schema import ChunkExtraction
+from gemini.wire import decode_extraction, dumps_compact, encode_extraction
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = CONFIG_DIR / "jobs"
+_JOURNAL = "journal.jsonl"
+_META = "meta.json"
+
+
+@dataclass
+class CheckpointState:
+    """Сохранённые результаты задания."""
+    context: dict | None = None
+    # (файл, стр. начала, стр. конца) → результаты извлечения (части чанка)
+    chunks: dict[tuple, list[tuple[tuple, ChunkExtraction]]] = field(default_factory=dict)
+    verification: dict | None = None
+    done: bool = False
+
+    @property
+    def has_progress(self) -> bool:
+        return not self.done and (self.context is not None or bool(self.chunks))
+
+
+def chunk_key(chunk: Chunk) -> tuple:
+    """Ключ чанка в журнале: файл и диапазон страниц."""
+    return (chunk.source_file, chunk.page_start, chunk.page_end)
+
+
+def file_fingerprint(path: Path) -> str:
+    """Отпечаток файла: путь, размер, время изменения."""
+    try:
+        stat = os.stat(path)
+        text = f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+    except OSError:
+        text = str(path)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def job_id_for(files: list[ScannedFile], chunk_size: int, overlap: int) -> str:
+    """Идентификатор задания по набору файлов и параметрам нарезки."""
+    h = hashlib.sha1()
+    for fingerprint in sorted(file_fingerprint(f.path) for f in files):
+        h.update(f"{fingerprint}\n".encode("utf-8"))
+    h.update(f"{chunk_size}|{overlap}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+class JobCheckpoint:
+    """Журнал одного задания (дописывание по записи, чтение при продолжении)."""
+
+    def __init__(self, job_dir: Path):
+        self.job_dir = job_dir
+        self.journal_path = job_dir / _JOURNAL
+
+    @classmethod
+    def for_files(cls, files: list[ScannedFile], chunk_size: int, overlap: int) -> "JobCheckpoint":
+        return cls(JOBS_DIR / job_id_for(files, chunk_size, overlap))
+
+    def load(self) -> CheckpointState:
+        """Прочитать журнал. Недописанная при сбое последняя строка пропускается."""
+        state = CheckpointState()
+        if not self.journal_path.exists():
+            return state
+
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    self._apply(state, record)
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Журнал {self.journal_path}, строка {line_no} пропущена: {e}")
+        return state
+
+    @staticmethod
+    def _apply(state: CheckpointState, record: dict) -> None:
+        kind = record["k"]
+        if kind == "ctx":
+            state.context = record["d"]
+        elif kind == "chunk":
+            parts = []
+            for part in record["r"]:
+                extraction = ChunkExtraction.model_validate(decode_extraction(part["x"]))
+                parts.append(((part["a"], part["b"]), extraction))
+            state.chunks[tuple(record["c"])] = parts
+        elif kind == "verify":
+            state.verification = record["d"]
+        elif kind == "done":
+            state.done = True
+
+    def reset(self, files: list[ScannedFile]) -> None:
+        """Начать задание заново: очистить журнал, записать описание."""
+        if self.job_dir.exists():
+            shutil.rmtree(self.job_dir, ignore_errors=True)
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        meta = {"files": [str(f.path) for f in files]}
+        with open(self.job_dir / _META, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    def record_context(self, context: dict) -> None:
+        self._append({"k": "ctx", "d": context})
+
+    def record_chunk(self, chunk: Chunk, results: list[tuple[Chunk, ChunkExtraction]]) -> None:
+        """Записать извлечение чанка (с частями, если чанк делился)."""
+        self._append({
+            "k": "chunk",
+            "c": list(chunk_key(chunk)),
+            "r": [
+                {"a": part.page_start, "b": part.page_end, "x": encode_extraction(extraction)}
+                for part, extraction in results
+            ],
+        })
+
+    def record_verification(self, verification: dict) -> None:
+        self._append({"k": "verify", "d": verification})
+
+    def finish(self) -> None:
+        self._append({"k": "done"})
+
+    def _append(self, record: dict) -> None:
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        line = dumps_compact(record) + "\n"
+        if self._torn_tail():
+            # Запись, оборванная при сбое, не должна склеиться со следующей
+            line = "\n" + line
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _torn_tail(self) -> bool:
+        """Журнал заканчивается недописанной строкой."""
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) != b"\n"
+        except OSError:
+            return False
+
+
+def restore_parts(chunk: Chunk, parts: list[tuple[tuple, ChunkExtraction]],
+                  ) -> list[tuple[Chunk, ChunkExtraction]]:
+    """Пары (часть чанка, извлечение) из записи журнала."""
+    return [
+        (replace(chunk, page_start=start, page_end=end), extraction)
+        for (start, end), extraction in parts
+    ]
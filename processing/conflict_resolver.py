@@ -11,6 +11,8 @@ SOURCE_PRIORITY = {
     "Документ": 4,
 }
 
+CONFIDENCE_ORDER = {"high": 0, "medium": 1, "low": 2}
+
 
 def resolve_conflict(values: list[ExtractedValue]) -> ExtractedValue:
     """Выбрать значение с наивысшим приоритетом источника.
@@ -23,16 +25,16 @@ def resolve_conflict(values: list[ExtractedValue]) -> ExtractedValue:
     if len(values) == 1:
         return values[0]
 
-    confidence_order = {"high": 0, "medium": 1, "low": 2}
+    sorted_values = sorted(values, key=lambda v: source_rank(v.source.doc_type, v.source.confidence))
+    return sorted_values[0]
 
-    def sort_key(v: ExtractedValue) -> tuple:
-        priority = SOURCE_PRIORITY.get(v.source.doc_type, 99)
-        confidence = confidence_order.get(v.source.confidence, 99)
-        # Штраф для low-confidence: Паспорт low (0+2=2) проигрывает
-        # Каталогу high (1+0=1), но бьёт Чертёж high (3+0=3)
-        if v.source.confidence == "low":
-            priority += 2
-        return (priority, confidence)
 
-    sorted_values = sorted(values, key=sort_key)
-    return sorted_values[0]
+def source_rank(doc_type: str, confidence: str) -> tuple[int, int]:
+    """Ранг значения по иерархии источников: меньше — приоритетнее."""
+    priority = SOURCE_PRIORITY.get(doc_type, 99)
+    conf = CONFIDENCE_ORDER.get(confidence, 99)
+    # Штраф для low-confidence: Паспорт low (0+2=2) проигрывает
+    # Каталогу high (1+0=1), но бьёт Чертёж high (3+0=3)
+    if confidence == "low":
+        priority += 2
+    return (priority, conf)
@@ -0,0 +1,287 @@
+"""Предварительная оценка задания (dry run) без запросов к API.
+
+Файлы сканируются, классифицируются и нарезаются на чанки локально
+(те же границы, что у pipeline), по страницам и размеру оценивается
+число токенов. Число запросов, токены ответа и время — по истории
+прошлых запусков (~/.factum/throughput.jsonl), а без истории — по
+консервативным значениям по умолчанию.
+"""
+
+import json
+import logging
+import math
+import statistics
+import time
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+
+from config import CONFIG_DIR, FIXED_MODEL, FAST_MODEL
+from scanner.folder_scanner import ScannedFile
+from scanner.file_classifier import classify_file
+from chunking.pdf_chunker import chunk_ranges, page_count
+from gemini.prompts import EXTRACTION_SYSTEM_PROMPT, VERIFICATION_SYSTEM_PROMPT
+from gemini.wire import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FILE = CONFIG_DIR / "throughput.jsonl"
+_HISTORY_LIMIT = 50  # Последних запусков в истории
+
+# Токены входа Gemini: страница PDF — 258, изображение — плитки по 258
+_TOKENS_PER_PAGE = 258
+_TOKENS_PER_IMAGE = 258 * 4
+_IMAGE_EXTENSIONS = ("jpg", "jpeg", "png", "bmp", "tiff", "tif")
+_TEXT_EXTENSIONS = ("txt", "csv")
+
+# Без истории запусков
+_DEFAULT_CALLS_PER_CHUNK = 1.3  # С учётом эскалации на сильную модель
+_DEFAULT_OUTPUT_TOKENS = 1200  # Ответ на запрос извлечения
+_DEFAULT_CALL_SECONDS = 25.0  # Длительность запроса извлечения
+_DEFAULT_OVERHEAD_SECONDS = 90.0  # Контекст, верификация, DOCX
+
+# Запросы контекста и верификации
+_CONTEXT_OUTPUT_TOKENS = 400
+_VERIFICATION_OUTPUT_TOKENS = 2500
+_VERIFICATION_JSON_TOKENS = 3000  # Агрегированные данные в запросе верификации
+_MAX_VERIFICATION_BYTES = 40 * 1024 * 1024  # Как в GeminiClient.verify_extraction
+
+
+@dataclass
+class RunStats:
+    """Итог одного запуска pipeline для истории пропускной способности."""
+    chunks: int  # Чанков, извлечённых в этом запуске
+    extract_calls: int  # Запросов этапов 2–3
+    extract_seconds: float  # Время этапов 2–3
+    concurrency: int  # Одновременных запросов задания
+    calls: int
+    input_tokens: int
+    output_tokens: int
+    overhead_seconds: float  # Остальные этапы
+    finished: float = 0.0
+
+
+class ThroughputHistory:
+    """История запусков: медианы скорости и расхода по прошлым заданиям."""
+
+    def __init__(self, path: Path | None = None):
+        self.path = path or HISTORY_FILE
+        self.runs: list[RunStats] = []
+
+    def load(self) -> "ThroughputHistory":
+        self.runs = []
+        if not self.path.exists():
+            return self
+        names = {f.name for f in fields(RunStats)}
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self.runs.append(RunStats(**{k: v for k, v in record.items() if k in names}))
+                except (ValueError, TypeError):
+                    continue
+        return self
+
+    def append(self, stats: RunStats) -> None:
+        """Дописать запуск; в файле остаются последние _HISTORY_LIMIT."""
+        stats.finished = stats.finished or time.time()
+        self.load()
+        self.runs = (self.runs + [stats])[-_HISTORY_LIMIT:]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for run in self.runs:
+                f.write(json.dumps(asdict(run)) + "\n")
+        tmp.replace(self.path)
+
+    def _median(self, values: list[float], default: float) -> float:
+        values = [v for v in values if v > 0]
+        return statistics.median(values) if values else default
+
+    @property
+    def calls_per_chunk(self) -> float:
+        """Запросов извлечения на чанк (эскалация, группы, деление, пропуски)."""
+        return self._median([r.extract_calls / r.chunks for r in self.runs if r.chunks],
+                            _DEFAULT_CALLS_PER_CHUNK)
+
+    @property
+    def output_tokens_per_call(self) -> float:
+        return self._median([r.output_tokens / r.calls for r in self.runs if r.calls],
+                            _DEFAULT_OUTPUT_TOKENS)
+
+    @property
+    def call_seconds(self) -> float:
+        """Время запроса при занятом слоте: время этапа × параллельность / запросы."""
+        return self._median(
+            [r.extract_seconds * r.concurrency / r.extract_calls for r in self.runs if r.extract_calls],
+            _DEFAULT_CALL_SECONDS,
+        )
+
+    @property
+    def overhead_seconds(self) -> float:
+        return self._median([r.overhead_seconds for r in self.runs], _DEFAULT_OVERHEAD_SECONDS)
+
+
+@dataclass
+class FileEstimate:
+    name: str
+    doc_type: str
+    pages: int  # 0 — не постраничный формат
+    size_bytes: int
+    chunks: int
+    input_tokens: int  # Содержимое всех чанков файла
+
+
+@dataclass
+class JobEstimate:
+    """Прогноз задания."""
+    files: list[FileEstimate] = field(default_factory=list)
+    chunks: int = 0
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0  # USD по ценам из конфигурации
+    seconds: float = 0.0  # Время обработки
+    api_seconds: float = 0.0  # Занятость слотов API (для оценки пакета)
+    concurrency: int = 1
+    history_runs: int = 0  # Запусков в истории, на которых основан прогноз
+
+    @property
+    def pages(self) -> int:
+        return sum(f.pages for f in self.files)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(f.size_bytes for f in self.files)
+
+    def summary(self) -> list[str]:
+        """Строки отчёта для лога и диалога."""
+        by_type: dict[str, int] = {}
+        for f in self.files:
+            by_type[f.doc_type] = by_type.get(f.doc_type, 0) + 1
+        types = ", ".join(f"{t}: {n}" for t, n in sorted(by_type.items()))
+        basis = (f"Оценка по истории запусков: {self.history_runs}" if self.history_runs
+                 else "Истории запусков нет — оценка по значениям по умолчанию")
+        return [
+            f"Файлов: {len(self.files)} ({types})",
+            f"Страниц: {self.pages}, объём: {self.size_bytes / (1024 * 1024):.1f} MB",
+            f"Чанков: {self.chunks}",
+            f"Запросов к API: ~{self.calls}",
+            f"Токенов: вход ~{_format_int(self.input_tokens)}, выход ~{_format_int(self.output_tokens)}",
+            f"Стоимость: ~${self.cost:.2f}",
+            f"Время: ~{_format_duration(self.seconds)} (параллельно запросов: {self.concurrency})",
+            basis,
+        ]
+
+
+def _format_int(value: int) -> str:
+    return f"{value:,}".replace(",", " ")
+
+
+def _format_duration(seconds: float) -> str:
+    minutes = round(seconds / 60)
+    if minutes < 1:
+        return "меньше минуты"
+    if minutes < 60:
+        return f"{minutes} мин"
+    return f"{minutes // 60} ч {minutes % 60:02d} мин"
+
+
+def _estimate_file(sf: ScannedFile, chunk_size: int, overlap: int) -> FileEstimate:
+    """Чанки и токены файла без нарезки PDF."""
+    doc_type = classify_file(sf.path)
+    if sf.extension == "pdf":
+        pages = page_count(sf.path)
+        ranges = chunk_ranges(pages, chunk_size, overlap)
+        pages_sent = sum(end - start + 1 for start, end in ranges)
+        return FileEstimate(sf.name, doc_type, pages, sf.size_bytes, len(ranges),
+                            pages_sent * _TOKENS_PER_PAGE)
+    if sf.extension in _TEXT_EXTENSIONS:
+        text = sf.path.read_text(encoding="utf-8", errors="replace")
+        return FileEstimate(sf.name, doc_type, 0, sf.size_bytes, 1, estimate_tokens(text))
+    if sf.extension in _IMAGE_EXTENSIONS:
+        return FileEstimate(sf.name, doc_type, 1, sf.size_bytes, 1, _TOKENS_PER_IMAGE)
+    # DOCX и прочие форматы передаются как есть — оценка по размеру
+    return FileEstimate(sf.name, doc_type, 0, sf.size_bytes, 1, sf.size_bytes // 4)
+
+
+def _price(config: dict, model: str) -> tuple[float, float]:
+    """Цена за 1 млн токенов (вход, выход)."""
+    prices = config.get("api_prices", {})
+    price = prices.get(model) or prices.get(FIXED_MODEL) or (0.0, 0.0)
+    return float(price[0]), float(price[1])
+
+
+def estimate_job(files: list[ScannedFile], config: dict,
+                 history: ThroughputHistory | None = None) -> JobEstimate:
+    """Спрогнозировать запросы, токены, стоимость и время задания."""
+    history = history if history is not None else ThroughputHistory().load()
+    chunk_size = config.get("chunk_size", 7)
+    overlap = config.get("overlap", 2)
+    started = time.monotonic()
+
+    estimate = JobEstimate(history_runs=len(history.runs))
+    for sf in files:
+        try:
+            estimate.files.append(_estimate_file(sf, chunk_size, overlap))
+        except Exception as e:
+            logger.warning(f"Оценка: не удалось прочитать {sf.name}: {e}")
+    estimate.chunks = sum(f.chunks for f in estimate.files)
+    content_tokens = sum(f.input_tokens for f in estimate.files)
+    if not estimate.chunks:
+        return estimate
+
+    routing = config.get("model_routing", True)
+    fast_model = config.get("fast_model", FAST_MODEL) if routing else FIXED_MODEL
+    shards = len(config.get("extraction_shards") or []) if config.get("sharded_extraction") else 0
+    prompt_tokens = estimate_tokens(EXTRACTION_SYSTEM_PROMPT) + 500  # + промпт чанка и контекст
+
+    # Извлечение: первый проход каждого чанка (по группам — на каждую группу),
+    # остальные запросы истории — эскалация на сильную модель и деление
+    passes = max(1, shards)
+    extract_calls = max(estimate.chunks * passes,
+                        math.ceil(estimate.chunks * history.calls_per_chunk))
+    first_calls = estimate.chunks * passes
+    extra_calls = extract_calls - first_calls
+    per_call_input = content_tokens / estimate.chunks + prompt_tokens
+    output_per_call = history.output_tokens_per_call
+
+    # Контекст — начальные страницы каждого файла; верификация — все чанки до лимита
+    context_pages = config.get("context_pages", 3)
+    context_input = sum(min(f.pages or 1, context_pages) for f in estimate.files) * _TOKENS_PER_PAGE
+    verify_share = min(1.0, _MAX_VERIFICATION_BYTES / max(1, estimate.size_bytes))
+    verify_input = (content_tokens * verify_share + _VERIFICATION_JSON_TOKENS
+                    + estimate_tokens(VERIFICATION_SYSTEM_PROMPT))
+
+    estimate.calls = extract_calls + 2
+    estimate.input_tokens = round(extract_calls * per_call_input + context_input + verify_input)
+    estimate.output_tokens = round(extract_calls * output_per_call
+                                   + _CONTEXT_OUTPUT_TOKENS + _VERIFICATION_OUTPUT_TOKENS)
+
+    fast_in, fast_out = _price(config, fast_model)
+    strong_in, strong_out = _price(config, FIXED_MODEL)
+    estimate.cost = (
+        first_calls * (per_call_input * fast_in + output_per_call * fast_out)
+        + extra_calls * (per_call_input * strong_in + output_per_call * strong_out)
+        + context_input * fast_in + _CONTEXT_OUTPUT_TOKENS * fast_out
+        + verify_input * strong_in + _VERIFICATION_OUTPUT_TOKENS * strong_out
+    ) / 1_000_000
+
+    estimate.concurrency = max(1, min(config.get("extraction_concurrency", 4),
+                                      config.get("api_max_concurrency", 4)))
+    estimate.api_seconds = extract_calls * history.call_seconds
+    # Нарезка PDF в pipeline занимает примерно столько же, сколько чтение здесь
+    local_seconds = time.monotonic() - started
+    estimate.seconds = (estimate.api_seconds / estimate.concurrency
+                        + history.overhead_seconds + local_seconds)
+    return estimate
+
+
+def estimate_batch_seconds(estimates: list[JobEstimate], jobs: int, api_max_concurrency: int) -> float:
+    """Время пакета: задания делят общий лимит запросов процесса."""
+    if not estimates:
+        return 0.0
+    slots = max(1, api_max_concurrency)
+    api = sum(e.api_seconds for e in estimates) / slots
+    overhead = sum(e.seconds - e.api_seconds / e.concurrency for e in estimates) / max(1, jobs)
+    longest = max(e.seconds for e in estimates)
+    return max(api + overhead, longest)
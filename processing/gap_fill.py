@@ -0,0 +1,107 @@
+"""Целевой поиск пропущенных параметров (после агрегации, до верификации).
+
+Для каждого параметра, не найденного при извлечении, по индексу страниц
+(processing.page_index) ищутся страницы с характерными словами и единицами
+измерения. Соседние страницы объединяются в короткие фрагменты, и по
+каждому фрагменту модели задаётся узкий вопрос — только о пропущенных
+параметрах, которые могут быть на этих страницах.
+
+Ищутся только страницы PDF с текстовым слоем: сканы в индексе без текста,
+текстовые файлы короткие и уже разобраны целиком.
+"""
+
+import logging
+from dataclasses import dataclass, replace
+
+from chunking.chunk_manager import Chunk
+from chunking.pdf_chunker import extract_page_range
+from processing.checkpoint import chunk_key
+from processing.page_index import PageIndex
+from processing.terms import FIELD_TERMS
+
+logger = logging.getLogger(__name__)
+
+GAP_FILL_POLICIES = ("off", "fill", "replace")
+
+DEFAULT_PAGES_PER_FIELD = 2  # Страниц-кандидатов на параметр
+DEFAULT_MAX_REQUESTS = 8  # Целевых запросов на задание
+DEFAULT_MAX_SPAN = 3  # Страниц в одном целевом запросе
+
+
+@dataclass
+class GapRequest:
+    """Целевой запрос: страницы документа и параметры, которые на них ищутся."""
+    chunk: Chunk
+    fields: list[str]
+    score: float = 0.0
+
+
+def plan_gap_requests(index: PageIndex, fingerprints: dict[str, str], chunks: list[Chunk],
+                      missing: list[str], pages_per_field: int = DEFAULT_PAGES_PER_FIELD,
+                      max_requests: int = DEFAULT_MAX_REQUESTS,
+                      max_span: int = DEFAULT_MAX_SPAN) -> list[GapRequest]:
+    """Страницы-кандидаты для пропущенных параметров, сгруппированные в запросы.
+
+    Args:
+        index: Индекс страниц задания.
+        fingerprints: Отпечатки файлов задания по имени (PageIndex.update).
+        chunks: Чанки этапа 1 — из них вырезаются страницы запросов.
+        missing: Поля, не найденные при извлечении.
+        pages_per_field: Сколько лучших страниц брать на параметр.
+        max_requests: Предельное число запросов (лучшие по числу параметров и релевантности).
+        max_span: Предельное число страниц в запросе.
+    """
+    pdf_files = {c.source_file for c in chunks if c.file_format == "PDF" and isinstance(c.data, bytes)}
+    names = {fp: name for name, fp in fingerprints.items() if name in pdf_files}
+    if not names:
+        return []
+
+    # (файл, страница) → {поле: релевантность}
+    candidates: dict[tuple[str, int], dict[str, float]] = {}
+    for field_name in missing:
+        terms = FIELD_TERMS.get(field_name)
+        if not terms:
+            continue
+        for hit in index.search(terms, fingerprints=list(names), limit=pages_per_field, prefix=True):
+            if hit.page is not None:
+                candidates.setdefault((names[hit.fingerprint], hit.page), {})[field_name] = hit.score
+
+    # Соседние страницы одного файла — один запрос
+    requests: list[GapRequest] = []
+    existing = {chunk_key(c) for c in chunks}
+    for file in sorted({f for f, _ in candidates}):
+        pages = sorted(p for f, p in candidates if f == file)
+        group = [pages[0]]
+        for page in pages[1:] + [None]:
+            if page is not None and page - group[-1] <= 1 and page - group[0] < max_span:
+                group.append(page)
+                continue
+            request = _make_request(file, group, candidates, chunks, existing)
+            if request is not None:
+                requests.append(request)
+            if page is not None:
+                group = [page]
+
+    requests.sort(key=lambda r: (-len(r.fields), -r.score))
+    return requests[:max_requests]
+
+
+def _make_request(file: str, pages: list[int], candidates: dict[tuple[str, int], dict[str, float]],
+                  chunks: list[Chunk], existing: set[tuple]) -> GapRequest | None:
+    """Запрос по страницам pages файла: страницы вырезаются из чанка, который их содержит."""
+    start, end = pages[0], pages[-1]
+    source = next((c for c in chunks if c.source_file == file and c.file_format == "PDF"
+                   and c.page_start is not None and c.page_start <= start <= c.page_end), None)
+    if source is None:
+        return None
+    end = min(end, source.page_end)
+    # Чанк с тем же диапазоном уже извлечён и занимает этот ключ в агрегаторе
+    if (file, start, end) in existing:
+        return None
+    fields: dict[str, float] = {}
+    for page in range(start, end + 1):
+        for field_name, score in candidates.get((file, page), {}).items():
+            fields[field_name] = max(fields.get(field_name, 0.0), score)
+    data = extract_page_range(source.data, start - source.page_start, end - source.page_start)
+    chunk = replace(source, page_start=start, page_end=end, data=data)
+    return GapRequest(chunk, sorted(fields, key=lambda f: -fields[f]), sum(fields.values()))
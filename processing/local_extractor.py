@@ -0,0 +1,457 @@
+"""Локальное извлечение шаблонных параметров по текстовому слою (без API).
+
+На страницах технических данных часть параметров чек-листа записывается
+по шаблону: напряжение и частота сети, установленная мощность, степень
+защиты IP, масса, габариты, температура окружающей среды. Правила ниже
+ищут подпись параметра и величину с единицей в строках текстового слоя
+и в строках таблиц (PyMuPDF find_tables) и возвращают ExtractedValue с
+точными страницей и цитатой.
+
+Значение надёжное (high), если подпись и величина стоят в одной строке
+текста или таблицы и другого значения того же параметра в чанке нет.
+Надёжные и полные значения (LocalExtraction.covered) не запрашиваются у
+модели; чанк, все технические величины которого разобраны правилами и
+в тексте которого нет подписей других параметров чек-листа (заземление,
+фундамент, безопасность…), можно не отправлять вовсе
+(LocalExtraction.self_sufficient).
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Callable
+
+import fitz  # PyMuPDF
+
+from chunking.chunk_manager import Chunk
+from gemini.schema import ChunkExtraction, ExtractedValue, SourceRef
+from processing.terms import FIELD_TERMS
+from processing.units import format_number
+
+logger = logging.getLogger(__name__)
+
+LOCAL_EXTRACTION_POLICIES = ("off", "reduce", "skip")
+
+_QUOTE_LIMIT = 50  # Длина цитаты, как в ответах модели
+
+# Величина с единицей — признак строки с техническими данными
+_QUANTITY_RE = re.compile(
+    r"\d+(?:[.,]\d+)?\s*(?:мм|mm|кг|kg|кВт|kW|кВ·?А|kVA|В|V|Гц|Hz|А|A|МПа|MPa|бар|bar"
+    r"|°\s?C|дБ|dB|м³|m3|л/мин|l/min)(?![\wа-яА-Я])"
+    r"|\bIP\s?\d{2}\b",
+    re.IGNORECASE,
+)
+# Таблицы ищутся только на страницах с техническими данными: find_tables медленный
+_TABLE_PAGE_QUANTITIES = 3
+
+_ROW_TOLERANCE = 3.0  # pt: слова на одной высоте — одна строка таблицы
+
+_UNIT_END = r"(?![\wа-яА-Я])"
+
+
+@dataclass(frozen=True)
+class _Part:
+    """Составляющая значения параметра: подпись и шаблон величины."""
+    name: str
+    label: re.Pattern
+    value: re.Pattern
+    render: Callable[[re.Match], str]
+    exclude: re.Pattern | None = None
+
+
+@dataclass(frozen=True)
+class _FieldRule:
+    field: str
+    parts: tuple[_Part, ...]
+    required: tuple[str, ...]  # Составляющие полного значения
+
+
+def _number(text: str) -> float:
+    return float(re.sub(r"[\s ]", "", text).replace(",", ".").replace("−", "-"))
+
+
+def _render_voltage(m: re.Match) -> str:
+    value = f"{m.group('v')} В"
+    phases = m.group("ph")
+    return f"{value}, {phases} ф" if phases else value
+
+
+def _render_frequency(m: re.Match) -> str:
+    return f"{m.group(1)} Гц"
+
+
+def _render_power(m: re.Match) -> str:
+    unit = "кВ·А" if m.group(2).lower() in ("ква", "кв·а", "kva") else "кВт"
+    return f"{m.group(1).replace('.', ',')} {unit}"
+
+
+def _render_ip(m: re.Match) -> str:
+    return f"IP{m.group(1).upper()}"
+
+
+def _render_weight(m: re.Match) -> str:
+    value = _number(m.group(1))
+    if m.group(2).lower() in ("т", "t"):
+        return f"{format_number(value, 1 if value % 1 else 0)} т"
+    return f"{format_number(value, 1 if value % 1 else 0)} кг"
+
+
+def _render_dimensions(m: re.Match) -> str:
+    unit = "м" if (m.group(4) or "").lower() in ("м", "m") else "мм"
+    return f"{m.group(1)} × {m.group(2)} × {m.group(3)} {unit}"
+
+
+def _render_temperature(m: re.Match) -> str:
+    low, high = (_signed(m.group(i)) for i in (1, 2))
+    return f"{low}…{high} °C"
+
+
+def _signed(text: str) -> str:
+    value = int(_number(text))
+    return f"+{value}" if value > 0 else str(value)
+
+
+def _render_humidity(m: re.Match) -> str:
+    return f"влажность до {m.group(1)} %"
+
+
+_RULES = (
+    _FieldRule("d2_voltage", (
+        _Part(
+            "voltage",
+            re.compile(r"напряжени|питани|сеть|сети\b|supply|voltage|mains", re.IGNORECASE),
+            re.compile(
+                r"(?:(?P<ph>[13])\s*(?:~|ф\b|фаз\w*|ph\b|phase)\W{0,3})?"
+                r"(?<![\d,.])(?P<v>\d{3}(?:\s*/\s*\d{3})?)\s*(?:В|V|VAC)" + _UNIT_END,
+                re.IGNORECASE,
+            ),
+            _render_voltage,
+            re.compile(r"управлени|control|вспомогат|auxiliar|катушк|coil|датчик|sensor|"
+                       r"выходн|output|аккумулятор|battery", re.IGNORECASE),
+        ),
+        _Part(
+            "frequency",
+            re.compile(r"частот|frequency|напряжени|питани|сеть|сети\b|supply|mains", re.IGNORECASE),
+            re.compile(r"(?<![\d,.])(50|60)(?:\s*/\s*(?:50|60))?\s*(?:Гц|Hz)" + _UNIT_END, re.IGNORECASE),
+            _render_frequency,
+            re.compile(r"вращени|rotation|шпиндел|spindle|преобразовател|inverter", re.IGNORECASE),
+        ),
+    ), required=("voltage", "frequency")),
+    _FieldRule("d1_power", (
+        _Part(
+            "power",
+            re.compile(
+                r"(?:установленн|суммарн|потребляем|общ|присоединённ|присоединенн)\w*\s+"
+                r"(?:электрическ\w+\s+)?мощност"
+                r"|мощност\w*\s+(?:установленн|потребляем|общ|суммарн)"
+                r"|installed power|total power|power consumption|connected load|power requirement",
+                re.IGNORECASE,
+            ),
+            re.compile(r"(?<![\d,.])(\d+(?:[.,]\d+)?)\s*(кВт|kW|кВ·?А|kVA)" + _UNIT_END, re.IGNORECASE),
+            _render_power,
+        ),
+    ), required=("power",)),
+    _FieldRule("d6_protection", (
+        _Part(
+            "ip",
+            re.compile(r"степен\w* защиты|защиты оболочки|класс защиты|protection|enclosure", re.IGNORECASE),
+            re.compile(r"\bIP\s?(\d{2}[A-DHMSW]?)\b", re.IGNORECASE),
+            _render_ip,
+            re.compile(r"двигател|motor|датчик|sensor|пульт|pendant|светильник|lamp", re.IGNORECASE),
+        ),
+    ), required=("ip",)),
+    _FieldRule("b3_weight", (
+        _Part(
+            "weight",
+            re.compile(r"\bмасса|\bвес\b|\bweight|\bmass\b", re.IGNORECASE),
+            re.compile(r"(?<![\d,.])(\d{1,3}(?:[  ]\d{3})+|\d+(?:[.,]\d+)?)\s*(кг|kg|т|t)" + _UNIT_END,
+                       re.IGNORECASE),
+            _render_weight,
+            re.compile(r"заготов|детал|издели|груз|обрабатыв|workpiece|load|стол|table|"
+                       r"инструмент|tool|упаков|брутто|gross|packing|shipping", re.IGNORECASE),
+        ),
+    ), required=("weight",)),
+    _FieldRule("b1_dimensions", (
+        _Part(
+            "dimensions",
+            re.compile(r"габарит|dimension|\bразмеры\b|Д\s*[×xх]\s*Ш|L\s*[×x]\s*W", re.IGNORECASE),
+            re.compile(
+                r"(?<![\d,.])(\d{2,5}(?:[.,]\d+)?)\s*[xXхХ×*]\s*(\d{2,5}(?:[.,]\d+)?)\s*[xXхХ×*]\s*"
+                r"(\d{2,5}(?:[.,]\d+)?)\s*(мм|mm|м|m)?" + _UNIT_END,
+                re.IGNORECASE,
+            ),
+            _render_dimensions,
+            re.compile(r"упаков|packing|shipping|транспорт|стол|table|заготов|workpiece|"
+                       r"рабоч\w+ (?:зон|пространств)|ход\b|travel|про[её]м|opening|фундамент|foundation",
+                       re.IGNORECASE),
+        ),
+    ), required=("dimensions",)),
+    _FieldRule("h4_climate", (
+        _Part(
+            "temperature",
+            re.compile(r"температур\w*\s+(?:окружающ|воздуха|в помещени|эксплуатац)"
+                       r"|рабоч\w+\s+температур|ambient|operating temperature", re.IGNORECASE),
+            re.compile(r"([+\-−]?\d{1,2})\s*(?:°\s*[CС]|℃)?\s*(?:\.\.\.|…|–|—|-|до|to|÷)\s*"
+                       r"([+\-−]?\d{1,2})\s*(?:°\s*[CС]|℃)", re.IGNORECASE),
+            _render_temperature,
+            re.compile(r"хранени|storage|транспорт|transport|охлажд|coolant|СОЖ|вод|water|масл|oil",
+                       re.IGNORECASE),
+        ),
+        _Part(
+            "humidity",
+            re.compile(r"влажност|humidity", re.IGNORECASE),
+            re.compile(r"(?<![\d,.])(\d{2})\s*%"),
+            _render_humidity,
+            re.compile(r"хранени|storage|транспорт|transport", re.IGNORECASE),
+        ),
+    ), required=("temperature", "humidity")),
+)
+
+LOCAL_FIELDS = tuple(rule.field for rule in _RULES)
+
+# Подписи параметров, которые правила не извлекают (основы слов — поиск по префиксу):
+# их упоминание в тексте означает, что чанк нужно отправить модели
+_OTHER_TERMS = {
+    field_name: re.compile(r"(?<!\w)(?:" + "|".join(re.escape(t) for t in terms) + ")", re.IGNORECASE)
+    for field_name, terms in FIELD_TERMS.items() if field_name not in LOCAL_FIELDS
+}
+
+
+@dataclass
+class _Match:
+    text: str  # Значение составляющей
+    page: int | None  # Страница внутри чанка (1-based)
+    quote: str
+    exact: bool  # Подпись и величина в одной строке текста/таблицы
+
+
+@dataclass
+class _Line:
+    text: str
+    page: int | None
+    exact: bool  # False — подпись и значение из соседних строк текста
+    second: int = 0  # Начало второй из соединённых строк
+
+
+@dataclass
+class LocalExtraction:
+    """Результат локального разбора чанка."""
+    extraction: ChunkExtraction = field(default_factory=ChunkExtraction)
+    covered: set[str] = field(default_factory=set)  # Надёжные и полные значения
+    pages: int = 0
+    text_pages: int = 0  # Страниц с текстовым слоем
+    unparsed_lines: int = 0  # Строк с величинами, не разобранных правилами
+    other_fields: list[str] = field(default_factory=list)  # Упомянутые параметры вне правил
+
+    @property
+    def found(self) -> list[str]:
+        return [f for f in LOCAL_FIELDS if getattr(self.extraction, f) is not None]
+
+    def self_sufficient(self, chunk: Chunk) -> bool:
+        """Чанк полностью разобран локально — запрос к модели ничего не добавит.
+
+        Начальные страницы файла (идентификация: наименование, модель,
+        производитель) всегда отправляются модели, как и чанки, где
+        упомянуты параметры без числовых значений, которые правила не
+        извлекают (система заземления TN-S, требования к фундаменту, защитные
+        блокировки).
+        """
+        if chunk.page_start is None or chunk.page_start == 1:
+            return False
+        return (bool(self.covered) and self.pages > 0 and self.text_pages == self.pages
+                and self.unparsed_lines == 0 and not self.other_fields)
+
+
+def extract_local(chunk: Chunk) -> LocalExtraction:
+    """Разобрать текстовый слой чанка правилами.
+
+    Страницы в SourceRef — внутри чанка (1 = первая страница), как в
+    ответах модели. Сканы без текстового слоя дают пустой результат.
+    """
+    result = LocalExtraction()
+    if isinstance(chunk.data, str):
+        result.pages = result.text_pages = 1
+        lines = [_Line(t, None, True) for t in _split_lines(chunk.data)]
+        lines += _joined(lines)
+    elif chunk.file_format == "PDF":
+        lines = _pdf_lines(chunk.data, result)
+    else:
+        return result
+
+    consumed: dict[int | None, list[str]] = {}
+    for rule in _RULES:
+        matches: dict[str, list[_Match]] = {}
+        for part in rule.parts:
+            matches[part.name] = _find(part, lines, consumed)
+        _apply(rule, matches, chunk, result)
+
+    # Строка разобрана, если входит в текст (строку таблицы, строку пары), где найдена величина
+    result.unparsed_lines = sum(
+        1 for line in lines
+        if line.exact and _QUANTITY_RE.search(line.text)
+        and not any(line.text in text for text in consumed.get(line.page, ()))
+    )
+    text = "\n".join(line.text for line in lines if line.exact)
+    result.other_fields = [f for f, pattern in _OTHER_TERMS.items() if pattern.search(text)]
+    return result
+
+
+def _pdf_lines(pdf_bytes: bytes, result: LocalExtraction) -> list[_Line]:
+    """Строки текста и строки таблиц всех страниц PDF чанка."""
+    lines: list[_Line] = []
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        result.pages = len(doc)
+        for index, page in enumerate(doc):
+            page_no = index + 1
+            text = page.get_text()
+            if not text.strip():
+                continue
+            result.text_pages += 1
+            page_lines = [_Line(t, page_no, True) for t in _split_lines(text)]
+            lines.extend(page_lines)
+            # Ячейки таблицы в текстовом слое идут отдельными строками:
+            # подпись и значение соединяются по соседним строкам
+            lines.extend(_joined(page_lines))
+            if len(_QUANTITY_RE.findall(text)) >= _TABLE_PAGE_QUANTITIES:
+                lines.extend(_layout_rows(page, page_no))
+                lines.extend(_table_rows(page, page_no))
+    finally:
+        doc.close()
+    return lines
+
+
+def _layout_rows(page, page_no: int) -> list[_Line]:
+    """Строки таблиц без линеек: слова разных строк текста на одной высоте."""
+    rows: dict[int, list[tuple]] = {}
+    for word in page.get_text("words"):
+        x0, y0, x1, y1, text, block, line = word[:7]
+        rows.setdefault(round((y0 + y1) / 2 / _ROW_TOLERANCE), []).append((x0, (block, line), text))
+    result = []
+    for words in rows.values():
+        if len({line for _, line, _ in words}) < 2:
+            continue  # Обычная строка текста — уже есть в текстовом слое
+        words.sort()
+        result.append(_Line(" ".join(text for _, _, text in words), page_no, True))
+    return result
+
+
+def _table_rows(page, page_no: int) -> list[_Line]:
+    try:
+        tables = page.find_tables().tables
+    except Exception as e:
+        logger.debug(f"Таблицы стр. {page_no} не прочитаны: {e}")
+        return []
+    rows = []
+    for table in tables:
+        for row in table.extract():
+            cells = [" ".join(str(c).split()) for c in row if c]
+            if len(cells) >= 2:
+                rows.append(_Line(" | ".join(cells), page_no, True))
+    return rows
+
+
+def _split_lines(text: str) -> list[str]:
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def _joined(lines: list[_Line]) -> list[_Line]:
+    return [
+        _Line(f"{a.text} {b.text}", a.page, False, len(a.text) + 1)
+        for a, b in zip(lines, lines[1:]) if a.page == b.page
+    ]
+
+
+def _find(part: _Part, lines: list[_Line], consumed: dict[int | None, list[str]]) -> list[_Match]:
+    found = []
+    for line in lines:
+        label = part.label.search(line.text)
+        if not label or (part.exclude and part.exclude.search(line.text)):
+            continue
+        value = part.value.search(line.text, label.start()) or part.value.search(line.text)
+        if not value:
+            continue
+        source = line.text
+        if line.second:
+            source = line.text[line.second:] if value.start() >= line.second else line.text[:line.second]
+        consumed.setdefault(line.page, []).append(source)
+        found.append(_Match(part.render(value), line.page, _quote(line.text, label, value), line.exact))
+    return found
+
+
+def _quote(text: str, label: re.Match, value: re.Match) -> str:
+    """Цитата до _QUOTE_LIMIT символов с подписью и величиной, если помещаются."""
+    start = min(label.start(), value.start())
+    end = max(label.end(), value.end())
+    if end - start > _QUOTE_LIMIT:
+        start = max(0, value.end() - _QUOTE_LIMIT)
+    return text[start:start + _QUOTE_LIMIT].strip()
+
+
+def _apply(rule: _FieldRule, matches: dict[str, list[_Match]], chunk: Chunk,
+           result: LocalExtraction) -> None:
+    """Собрать значение параметра: основная составляющая и дополнения."""
+    chosen: list[_Match] = []
+    complete = True
+    for n, part in enumerate(rule.parts):
+        found = matches[part.name]
+        exact = [m for m in found if m.exact]
+        candidates = exact or found
+        if not candidates or len({m.text for m in candidates}) > 1:
+            # Нет значения или несколько разных (узлы, варианты исполнения) — решает модель
+            if n == 0:
+                return
+            complete = complete and part.name not in rule.required
+            continue
+        chosen.append(candidates[0])
+
+    main = chosen[0]
+    reliable = all(m.exact for m in chosen)
+    value = ExtractedValue(
+        value=", ".join(m.text for m in chosen),
+        source=SourceRef(
+            file=chunk.source_file,
+            doc_type=chunk.source_type,
+            page=main.page,
+            section="текстовый слой",
+            quote=main.quote,
+            confidence="high" if reliable else "medium",
+        ),
+    )
+    setattr(result.extraction, rule.field, value)
+    if reliable and complete:
+        result.covered.add(rule.field)
+
+
+def merge_local(chunk: Chunk, results: list[tuple[Chunk, ChunkExtraction]],
+                local: LocalExtraction) -> list[tuple[Chunk, ChunkExtraction]]:
+    """Дополнить результаты модели локальными значениями.
+
+    Поля covered модель не извлекала — берутся локальные значения; прочие
+    локальные значения заполняют только поля, которых нет в ответе модели.
+    Если чанк при извлечении делился, значение попадает в часть со своей
+    страницей (страница пересчитывается от начала части).
+    """
+    if not local.found:
+        return results
+    if not results:
+        return [(chunk, local.extraction)]
+
+    for field_name in local.found:
+        value: ExtractedValue = getattr(local.extraction, field_name)
+        page = None
+        if value.source.page is not None and chunk.page_start is not None:
+            page = chunk.page_start + value.source.page - 1
+        part, extraction = results[0]
+        for candidate in results:
+            c = candidate[0]
+            if page is not None and c.page_start is not None and c.page_start <= page <= (c.page_end or page):
+                part, extraction = candidate
+                break
+        if getattr(extraction, field_name) is not None and field_name not in local.covered:
+            continue
+        value = value.model_copy(deep=True)
+        if page is not None and part.page_start is not None:
+            value.source.page = page - part.page_start + 1
+        setattr(extraction, field_name, value)
+    return results
@@ -0,0 +1,237 @@
+"""Полнотекстовый индекс страниц документов (SQLite FTS5).
+
+Текст страниц обработанных документов хранится в CONFIG_DIR/page_index.db
+по отпечатку файла (processing.checkpoint.file_fingerprint) и номеру
+страницы. Этап 1 дополняет индекс: файл, уже проиндексированный с тем же
+отпечатком, повторно не читается. Запросы (search) находят страницы-
+кандидаты по словам и единицам измерения за миллисекунды — без отправки
+документов модели.
+
+Индексируется текстовый слой PDF (по страницам) и текстовые файлы (одна
+страница без номера). Сканы, изображения и DOCX/Excel попадают в индекс
+без страниц: по ним поиск ничего не находит. Документы, не встречавшиеся
+дольше max_age_days, удаляются при открытии индекса.
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from chunking.chunk_manager import Chunk
+from config import CONFIG_DIR
+from processing.checkpoint import file_fingerprint
+from scanner.folder_scanner import ScannedFile
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = CONFIG_DIR / "page_index.db"
+DEFAULT_MAX_AGE_DAYS = 90
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    fingerprint TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    indexed REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(
+    text, fingerprint UNINDEXED, page UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# Символы, которые FTS5 трактует как синтаксис запроса
+_TERM_RE = re.compile(r"[\w.,]+", re.UNICODE)
+
+
+@dataclass
+class PageHit:
+    """Страница, найденная запросом."""
+    fingerprint: str
+    file: str
+    page: int | None  # None — текстовый файл целиком
+    score: float  # Релевантность bm25 (больше — лучше)
+    snippet: str = ""
+
+
+def match_query(terms: list[str], prefix: bool = False) -> str:
+    """Выражение MATCH: любое из слов/фраз terms (синтаксис FTS5 экранируется).
+
+    prefix=True — слова ищутся как префиксы («напряж» → «напряжение»).
+    """
+    phrases = []
+    for term in terms:
+        words = _TERM_RE.findall(term)
+        if not words:
+            continue
+        phrase = '"' + " ".join(words).replace('"', "") + '"'
+        phrases.append(phrase + "*" if prefix and len(words) == 1 else phrase)
+    return " OR ".join(dict.fromkeys(phrases))
+
+
+class PageIndex:
+    """Индекс страниц (одно соединение на процесс, доступ под блокировкой)."""
+
+    def __init__(self, db_path: Path | None = None, max_age_days: float = DEFAULT_MAX_AGE_DAYS):
+        db_path = db_path or INDEX_FILE
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(db_path), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        if max_age_days:
+            self.prune(max_age_days)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # --- Наполнение ---
+
+    def has(self, fingerprint: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM documents WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+        return row is not None
+
+    def add_document(self, fingerprint: str, name: str, pages: dict[int | None, str]) -> None:
+        """Записать (заменить) текст страниц документа."""
+        now = time.time()
+        rows = [(text, fingerprint, page) for page, text in pages.items() if text.strip()]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM pages WHERE fingerprint = ?", (fingerprint,))
+                self._conn.executemany(
+                    "INSERT INTO pages (text, fingerprint, page) VALUES (?, ?, ?)", rows
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents (fingerprint, name, page_count, indexed, used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (fingerprint, name, len(rows), now, now),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def update(self, files: list[ScannedFile], chunks: list[Chunk]) -> tuple[dict[str, str], int]:
+        """Проиндексировать новые и изменённые файлы задания.
+
+        Returns:
+            (fingerprints, indexed): отпечаток каждого файла по имени и
+            число файлов, прочитанных заново (остальные взяты из индекса).
+        """
+        fingerprints = {f.name: file_fingerprint(f.path) for f in files}
+        indexed = 0
+        for f in files:
+            fingerprint = fingerprints[f.name]
+            if self.has(fingerprint):
+                continue
+            try:
+                pages = _file_pages(f, chunks)
+            except Exception as e:
+                logger.warning(f"Не удалось прочитать текст {f.name} для индекса: {e}")
+                continue
+            self.add_document(fingerprint, f.name, pages)
+            indexed += 1
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE documents SET used = ?, name = ? WHERE fingerprint = ?",
+                [(time.time(), name, fp) for name, fp in fingerprints.items()],
+            )
+        return fingerprints, indexed
+
+    def prune(self, max_age_days: float) -> int:
+        """Удалить документы, не встречавшиеся дольше max_age_days. Returns: число удалённых."""
+        cutoff = time.time() - max_age_days * 86400
+        with self._lock:
+            stale = [row["fingerprint"] for row in self._conn.execute(
+                "SELECT fingerprint FROM documents WHERE used < ?", (cutoff,)
+            )]
+            for fingerprint in stale:
+                self._conn.execute("DELETE FROM pages WHERE fingerprint = ?", (fingerprint,))
+                self._conn.execute("DELETE FROM documents WHERE fingerprint = ?", (fingerprint,))
+        if stale:
+            logger.info(f"Индекс страниц: удалено устаревших документов: {len(stale)}")
+        return len(stale)
+
+    # --- Запросы ---
+
+    def pages(self, fingerprint: str) -> dict[int | None, str]:
+        """Текст всех проиндексированных страниц документа."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page, text FROM pages WHERE fingerprint = ?", (fingerprint,)
+            ).fetchall()
+        return {row["page"]: row["text"] for row in rows}
+
+    def page_text(self, fingerprint: str, page: int | None) -> str:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM pages WHERE fingerprint = ? AND page IS ?", (fingerprint, page)
+            ).fetchone()
+        return row["text"] if row else ""
+
+    def search(self, terms: list[str], fingerprints: list[str] | None = None,
+               limit: int = 10, prefix: bool = False) -> list[PageHit]:
+        """Страницы, содержащие любое из terms, по убыванию релевантности.
+
+        Args:
+            terms: Слова или фразы (например, «напряжение», «кВт», «IP54»).
+            fingerprints: Искать только в этих документах (None — во всех).
+            limit: Сколько страниц вернуть.
+            prefix: Искать слова как префиксы.
+        """
+        query = match_query(terms, prefix)
+        if not query or fingerprints == []:
+            return []
+        sql = ("SELECT pages.fingerprint, documents.name, pages.page, bm25(pages) AS rank, "
+               "snippet(pages, 0, '[', ']', '…', 12) AS snippet "
+               "FROM pages JOIN documents ON documents.fingerprint = pages.fingerprint "
+               "WHERE pages MATCH ?")
+        params: list = [query]
+        if fingerprints is not None:
+            sql += f" AND pages.fingerprint IN ({','.join('?' * len(fingerprints))})"
+            params.extend(fingerprints)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [PageHit(row["fingerprint"], row["name"], row["page"], -row["rank"], row["snippet"])
+                for row in rows]
+
+
+def _file_pages(f: ScannedFile, chunks: list[Chunk]) -> dict[int | None, str]:
+    """Текст страниц файла: PDF — по страницам, текстовые файлы — из чанка."""
+    if f.extension == "pdf":
+        import fitz
+        doc = fitz.open(f.path)
+        try:
+            return {i + 1: page.get_text() for i, page in enumerate(doc)}
+        finally:
+            doc.close()
+    return {None: c.data for c in chunks if c.source_file == f.name and isinstance(c.data, str)}
+
+
+_index: PageIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_page_index(max_age_days: float | None = None) -> PageIndex:
+    """Индекс страниц процесса (создаётся при первом обращении)."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = PageIndex(max_age_days=DEFAULT_MAX_AGE_DAYS if max_age_days is None else max_age_days)
+        return _index
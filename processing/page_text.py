@@ -0,0 +1,85 @@
+"""Текст страниц документов задания для локальных проверок.
+
+Текст берётся из индекса страниц (processing.page_index) или, если индекс
+отключён, из чанков этапа 1 (страницы перекрытия читаются один раз);
+текстовые файлы — одна «страница» без номера. Сканы без текстового слоя
+дают пустые страницы: по ним локальная проверка невозможна.
+"""
+
+import logging
+import re
+
+from chunking.chunk_manager import Chunk
+from chunking.pdf_chunker import page_texts
+from processing.page_index import PageIndex
+
+logger = logging.getLogger(__name__)
+
+# Похожие буквы латиницы и кириллицы (OCR и смешанные раскладки) → латиница
+_HOMOGLYPHS = str.maketrans({
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o",
+    "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "×": "x", "–": "-", "—": "-",
+    "−": "-", ",": ".", "«": '"', "»": '"', "“": '"', "”": '"', "’": "'",
+})
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Текст для сравнения цитат: регистр, похожие буквы, без пробелов."""
+    return _SPACE_RE.sub("", text.lower().translate(_HOMOGLYPHS))
+
+
+class PageTextStore:
+    """Текст страниц: файл → номер страницы (None для не-PDF) → текст."""
+
+    def __init__(self):
+        self._pages: dict[str, dict[int | None, str]] = {}
+        self._normalized: dict[tuple[str, int | None], str] = {}
+
+    @classmethod
+    def from_chunks(cls, chunks: list[Chunk]) -> "PageTextStore":
+        store = cls()
+        for chunk in chunks:
+            if isinstance(chunk.data, str):
+                store.add(chunk.source_file, None, chunk.data)
+            elif chunk.file_format == "PDF" and chunk.page_start is not None:
+                pages = store._pages.get(chunk.source_file, {})
+                if all(p in pages for p in range(chunk.page_start, (chunk.page_end or chunk.page_start) + 1)):
+                    continue
+                try:
+                    texts = page_texts(chunk.data)
+                except Exception as e:
+                    logger.warning(f"Не удалось прочитать текст {chunk.source_file}: {e}")
+                    continue
+                for offset, text in enumerate(texts):
+                    store.add(chunk.source_file, chunk.page_start + offset, text)
+        return store
+
+    @classmethod
+    def from_index(cls, index: PageIndex, fingerprints: dict[str, str]) -> "PageTextStore":
+        """Страницы файлов задания из индекса (fingerprints: имя файла → отпечаток)."""
+        store = cls()
+        for name, fingerprint in fingerprints.items():
+            for page, text in index.pages(fingerprint).items():
+                store.add(name, page, text)
+        return store
+
+    def add(self, file: str, page: int | None, text: str) -> None:
+        self._pages.setdefault(file, {})[page] = text
+        self._normalized.pop((file, page), None)
+
+    def has_file(self, file: str) -> bool:
+        return file in self._pages
+
+    def pages(self, file: str) -> list[int | None]:
+        return sorted(self._pages.get(file, {}), key=lambda p: -1 if p is None else p)
+
+    def text(self, file: str, page: int | None) -> str:
+        return self._pages.get(file, {}).get(page, "")
+
+    def normalized(self, file: str, page: int | None) -> str:
+        """Нормализованный текст страницы (normalize_text), кэшируется."""
+        key = (file, page)
+        if key not in self._normalized:
+            self._normalized[key] = normalize_text(self.text(file, page))
+        return self._normalized[key]
@@ -0,0 +1,234 @@
+"""Состояние проекта оборудования для повторного анализа с изменённым набором файлов.
+
+Поставщик часто присылает ещё один документ, когда карточка уже готова.
+Проект (одна карточка — один проект) хранит извлечения по каждому файлу,
+контекст оборудования и результат верификации. При повторном анализе:
+    - чанки неизменённых файлов берутся из проекта без запросов к Gemini;
+    - извлекаются только чанки добавленных файлов;
+    - вклад удалённых файлов в карточку отзывается;
+    - верификация выполняется только по добавленным документам (дельта),
+      прежние замечания сохраняются для неизменившихся параметров.
+Если с прошлого анализа сменились модели, промпты, чек-лист или настройки
+извлечения (analysis_version), проект анализируется заново целиком.
+
+Каталог проекта: CONFIG_DIR/projects/<хеш пути карточки>:
+    project.json            — набор файлов, контекст, верификация
+    files/<отпечаток>/      — журнал извлечений файла (формат JobCheckpoint)
+"""
+
+import hashlib
+import json
+import logging
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from config import CONFIG_DIR
+from scanner.folder_scanner import ScannedFile
+from chunking.chunk_manager import Chunk
+from gemini.schema import ChunkExtraction, ExtractedValue, CHECKLIST_FIELDS
+from gemini.prompts import CONTEXT_SYSTEM_PROMPT, EXTRACTION_SYSTEM_PROMPT, VERIFICATION_SYSTEM_PROMPT
+from gemini.wire import field_name_for
+from processing.checkpoint import JobCheckpoint, file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+PROJECTS_DIR = CONFIG_DIR / "projects"
+_PROJECT_FILE = "project.json"
+
+# Настройки, от которых зависят сохранённые извлечения
+_VERSION_CONFIG_KEYS = (
+    "sharded_extraction", "extraction_shards", "local_extraction", "pipelined_context", "context_pages",
+)
+
+# Разделы ответа верификации со ссылкой на параметр
+_VERIFICATION_SECTIONS = (
+    "missing_params", "conflicts", "indirect_params", "corrections", "additional_values",
+)
+
+
+@dataclass
+class ProjectDelta:
+    """Изменение набора файлов относительно прошлого анализа."""
+    added: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    kept: list[str] = field(default_factory=list)
+    stale: str = ""  # Почему прошлые извлечения не используются ("" — используются)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+class ProjectState:
+    """Сохранённый анализ одной карточки оборудования."""
+
+    def __init__(self, project_dir: Path):
+        self.project_dir = project_dir
+        self.data: dict = {}
+
+    @classmethod
+    def for_card(cls, output_path: Path) -> "ProjectState":
+        key = hashlib.sha1(str(Path(output_path).resolve()).encode("utf-8")).hexdigest()[:16]
+        return cls(PROJECTS_DIR / key)
+
+    @property
+    def exists(self) -> bool:
+        return bool(self.data.get("files"))
+
+    @property
+    def context(self) -> dict | None:
+        return self.data.get("context")
+
+    @property
+    def verification(self) -> dict | None:
+        return self.data.get("verification")
+
+    def load(self) -> "ProjectState":
+        path = self.project_dir / _PROJECT_FILE
+        if path.exists():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Состояние проекта {path} не прочитано: {e}")
+                self.data = {}
+        return self
+
+    def delta(self, files: list[ScannedFile], chunk_size: int, overlap: int,
+              model: str = "", version: str = "") -> ProjectDelta:
+        """Сравнить набор файлов с прошлым анализом.
+
+        При другой нарезке на чанки, других моделях (model) или версии
+        анализа (analysis_version) сохранённые извлечения непригодны —
+        все файлы считаются добавленными.
+        """
+        current = {f.name: file_fingerprint(f.path) for f in files}
+        previous: dict[str, str] = self.data.get("files", {})
+        delta = ProjectDelta()
+        if (self.data.get("chunk_size"), self.data.get("overlap")) != (chunk_size, overlap):
+            delta.stale = "изменена нарезка на чанки"
+        elif self.data.get("model") != model:
+            delta.stale = f"изменены модели ({self.data.get('model') or 'не указаны'} → {model})"
+        elif self.data.get("version") != version:
+            delta.stale = "изменены промпты, чек-лист или настройки извлечения"
+        if delta.stale:
+            previous = {}
+
+        for name, fingerprint in current.items():
+            if previous.get(name) == fingerprint:
+                delta.kept.append(name)
+            else:
+                delta.added.append(name)
+        delta.removed = [name for name in previous if name not in current]
+        return delta
+
+    def cached_chunks(self, names: list[str]) -> dict[tuple, list[tuple[tuple, ChunkExtraction]]]:
+        """Сохранённые извлечения файлов: ключ чанка → части (как CheckpointState.chunks)."""
+        result: dict = {}
+        fingerprints: dict[str, str] = self.data.get("files", {})
+        for name in names:
+            fingerprint = fingerprints.get(name)
+            if fingerprint:
+                result.update(self._file_journal(fingerprint).load().chunks)
+        return result
+
+    def unchanged_fields(self, resolved: dict[str, ExtractedValue | None]) -> set[str]:
+        """Параметры, значение которых не изменилось с прошлой верификации."""
+        previous: dict[str, str] = self.data.get("snapshot", {})
+        current = _snapshot(resolved)
+        return {f for f, digest in current.items() if previous.get(f) == digest}
+
+    def save(self, files: list[ScannedFile], chunk_size: int, overlap: int,
+             chunks: list[Chunk], completed: dict[int, list[tuple[Chunk, ChunkExtraction]]],
+             context: dict | None, verification: dict | None,
+             resolved: dict[str, ExtractedValue | None],
+             model: str = "", version: str = "") -> None:
+        """Сохранить результат анализа.
+
+        Args:
+            model, version: Модели и версия анализа (см. delta).
+            completed: Индекс чанка → результаты извлечения (части чанка).
+            resolved: Карточка до применения верификации — по ней при
+                следующем анализе определяются неизменившиеся параметры.
+        """
+        fingerprints = {f.name: file_fingerprint(f.path) for f in files}
+
+        by_file: dict[str, list[int]] = {}
+        for i in completed:
+            by_file.setdefault(chunks[i].source_file, []).append(i)
+        for name, fingerprint in fingerprints.items():
+            journal = self._file_journal(fingerprint)
+            journal.reset([f for f in files if f.name == name])
+            for i in sorted(by_file.get(name, [])):
+                if completed[i]:
+                    journal.record_chunk(chunks[i], completed[i])
+
+        # Журналы удалённых и изменённых файлов больше не нужны
+        files_dir = self.project_dir / "files"
+        for stale in (files_dir.iterdir() if files_dir.exists() else []):
+            if stale.name not in fingerprints.values():
+                shutil.rmtree(stale, ignore_errors=True)
+
+        self.data = {
+            "chunk_size": chunk_size,
+            "overlap": overlap,
+            "model": model,
+            "version": version,
+            "files": fingerprints,
+            "context": context,
+            "verification": verification,
+            "snapshot": _snapshot(resolved),
+        }
+        self.project_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.project_dir / _PROJECT_FILE, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+
+    def _file_journal(self, fingerprint: str) -> JobCheckpoint:
+        return JobCheckpoint(self.project_dir / "files" / fingerprint)
+
+
+def analysis_version(config: dict) -> str:
+    """Версия анализа: хеш промптов, чек-листа и настроек извлечения."""
+    parts = [
+        EXTRACTION_SYSTEM_PROMPT, CONTEXT_SYSTEM_PROMPT, VERIFICATION_SYSTEM_PROMPT,
+        json.dumps(CHECKLIST_FIELDS, ensure_ascii=False),
+        json.dumps({key: config.get(key) for key in _VERSION_CONFIG_KEYS}, ensure_ascii=False, sort_keys=True),
+    ]
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+def merge_verification(previous: dict | None, delta: dict | None,
+                       unchanged_fields: set[str], present_files: set[str]) -> dict:
+    """Объединить прежнюю верификацию с дельта-верификацией.
+
+    Прежнее замечание сохраняется, если параметр не изменился, источник
+    (если указан) не удалён и дельта не дала замечания того же вида по
+    этому параметру.
+    """
+    merged: dict = {section: [] for section in _VERIFICATION_SECTIONS}
+    delta = delta or {}
+    previous = previous or {}
+
+    for section in _VERIFICATION_SECTIONS:
+        fresh = delta.get(section, [])
+        fresh_fields = {field_name_for(item.get("field", "")) for item in fresh}
+        for item in previous.get(section, []):
+            field_name = field_name_for(item.get("field", ""))
+            if field_name not in unchanged_fields or field_name in fresh_fields:
+                continue
+            if item.get("file") and item["file"] not in present_files:
+                continue
+            merged[section].append(item)
+        merged[section].extend(fresh)
+    return merged
+
+
+def _snapshot(resolved: dict[str, ExtractedValue | None]) -> dict[str, str]:
+    """Короткий хеш значения каждого параметра."""
+    snapshot = {}
+    for field_name, _ in CHECKLIST_FIELDS:
+        ev = resolved.get(field_name)
+        text = ev.model_dump_json() if ev is not None else ""
+        snapshot[field_name] = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+    return snapshot
@@ -0,0 +1,149 @@
+"""Локальная проверка цитат по текстовому слою (до верификации моделью).
+
+У каждого значения есть источник: файл, страница и цитата. Цитата ищется
+на указанной странице текстового слоя — точно или нечётко (шум OCR,
+пробелы, похожие буквы). Если цитата найдена на соседней странице,
+номер страницы исправляется. Значение подтверждено, если цитата найдена
+и хотя бы одно число значения есть на странице; у ненайденных
+уверенность снижается до medium.
+
+Подтверждённые значения не отправляются модели на верификацию (этап 5);
+неподтверждённые помечаются в примечании значения и проверяются моделью.
+"""
+
+import difflib
+import logging
+import re
+from dataclasses import dataclass
+
+from gemini.schema import CHECKLIST_FIELDS, ExtractedValue
+from processing.page_text import PageTextStore, normalize_text
+
+logger = logging.getLogger(__name__)
+
+CONFIRMED = "confirmed"  # Цитата на указанной странице
+MOVED = "moved"  # Цитата на соседней странице — страница исправлена
+NOT_FOUND = "not_found"  # Цитаты нет на странице и рядом
+UNVERIFIABLE = "unverifiable"  # Нет цитаты или текстового слоя (скан)
+
+DEFAULT_THRESHOLD = 0.85  # Сходство нечёткого совпадения
+DEFAULT_WINDOW = 2  # Страниц до и после указанной
+_MIN_FUZZY_LENGTH = 8  # Короткие цитаты — только точное совпадение
+
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+@dataclass
+class QuoteCheck:
+    """Итог проверки цитаты одного значения."""
+    field: str
+    status: str
+    page: int | None = None  # Страница, где найдена цитата
+    score: float = 0.0
+
+    @property
+    def confirmed(self) -> bool:
+        return self.status in (CONFIRMED, MOVED)
+
+
+def quote_score(quote: str, text: str) -> float:
+    """Сходство цитаты с лучшим фрагментом текста (оба нормализованы), 0..1."""
+    if not quote or not text:
+        return 0.0
+    if quote in text:
+        return 1.0
+    if len(quote) < _MIN_FUZZY_LENGTH:
+        return 0.0
+    # Окна текста длиной с цитату вокруг совпадающих блоков (partial ratio)
+    matcher = difflib.SequenceMatcher(None, text, quote, autojunk=False)
+    best = 0.0
+    for block in matcher.get_matching_blocks():
+        if block.size < 3:
+            continue
+        start = max(0, block.a - block.b)
+        window = text[start:start + len(quote)]
+        best = max(best, difflib.SequenceMatcher(None, window, quote, autojunk=False).ratio())
+        if best >= 0.99:
+            break
+    return best
+
+
+def check_value(field: str, value: ExtractedValue, store: PageTextStore,
+                threshold: float = DEFAULT_THRESHOLD, window: int = DEFAULT_WINDOW) -> QuoteCheck:
+    """Проверить цитату значения по тексту страницы и соседних страниц."""
+    src = value.source
+    quote = normalize_text(src.quote)
+    if not quote or not store.has_file(src.file):
+        return QuoteCheck(field, UNVERIFIABLE)
+
+    if src.page is None:
+        candidates = store.pages(src.file)
+    else:
+        nearby = sorted(range(src.page - window, src.page + window + 1), key=lambda p: abs(p - src.page))
+        candidates = [p for p in nearby if p >= 1]
+    texts = [(p, store.normalized(src.file, p)) for p in candidates]
+    if not any(text for _, text in texts):
+        return QuoteCheck(field, UNVERIFIABLE)
+
+    numbers = _NUMBER_RE.findall(normalize_text(value.value))
+    # Сначала точное совпадение на любой из страниц: нечёткое на соседней
+    # странице однотипного документа (отличие в одной цифре) не должно его опередить
+    for fuzzy in (False, True):
+        for page, text in texts:
+            score = quote_score(quote, text) if fuzzy else float(quote in text)
+            if score < threshold:
+                continue
+            if numbers and not any(n in text for n in numbers):
+                continue  # Цитата есть, но числа значения на странице нет
+            status = CONFIRMED if page == src.page else MOVED
+            return QuoteCheck(field, status, page, score)
+    return QuoteCheck(field, NOT_FOUND)
+
+
+def verify_quotes(resolved: dict[str, ExtractedValue | None], store: PageTextStore,
+                  threshold: float = DEFAULT_THRESHOLD,
+                  window: int = DEFAULT_WINDOW) -> dict[str, QuoteCheck]:
+    """Проверить цитаты карточки; исправить страницы, пометить неподтверждённые.
+
+    Значения resolved изменяются на месте: страница переносится на найденную,
+    к неподтверждённым добавляется примечание. Страницы значений из
+    расхождений (conflict_values) тоже исправляются.
+    """
+    checks: dict[str, QuoteCheck] = {}
+    for field_name, _label in CHECKLIST_FIELDS:
+        value = resolved.get(field_name)
+        if value is None:
+            continue
+        check = check_value(field_name, value, store, threshold, window)
+        checks[field_name] = check
+        if check.status == MOVED:
+            logger.info(f"Цитата {field_name}: стр. {value.source.page} → {check.page}")
+            value.source.page = check.page
+        elif check.status == NOT_FOUND:
+            if value.source.confidence == "high":
+                value.source.confidence = "medium"
+            value.note = ((value.note + "; ") if value.note else "") + (
+                f"[ЦИТАТА НЕ НАЙДЕНА] на стр. {value.source.page} текстового слоя"
+                if value.source.page is not None else "[ЦИТАТА НЕ НАЙДЕНА] в текстовом слое"
+            )
+        for entry in value.conflict_values:
+            entry_check = check_value(field_name, ExtractedValue(value=entry.value, source=entry.source),
+                                      store, threshold, window)
+            if entry_check.status == MOVED:
+                entry.source.page = entry_check.page
+    return checks
+
+
+def needs_model_check(value: ExtractedValue, check: QuoteCheck | None) -> bool:
+    """Значение нужно проверить моделью: не подтверждено или есть расхождение."""
+    if check is None or not check.confirmed:
+        return True
+    return bool(value.conflict_values) or value.status in ("конфликт", "неоднозначно")
+
+
+def summary(checks: dict[str, QuoteCheck]) -> str:
+    counts = {CONFIRMED: 0, MOVED: 0, NOT_FOUND: 0, UNVERIFIABLE: 0}
+    for check in checks.values():
+        counts[check.status] += 1
+    return (f"подтверждено: {counts[CONFIRMED]}, страница исправлена: {counts[MOVED]}, "
+            f"не найдено: {counts[NOT_FOUND]}, без текста/цитаты: {counts[UNVERIFIABLE]}")
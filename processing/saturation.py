@@ -0,0 +1,88 @@
+"""Отслеживание насыщения чек-листа для досрочного завершения этапа 3.
+
+Если по каждому параметру уже есть значение, которое чанк данного типа
+документа не может превзойти по иерархии источников (resolve_conflict),
+обработка такого чанка не изменит выбранные значения — его можно пропустить
+или отложить в конец очереди. Пропущенный чанк не попадает и в расхождения:
+значение источника ниже рангом, отличное от выбранного, в карточке не
+отмечается как конфликт. Поэтому по умолчанию досрочное завершение выключено.
+"""
+
+import logging
+
+from gemini.schema import ChunkExtraction, CHECKLIST_FIELDS
+from chunking.chunk_manager import Chunk
+from processing.conflict_resolver import source_rank
+
+logger = logging.getLogger(__name__)
+
+EARLY_STOP_POLICIES = ("off", "skip", "defer")
+
+
+class SaturationTracker:
+    """Лучший ранг источника по каждому параметру, обновляемый по мере извлечения."""
+
+    def __init__(self, policy: str = "off", keep_ties: bool = True, max_skip: int = 0):
+        """
+        Args:
+            policy: "off" — обрабатывать всё; "skip" — пропускать чанки, которые
+                не могут изменить выбранные значения (расхождения с ними теряются);
+                "defer" — обрабатывать их последними.
+            keep_ties: Чанк источника того же ранга всё ещё может изменить итог
+                (дать расхождение между равноправными источниками) — не пропускать.
+            max_skip: Максимум пропущенных/отложенных чанков (0 — без ограничения).
+        """
+        if policy not in EARLY_STOP_POLICIES:
+            raise ValueError(f"Неизвестная политика досрочного завершения: {policy}")
+        self.policy = policy
+        self.keep_ties = keep_ties
+        self.max_skip = max_skip
+        self.skipped = 0
+        self._best: dict[str, tuple[int, int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.policy != "off"
+
+    def add(self, chunk: Chunk, extraction: ChunkExtraction) -> None:
+        """Учесть извлечение из чанка."""
+        for field_name, _ in CHECKLIST_FIELDS:
+            value = getattr(extraction, field_name, None)
+            if value is None:
+                continue
+            rank = source_rank(chunk.source_type, value.source.confidence)
+            current = self._best.get(field_name)
+            if current is None or rank < current:
+                self._best[field_name] = rank
+
+    def can_change(self, chunk: Chunk) -> bool:
+        """Может ли чанк изменить итог хотя бы по одному параметру."""
+        # Лучшее, что может дать чанк: значение high из его типа документа
+        chunk_rank = source_rank(chunk.source_type, "high")
+        for field_name, _ in CHECKLIST_FIELDS:
+            current = self._best.get(field_name)
+            if current is None or chunk_rank < current:
+                return True
+            if self.keep_ties and chunk_rank == current:
+                return True
+        return False
+
+    def should_skip(self, chunk: Chunk) -> bool:
+        """Пропустить (или отложить) чанк по текущей политике; учитывает лимит."""
+        if not self.enabled:
+            return False
+        if self.max_skip and self.skipped >= self.max_skip:
+            return False
+        if self.can_change(chunk):
+            return False
+        self.skipped += 1
+        logger.info(
+            f"Чек-лист насыщен для {chunk.source_type}: "
+            f"{chunk.source_file}, {chunk.page_range_display} — {self.policy}"
+        )
+        return True
+
+    @property
+    def filled_fields(self) -> int:
+        """Число параметров, по которым уже есть значение."""
+        return len(self._best)
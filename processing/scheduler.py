@@ -0,0 +1,95 @@
+"""Порядок обработки чанков на этапе 3 по ожидаемой отдаче.
+
+Вместо порядка файлов из scan_path чанки сортируются так, чтобы раньше
+шли те, что вероятнее дадут значения высокого приоритета: паспорта раньше
+руководств, начальные страницы (спецификации) раньше хвоста документа,
+страницы с плотными техническими данными раньше текста, короткие
+документы раньше многосотстраничных. Вместе с досрочным завершением
+(processing.saturation) это даёт полезную карточку раньше и экономит запросы.
+"""
+
+import logging
+import math
+import re
+from dataclasses import dataclass
+
+from chunking.chunk_manager import Chunk
+from chunking.pdf_chunker import page_texts
+from processing.conflict_resolver import SOURCE_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+# Веса составляющих оценки (меньше оценка — раньше обработка)
+PRIORITY_WEIGHT = 1.0   # за ступень SOURCE_PRIORITY
+POSITION_WEIGHT = 1.5   # начало документа → конец документа
+SIZE_WEIGHT = 0.5       # за порядок величины числа страниц файла
+DENSITY_WEIGHT = 2.0    # плотность технических данных (0..1)
+
+# Число с единицей измерения — признак страницы с техническими данными
+_QUANTITY_RE = re.compile(
+    r"\d+(?:[.,]\d+)?\s*(?:мм|mm|кг|kg|кВт|kW|кВ·?А|kVA|В|V|Гц|Hz|А|A|МПа|MPa|бар|bar"
+    r"|°\s?C|дБ|dB|м³|m3|л/мин|l/min|%)(?![\wа-яА-Я])"
+    r"|\bIP\s?\d{2}\b",
+    re.IGNORECASE,
+)
+_DENSE_PAGE_MATCHES = 20  # Столько величин на странице — максимальная плотность
+
+
+@dataclass
+class ChunkScore:
+    """Оценка ожидаемой отдачи чанка."""
+    index: int
+    score: float
+    density: float | None
+
+    def __lt__(self, other: "ChunkScore") -> bool:
+        return (self.score, self.index) < (other.score, other.index)
+
+
+def density_score(chunk: Chunk) -> float | None:
+    """Плотность технических данных в чанке по текстовому слою (0..1).
+
+    None — текстового слоя нет (скан, изображение): плотность неизвестна.
+    """
+    if isinstance(chunk.data, str):
+        texts = [chunk.data]
+    elif chunk.file_format == "PDF":
+        try:
+            texts = page_texts(chunk.data)
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать текст {chunk.source_file}: {e}")
+            return None
+    else:
+        return None
+
+    if not any(t.strip() for t in texts):
+        return None
+    matches = sum(len(_QUANTITY_RE.findall(t)) for t in texts)
+    per_page = matches / max(1, len(texts))
+    return min(1.0, per_page / _DENSE_PAGE_MATCHES)
+
+
+def score_chunk(index: int, chunk: Chunk) -> ChunkScore:
+    """Оценить чанк: меньше оценка — раньше обработка."""
+    priority = min(SOURCE_PRIORITY.get(chunk.source_type, 99), len(SOURCE_PRIORITY))
+
+    position = 0.0
+    if chunk.page_start is not None and chunk.total_pages:
+        position = (chunk.page_start - 1) / chunk.total_pages
+
+    pages = chunk.total_pages or 1
+    density = density_score(chunk)
+    # Неизвестная плотность (скан) — считаем средней
+    density_value = 0.5 if density is None else density
+
+    score = (PRIORITY_WEIGHT * priority
+             + POSITION_WEIGHT * position
+             + SIZE_WEIGHT * math.log10(pages)
+             - DENSITY_WEIGHT * density_value)
+    return ChunkScore(index=index, score=score, density=density)
+
+
+def order_chunks(chunks: list[Chunk]) -> list[int]:
+    """Индексы чанков в порядке убывания ожидаемой отдачи."""
+    scores = sorted(score_chunk(i, c) for i, c in enumerate(chunks))
+    return [s.index for s in scores]
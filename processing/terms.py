@@ -0,0 +1,54 @@
+"""Характерные слова и единицы измерения параметров чек-листа.
+
+По ним целевой поиск пропусков (processing.gap_fill) находит страницы-
+кандидаты в индексе, а локальное извлечение (processing.local_extractor)
+определяет, упомянуты ли в чанке параметры, которые правила не разбирают.
+"""
+
+# Слова и единицы параметров чек-листа (основы — поиск по префиксу)
+FIELD_TERMS: dict[str, list[str]] = {
+    "a1_name": ["наименование", "назначение", "предназначен", "designation", "intended use"],
+    "a2_model": ["модель", "артикул", "тип изделия", "model", "type designation"],
+    "a3_manufacturer": ["изготовитель", "производитель", "страна", "manufacturer", "made in"],
+    "a4_year_serial": ["заводской номер", "серийный", "год выпуска", "serial", "year of manufacture"],
+    "b1_dimensions": ["габарит", "длина", "ширина", "высота", "dimensions", "overall"],
+    "b2_opening": ["проём", "проем", "транспортные размеры", "opening", "transport dimensions"],
+    "b3_weight": ["масса", "вес", "weight", "mass"],
+    "b4_heaviest_part": ["тяжел", "транспортная масса", "heaviest", "transport weight"],
+    "b5_rigging": ["строповк", "центр тяжести", "такелаж", "lifting", "rigging", "centre of gravity"],
+    "c1_installation": ["установк", "монтаж", "анкер", "installation", "mounting"],
+    "c2_foundation": ["фундамент", "foundation"],
+    "c3_pits": ["приямок", "приямк", "подиум", "pit", "platform"],
+    "c4_loads": ["нагрузк", "load", "kN"],
+    "c5_service_zone": ["обслуживан", "свободное пространство", "service area", "clearance"],
+    "c6_floor": ["покрытие пола", "полы", "ровност", "floor", "flatness"],
+    "c7_construction": ["перекрыти", "конструкци", "колонн", "ceiling", "structure"],
+    "d1_power": ["мощность", "потребляем", "кВт", "power", "kW", "kVA"],
+    "d2_voltage": ["напряжение", "частота", "фаз", "voltage", "frequency", "Hz"],
+    "d3_reliability": ["категория надёжности", "категория надежности", "ИБП", "UPS", "reliability"],
+    "d4_startup": ["пуск", "пусковой ток", "cos", "коэффициент мощности", "starting", "power factor"],
+    "d5_heat": ["тепловыделени", "теплоотдач", "heat dissipation", "heat emission"],
+    "d6_protection": ["степень защиты", "IP", "взрывозащит", "protection", "enclosure"],
+    "d7_grounding": ["заземлен", "TN", "grounding", "earthing"],
+    "d8_cable_entry": ["ввод кабел", "кабельный ввод", "подвод питания", "cable entry", "power supply connection"],
+    "e1_pressure": ["давление сжатого воздуха", "пневмо", "сжатый воздух", "МПа", "bar", "compressed air"],
+    "e2_flow": ["расход воздуха", "расход газа", "м3", "air consumption", "flow rate"],
+    "e3_quality": ["класс чистоты", "осушен", "ISO 8573", "air quality", "dew point"],
+    "e4_connection": ["подключение воздуха", "штуцер", "air connection", "fitting"],
+    "f1_purpose": ["охлаждающ", "вода", "water", "cooling"],
+    "f2_quality": ["качество воды", "жёсткость", "жесткость", "water quality", "hardness"],
+    "f3_flow": ["расход воды", "давление воды", "температура воды", "water flow", "water pressure"],
+    "f4_connection": ["подключение воды", "водопровод", "water connection", "water inlet"],
+    "f5_drainage": ["канализац", "сток", "drainage", "waste water"],
+    "f6_drain_point": ["слив", "drain"],
+    "f7_coolant": ["СОЖ", "смазочно", "охлаждающая жидкость", "coolant", "emulsion"],
+    "f8_periodicity": ["периодичност", "замена", "interval", "replacement"],
+    "g1_exhaust": ["вытяжк", "отсос", "аспирац", "exhaust", "extraction"],
+    "g2_emissions": ["выброс", "пыль", "аэрозол", "emissions", "dust", "fumes"],
+    "g3_noise": ["шум", "звукового давления", "дБ", "noise", "sound pressure", "dB"],
+    "g4_vibration": ["вибраци", "vibration"],
+    "h1_it": ["Ethernet", "сеть", "интерфейс", "Profinet", "network", "interface"],
+    "h2_safety": ["аварийн", "блокировк", "безопасност", "emergency", "interlock", "safety"],
+    "h3_signaling": ["сигнализац", "сигнальная колонна", "световая", "signal", "beacon", "alarm"],
+    "h4_climate": ["температура окружающей", "влажность", "климат", "ambient temperature", "humidity"],
+}
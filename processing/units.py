@@ -1,6 +1,8 @@
 """Конверсия и нормализация единиц измерения."""
 
 import re
+from dataclasses import dataclass
+from functools import lru_cache
 
 
 def normalize_pressure(value: str) -> str:
@@ -37,3 +39,111 @@ def format_dimensions(value: str) -> str:
     # Заменить различные разделители на стандартный " × "
     result = re.sub(r'\s*[xXхХ×]\s*', ' × ', value)
     return result
+
+
+# === Величины с единицами: разбор и сравнение значений ===
+#
+# Значение параметра приводится к набору величин в базовых единицах
+# (напряжение — В, мощность — Вт, давление — Па, масса — кг, длина — м…),
+# поэтому «0,4 кВ», «400 V» и «400В» сравниваются как одна величина.
+
+@dataclass(frozen=True)
+class Quantity:
+    """Величина в базовой единице."""
+    magnitude: float
+    unit: str  # Базовая единица: V, A, W, VA, Hz, Pa, kg, m, m2, m3/h, °C, %, dB, rpm, N
+
+
+# Обозначение → (базовая единица, множитель). Регистр важен: мВт ≠ МВт, м ≠ М
+_UNITS: dict[str, tuple[str, float]] = {
+    # Электрические
+    "В": ("V", 1), "V": ("V", 1), "кВ": ("V", 1e3), "kV": ("V", 1e3), "мВ": ("V", 1e-3), "mV": ("V", 1e-3),
+    "А": ("A", 1), "A": ("A", 1), "мА": ("A", 1e-3), "mA": ("A", 1e-3), "кА": ("A", 1e3), "kA": ("A", 1e3),
+    "Вт": ("W", 1), "W": ("W", 1), "кВт": ("W", 1e3), "КВт": ("W", 1e3), "kW": ("W", 1e3), "KW": ("W", 1e3),
+    "МВт": ("W", 1e6), "MW": ("W", 1e6), "л.с.": ("W", 735.5), "hp": ("W", 745.7), "HP": ("W", 745.7),
+    "ВА": ("VA", 1), "VA": ("VA", 1), "кВА": ("VA", 1e3), "кВ·А": ("VA", 1e3), "kVA": ("VA", 1e3),
+    "Гц": ("Hz", 1), "Hz": ("Hz", 1), "кГц": ("Hz", 1e3), "kHz": ("Hz", 1e3),
+    # Давление
+    "Па": ("Pa", 1), "Pa": ("Pa", 1), "кПа": ("Pa", 1e3), "kPa": ("Pa", 1e3),
+    "МПа": ("Pa", 1e6), "MPa": ("Pa", 1e6), "бар": ("Pa", 1e5), "bar": ("Pa", 1e5),
+    "мбар": ("Pa", 1e2), "mbar": ("Pa", 1e2), "атм": ("Pa", 101325), "psi": ("Pa", 6894.757),
+    "кгс/см²": ("Pa", 98066.5), "кгс/см2": ("Pa", 98066.5), "kgf/cm²": ("Pa", 98066.5), "kgf/cm2": ("Pa", 98066.5),
+    # Механические
+    "кг": ("kg", 1), "kg": ("kg", 1),
+    "т": ("kg", 1e3), "тн": ("kg", 1e3), "t": ("kg", 1e3),
+    "мм": ("m", 1e-3), "mm": ("m", 1e-3), "см": ("m", 1e-2), "cm": ("m", 1e-2), "м": ("m", 1), "m": ("m", 1),
+    "м²": ("m2", 1), "м2": ("m2", 1), "m²": ("m2", 1), "m2": ("m2", 1),
+    "Н": ("N", 1), "N": ("N", 1), "кН": ("N", 1e3), "kN": ("N", 1e3),
+    "об/мин": ("rpm", 1), "rpm": ("rpm", 1), "мин-1": ("rpm", 1), "min-1": ("rpm", 1),
+    # Расход
+    "м³/ч": ("m3/h", 1), "м3/ч": ("m3/h", 1), "m³/h": ("m3/h", 1), "m3/h": ("m3/h", 1),
+    "м³/мин": ("m3/h", 60), "м3/мин": ("m3/h", 60), "m³/min": ("m3/h", 60), "m3/min": ("m3/h", 60),
+    "л/мин": ("m3/h", 0.06), "нл/мин": ("m3/h", 0.06), "l/min": ("m3/h", 0.06), "Nl/min": ("m3/h", 0.06),
+    "л/ч": ("m3/h", 1e-3), "l/h": ("m3/h", 1e-3), "л/с": ("m3/h", 3.6), "l/s": ("m3/h", 3.6),
+    # Тепловые и прочие
+    "°C": ("°C", 1), "°С": ("°C", 1), "ºC": ("°C", 1), "ºС": ("°C", 1), "℃": ("°C", 1),
+    "%": ("%", 1),
+    "дБА": ("dB", 1), "дБ(А)": ("dB", 1), "дБ": ("dB", 1), "dBA": ("dB", 1), "dB(A)": ("dB", 1), "dB": ("dB", 1),
+}
+
+_NUM = r"[-+−]?(?:\d{1,3}(?:[  ]\d{3})+|\d+)(?:[.,]\d+)?"
+# Разделители рядов чисел с общей единицей: размеры, диапазоны, «400/230 В»
+_SEP = r"\s*(?:[x×хХ*/÷…–—-]|\.{2,3})\s*"
+_UNIT_ALT = "|".join(re.escape(u) for u in sorted(_UNITS, key=len, reverse=True))
+_QUANTITY_RE = re.compile(
+    rf"(?<![\w.,])(?P<nums>{_NUM}(?:{_SEP}{_NUM})*)\s*(?P<unit>{_UNIT_ALT})(?![^\W\d_])"
+)
+_SERIES_RE = re.compile(rf"(?:^|{_SEP})({_NUM})")
+# Остаток текста без величин: числа без единиц (со знаком и дробной частью) и слова
+_TOKEN_RE = re.compile(rf"(?<![\w.,]){_NUM}(?![^\W_])|[^\W_]+")
+
+
+@lru_cache(maxsize=8192)
+def parse_quantities(value: str) -> tuple[Quantity, ...]:
+    """Величины значения в базовых единицах (числа без единиц не учитываются).
+
+    Общая единица ряда относится ко всем его числам: «2500 × 1800 × 2100 мм»,
+    «+5…+40 °C», «400/230 В».
+    """
+    quantities = []
+    for match in _QUANTITY_RE.finditer(value):
+        unit, factor = _UNITS[match.group("unit")]
+        for number in _SERIES_RE.findall(match.group("nums")):
+            quantities.append(Quantity(float(_normalize_number(number)) * factor, unit))
+    return tuple(quantities)
+
+
+def _normalize_number(token: str) -> str:
+    """Число в записи Python: без пробелов тысяч и «+», точка, минус ASCII (слова не меняются)."""
+    return token.replace(" ", "").replace(" ", "").replace(",", ".").replace("−", "-").lstrip("+")
+
+
+@lru_cache(maxsize=8192)
+def value_key(value: str) -> tuple | str:
+    """Ключ сравнения значения: величины в базовых единицах и остаток текста.
+
+    Величины округляются до 6 значащих цифр и группируются по единице
+    (порядок внутри единицы сохраняется — Д×Ш×В), поэтому «50 Гц, 400 В»
+    и «0,4 кВ; 50 Hz» дают один ключ. Остаток текста без величин (слова и
+    числа без единиц со знаком и дробной частью, по порядку) тоже входит в ключ:
+    «24 В пост. тока» и «24 В перем. тока», «IP54, 400 В» и «IP55, 400 В»
+    различаются. Значения без величин с единицами сравниваются как строки.
+    """
+    quantities = parse_quantities(value)
+    if not quantities:
+        return value.strip()
+    rest = [_normalize_number(t)
+            for t in _TOKEN_RE.findall(_QUANTITY_RE.sub(" ", value).lower().replace("ё", "е"))]
+    magnitudes = sorted(((q.unit, float(f"{q.magnitude:.6g}")) for q in quantities), key=lambda q: q[0])
+    return tuple(magnitudes), tuple(rest)
+
+
+def value_keys(values: list[str]) -> list[tuple | str]:
+    """Ключи сравнения пачки значений (каждое уникальное значение разбирается один раз)."""
+    keys = {v: value_key(v) for v in dict.fromkeys(values)}
+    return [keys[v] for v in values]
+
+
+def same_value(a: str, b: str) -> bool:
+    """Значения совпадают с учётом единиц измерения."""
+    return a.strip() == b.strip() or value_key(a) == value_key(b)
@@ -0,0 +1,107 @@
+"""Factum — локальный HTTP-сервис заданий.
+
+Документы загружаются по HTTP, задания ставятся в очередь SQLite
+(~/.factum/service/jobs.db) и обрабатываются тем же pipeline, что и GUI.
+Очередь переживает перезапуск: прерванные задания продолжаются по
+контрольным точкам.
+
+Несколько машин: папка данных на общем сетевом диске (--data-dir,
+--shared). На каждой машине запускается узел; HTTP может принимать
+задания на одном из них, остальные — только обработка (--no-http).
+Задания упавшего узла подхватываются другими по истечении аренды.
+
+Примеры:
+    python serve.py --port 8765 --workers 2
+    python serve.py --data-dir //nas/factum --shared --no-http
+    curl -F "name=Насос Н-1" -F "files=@паспорт.pdf" http://127.0.0.1:8765/jobs
+    curl http://127.0.0.1:8765/jobs/<id>/events
+    curl -o карточка.docx http://127.0.0.1:8765/jobs/<id>/card.docx
+
+Описание API — в service/server.py.
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+# Добавить корень проекта в PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import CONFIG_DIR, load_config
+from service.server import JobService, make_server
+
+logger = logging.getLogger("factum.service")
+
+
+def _parse_args(argv: list[str] | None, config: dict) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="serve.py",
+        description="Factum: HTTP-сервис анализа документации оборудования.",
+    )
+    parser.add_argument("--host", default=config.get("service_host", "127.0.0.1"),
+                        help="Адрес (по умолчанию только локальный)")
+    parser.add_argument("--port", type=int, default=config.get("service_port", 8765))
+    parser.add_argument("--workers", type=int, default=config.get("service_workers", 2),
+                        help="Параллельных заданий")
+    parser.add_argument("--data-dir", type=Path, default=CONFIG_DIR / "service",
+                        help="Папка очереди и файлов заданий")
+    parser.add_argument("--shared", action="store_true",
+                        help="Папка данных на сетевом диске, общая для нескольких узлов")
+    parser.add_argument("--no-http", action="store_true",
+                        help="Только обработка заданий, без HTTP (узел кластера)")
+    parser.add_argument("--node-id", help="Имя узла (по умолчанию машина-процесс)")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Подробный лог")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers должно быть не меньше 1")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    config = load_config()
+    args = _parse_args(argv, config)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    if not config.get("api_key"):
+        logger.error("API ключ не настроен (~/.factum/config.json, поле \"api_key\")")
+        return 1
+
+    service = JobService(
+        args.data_dir, workers=args.workers, config=config, node_id=args.node_id,
+        shared=args.shared,
+        lease_seconds=config.get("service_lease_seconds", 60),
+        max_attempts=config.get("service_max_attempts", 3),
+    )
+    server = None
+    if not args.no_http:
+        try:
+            server = make_server(service, args.host, args.port, config.get("service_max_upload_mb", 500))
+        except OSError as e:
+            logger.error(f"Не удалось открыть {args.host}:{args.port}: {e}")
+            return 1
+
+    service.start()
+    try:
+        if server is not None:
+            logger.info(f"Сервис заданий: http://{args.host}:{args.port}/jobs (воркеров: {args.workers})")
+            server.serve_forever()
+        else:
+            logger.info(f"Узел обработки: {args.data_dir} (воркеров: {args.workers})")
+            while True:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        logger.info("Остановка — задания в работе вернутся в очередь")
+    finally:
+        if server is not None:
+            server.server_close()
+        service.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
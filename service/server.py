@@ -0,0 +1,409 @@
+"""HTTP-сервис заданий: загрузка документов, очередь, прогресс, выдача карточек.
+
+API (JSON, без авторизации — сервис слушает локальный адрес):
+    POST   /jobs                  multipart/form-data: файлы документов,
+                                  необязательные поля name, max_minutes,
+                                  max_tokens (бюджет задания) → {"id": ...}
+    GET    /jobs                  список заданий
+    GET    /jobs/<id>             состояние и прогресс задания
+    GET    /jobs/<id>/events      поток прогресса (Server-Sent Events)
+    GET    /jobs/<id>/log         лог обработки (text/plain)
+    GET    /jobs/<id>/card.docx   карточка DOCX
+    GET    /jobs/<id>/card.json   карточка JSON
+    DELETE /jobs/<id>             отменить задание
+
+Папка данных (jobs.db и jobs/<id>/) может лежать на общем сетевом диске:
+тогда задания обрабатывают узлы на нескольких машинах (см. JobService).
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import socket
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from config import load_config
+from scanner.folder_scanner import scan_path
+from gemini.quota import PRIORITY_BATCH
+from pipeline import Pipeline
+from service.store import (
+    CANCELLED, DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, DONE, FAILED, FINAL_STATUSES,
+    JobRecord, JobStore, new_job_id,
+)
+
+logger = logging.getLogger(__name__)
+
+_JOB_PATH = re.compile(r"^/jobs/([0-9a-f]{12})(?:/(events|log|card\.docx|card\.json))?$")
+
+# Интервал опроса очереди, когда заданий нет
+_POLL_SECONDS = 3.0
+
+_CONTENT_TYPES = {
+    "card.docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "card.json": "application/json; charset=utf-8",
+    "log": "text/plain; charset=utf-8",
+}
+
+
+class JobService:
+    """Очередь заданий в SQLite и пул воркеров вокруг pipeline.
+
+    Несколько процессов JobService (узлов) могут работать с одной папкой
+    данных на общем сетевом диске: задания берутся в аренду, аренда
+    продлевается heartbeat-ом, задания упавших узлов подхватывают другие.
+    """
+
+    def __init__(self, data_dir: Path, workers: int = 2, config: dict | None = None,
+                 node_id: str | None = None, shared: bool = False,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.data_dir = data_dir
+        self.jobs_dir = data_dir / "jobs"
+        self.store = JobStore(data_dir / "jobs.db", shared=shared,
+                              lease_seconds=lease_seconds, max_attempts=max_attempts)
+        self.workers = max(1, workers)
+        self.config = config
+        self.node_id = node_id or default_node_id()
+        self._running: dict[str, Pipeline] = {}
+        self._lost: set[str] = set()  # Задания, аренду которых узел потерял
+        self._log_lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    # --- Файлы задания ---
+    def job_dir(self, job_id: str) -> Path:
+        return self.jobs_dir / job_id
+
+    def artifact_path(self, job_id: str, name: str) -> Path:
+        return self.job_dir(job_id) / ("log.txt" if name == "log" else name)
+
+    # --- Жизненный цикл ---
+    def start(self) -> None:
+        logger.info(f"Узел {self.node_id}: воркеров {self.workers}, аренда {self.store.lease_seconds:.0f} с")
+        targets = [self._worker_loop] * self.workers + [self._heartbeat_loop]
+        for n, target in enumerate(targets):
+            thread = threading.Thread(target=target, name=f"service-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """Остановить воркеры; задания в работе вернутся в очередь для других узлов."""
+        self._stop.set()
+        for pipeline in list(self._running.values()):
+            pipeline.cancel()
+        self._notify()
+        for thread in self._threads:
+            thread.join()
+
+    # --- Операции API ---
+    def submit(self, name: str, files: list[tuple[str, bytes]],
+               max_minutes: float = 0, max_tokens: int = 0) -> JobRecord:
+        """Сохранить загруженные файлы и поставить задание в очередь.
+
+        max_minutes, max_tokens — бюджет задания; 0 — по конфигурации сервиса.
+        """
+        job_id = new_job_id()
+        input_dir = self.job_dir(job_id) / "input"
+        input_dir.mkdir(parents=True, exist_ok=True)
+        used: set[str] = set()
+        for filename, data in files:
+            # Разные имена могут совпасть после очистки — второй файл не затирает первый
+            (input_dir / _unique_filename(_safe_filename(filename), used)).write_bytes(data)
+        # Запись в очередь — после файлов, чтобы воркер не взял неполное задание
+        job = self.store.create(name, job_id, max_minutes=max_minutes, max_tokens=max_tokens)
+        logger.info(f"Задание {job.id} ({name}) в очереди, файлов: {len(files)}")
+        self._notify()
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Отменить задание; задание на другом узле остановится при его heartbeat."""
+        if self.store.cancel_queued(job_id) or self.store.request_cancel(job_id):
+            pipeline = self._running.get(job_id)
+            if pipeline is not None:
+                pipeline.cancel()
+            self._notify()
+            return True
+        return False
+
+    def wait_for_change(self, timeout: float) -> None:
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def _notify(self) -> None:
+        with self._changed:
+            self._changed.notify_all()
+
+    # --- Воркеры ---
+    def _worker_loop(self) -> None:
+        while not self._stop.is_set():
+            job = self.store.claim_next(self.node_id)
+            if job is None:
+                # Задания других узлов не будят этот узел — опрос базы
+                self.wait_for_change(_POLL_SECONDS)
+                continue
+            try:
+                self._run(job)
+            except Exception:
+                logger.exception(f"Задание {job.id}: ошибка воркера")
+                self.store.finish(job.id, self.node_id, FAILED, "внутренняя ошибка сервиса")
+            self._notify()
+
+    def _heartbeat_loop(self) -> None:
+        """Продлевать аренду заданий узла; при потере аренды — остановить задание."""
+        interval = max(1.0, self.store.lease_seconds / 3)
+        while not self._stop.wait(interval):
+            for job_id, pipeline in list(self._running.items()):
+                if not self.store.heartbeat(job_id, self.node_id):
+                    logger.warning(f"Задание {job_id}: аренда потеряна, обработка на узле остановлена")
+                    self._lost.add(job_id)
+                    pipeline.cancel()
+
+    def _run(self, job: JobRecord) -> None:
+        job_dir = self.job_dir(job.id)
+        files = scan_path(job_dir / "input")
+        if not files:
+            self.store.finish(job.id, self.node_id, FAILED, "нет поддерживаемых документов")
+            return
+
+        def on_progress(stage: int, current: int, total: int, message: str) -> None:
+            self.store.update_progress(job.id, self.node_id, stage, current, total, message)
+            self._notify()
+
+        def on_log(message: str) -> None:
+            with self._log_lock, open(self.artifact_path(job.id, "log"), "a", encoding="utf-8") as f:
+                f.write(message + "\n")
+
+        # Карточка пишется во временный файл узла и публикуется, только пока
+        # узел владеет арендой — узел, потерявший задание, не затрёт чужой итог.
+        # Контрольные точки — в папке задания: продолжить может любой узел
+        draft = job_dir / f"card.{_safe_filename(self.node_id)}.docx"
+        config = dict(self.config if self.config is not None else load_config())
+        if job.max_minutes:
+            config["job_time_budget_minutes"] = job.max_minutes
+        if job.max_tokens:
+            config["job_token_budget"] = job.max_tokens
+        # Проект карточки привязан к её пути, а черновик у каждого задания свой:
+        # сохранённый проект никогда не использовался бы и только копился
+        config["incremental_projects"] = False
+        pipeline = Pipeline(
+            files, draft, resume=True, config=config, priority=PRIORITY_BATCH, incremental=False,
+            checkpoint_dir=job_dir / "checkpoint", on_progress=on_progress, on_log=on_log,
+        )
+        self._running[job.id] = pipeline
+        try:
+            on_log(f"Узел {self.node_id}: попытка {job.attempts}")
+            logger.info(f"Задание {job.id} ({job.name}): обработка, файлов: {len(files)}")
+            result = pipeline.run()
+        finally:
+            self._running.pop(job.id, None)
+            lost = job.id in self._lost
+            self._lost.discard(job.id)
+
+        if lost:
+            draft.unlink(missing_ok=True)
+            logger.info(f"Задание {job.id}: итог узла отброшен (аренда потеряна)")
+            return
+        if result.success and self.store.heartbeat(job.id, self.node_id):
+            os.replace(draft, self.artifact_path(job.id, "card.docx"))
+            if result.card is not None:
+                with open(self.artifact_path(job.id, "card.json"), "w", encoding="utf-8") as f:
+                    json.dump(result.card, f, ensure_ascii=False, indent=2)
+            self.store.finish(job.id, self.node_id, DONE)
+        elif result.success:
+            draft.unlink(missing_ok=True)
+        elif pipeline.cancelled and self._stop.is_set():
+            self.store.release(job.id, self.node_id)
+        elif pipeline.cancelled:
+            self.store.finish(job.id, self.node_id, CANCELLED, result.error)
+        else:
+            self.store.finish(job.id, self.node_id, FAILED, result.error)
+        logger.info(f"Задание {job.id}: {self.store.get(job.id).status}")
+
+
+def default_node_id() -> str:
+    """Имя узла: машина и процесс (несколько узлов на одной машине различаются)."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _safe_filename(name: str) -> str:
+    name = Path(name.replace("\\", "/")).name
+    name = re.sub(r'[<>:"|?*\x00-\x1f]+', "_", name).strip(". ")
+    return name or "document"
+
+
+def _unique_filename(name: str, used: set[str]) -> str:
+    """Имя, не совпадающее с used без учёта регистра: «док.pdf» → «док (2).pdf»."""
+    path = Path(name)
+    candidate, n = name, 2
+    while candidate.lower() in used:
+        candidate = f"{path.stem} ({n}){path.suffix}"
+        n += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def _parse_multipart(content_type: str, body: bytes) -> tuple[dict[str, str], list[tuple[str, bytes]]]:
+    """Поля и файлы тела multipart/form-data."""
+    message = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+    )
+    fields: dict[str, str] = {}
+    files: list[tuple[str, bytes]] = []
+    if not message.is_multipart():
+        return fields, files
+    for part in message.iter_parts():
+        data = part.get_payload(decode=True) or b""
+        filename = part.get_filename()
+        if filename:
+            files.append((filename, data))
+        else:
+            name = part.get_param("name", header="content-disposition")
+            if name:
+                fields[name] = data.decode("utf-8", errors="replace")
+    return fields, files
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service: JobService
+    max_upload: int
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    # --- Ответы ---
+    def _send_json(self, status: int, data) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send_json(status, {"error": message})
+
+    def _route(self) -> tuple[JobRecord | None, str | None]:
+        match = _JOB_PATH.match(urlparse(self.path).path)
+        if not match:
+            return None, None
+        return self.service.store.get(match.group(1)), match.group(2) or ""
+
+    # --- Методы ---
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/jobs":
+            self._send_json(HTTPStatus.OK, [job.to_dict() for job in self.service.store.list()])
+            return
+
+        job, action = self._route()
+        if job is None:
+            self._error(HTTPStatus.NOT_FOUND, "задание не найдено")
+        elif action == "":
+            self._send_json(HTTPStatus.OK, job.to_dict())
+        elif action == "events":
+            self._stream_events(job.id)
+        else:
+            self._send_file(job, action)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/jobs":
+            self._error(HTTPStatus.NOT_FOUND, "неизвестный адрес")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > self.max_upload:
+            # Тело не читается — соединение закрыть, не дочитывая загрузку
+            self.close_connection = True
+            self._error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "превышен размер загрузки")
+            return
+        content_type = self.headers.get("Content-Type", "")
+        if not content_type.startswith("multipart/form-data"):
+            self._error(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "ожидается multipart/form-data")
+            return
+
+        fields, files = _parse_multipart(content_type, self.rfile.read(length))
+        if not files:
+            self._error(HTTPStatus.BAD_REQUEST, "не загружено ни одного файла")
+            return
+        query = parse_qs(urlparse(self.path).query)
+        name = fields.get("name") or query.get("name", [""])[0] or Path(files[0][0]).stem
+        try:
+            max_minutes = float(fields.get("max_minutes") or 0)
+            max_tokens = int(fields.get("max_tokens") or 0)
+        except ValueError:
+            self._error(HTTPStatus.BAD_REQUEST, "max_minutes и max_tokens должны быть числами")
+            return
+        if max_minutes < 0 or max_tokens < 0:
+            self._error(HTTPStatus.BAD_REQUEST, "бюджет задания не может быть отрицательным")
+            return
+        job = self.service.submit(name, files, max_minutes=max_minutes, max_tokens=max_tokens)
+        self._send_json(HTTPStatus.CREATED, job.to_dict())
+
+    def do_DELETE(self):
+        job, action = self._route()
+        if job is None or action:
+            self._error(HTTPStatus.NOT_FOUND, "задание не найдено")
+            return
+        if job.status in FINAL_STATUSES:
+            self._error(HTTPStatus.CONFLICT, f"задание уже завершено: {job.status}")
+            return
+        self.service.cancel(job.id)
+        self._send_json(HTTPStatus.ACCEPTED, self.service.store.get(job.id).to_dict())
+
+    def _send_file(self, job: JobRecord, name: str) -> None:
+        path = self.service.artifact_path(job.id, name)
+        if not path.exists():
+            self._error(HTTPStatus.NOT_FOUND, f"файл ещё не готов (статус: {job.status})")
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", _CONTENT_TYPES[name])
+        self.send_header("Content-Length", str(path.stat().st_size))
+        if name == "card.docx":
+            self.send_header("Content-Disposition", f'attachment; filename="{job.id}.docx"')
+        self.end_headers()
+        with open(path, "rb") as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def _stream_events(self, job_id: str) -> None:
+        """Прогресс задания как Server-Sent Events до завершения задания."""
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        last = None
+        try:
+            while True:
+                job = self.service.store.get(job_id)
+                payload = json.dumps(job.to_dict(), ensure_ascii=False)
+                if payload != last:
+                    self.wfile.write(f"event: progress\ndata: {payload}\n\n".encode("utf-8"))
+                    last = payload
+                else:
+                    self.wfile.write(b": keepalive\n\n")
+                self.wfile.flush()
+                if job.status in FINAL_STATUSES:
+                    self.wfile.write(b"event: end\ndata: {}\n\n")
+                    self.wfile.flush()
+                    return
+                self.service.wait_for_change(15)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug(f"Клиент отключился от потока задания {job_id}")
+
+
+def make_server(service: JobService, host: str, port: int, max_upload_mb: int = 500) -> ThreadingHTTPServer:
+    """HTTP-сервер поверх JobService."""
+    handler = type("FactumHandler", (_Handler,), {
+        "service": service,
+        "max_upload": max_upload_mb * 1024 * 1024,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,238 @@
+"""Очередь заданий сервиса в SQLite.
+
+Задания переживают перезапуск сервиса. Базу могут делить несколько
+узлов (процессов на разных машинах с общей папкой данных):
+
+    - узел берёт задание в аренду (lease) на lease_seconds и продлевает
+      её heartbeat-ом, пока обрабатывает задание;
+    - задание с истёкшей арендой (узел упал или потерял сеть) снова
+      доступно для захвата и продолжается по контрольным точкам;
+    - изменения состояния задания принимаются только от владельца
+      аренды, поэтому узел, потерявший аренду, не перезапишет итог;
+    - задание, потерявшее аренду max_attempts раз, считается ошибочным.
+
+Аренда сравнивается по времени узлов — часы машин должны быть
+синхронизированы (NTP), расхождение много меньше lease_seconds.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, fields
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINAL_STATUSES = (DONE, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    error TEXT NOT NULL DEFAULT '',
+    stage INTEGER NOT NULL DEFAULT 0,
+    current INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    owner TEXT NOT NULL DEFAULT '',
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_minutes REAL NOT NULL DEFAULT 0,
+    max_tokens INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+# Колонки, добавленные после первой версии схемы
+_MIGRATIONS = {
+    "owner": "ALTER TABLE jobs ADD COLUMN owner TEXT NOT NULL DEFAULT ''",
+    "lease_until": "ALTER TABLE jobs ADD COLUMN lease_until REAL",
+    "attempts": "ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0",
+    "max_minutes": "ALTER TABLE jobs ADD COLUMN max_minutes REAL NOT NULL DEFAULT 0",
+    "max_tokens": "ALTER TABLE jobs ADD COLUMN max_tokens INTEGER NOT NULL DEFAULT 0",
+}
+
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+@dataclass
+class JobRecord:
+    """Строка таблицы jobs."""
+    id: str
+    name: str
+    status: str
+    created: float
+    started: float | None = None
+    finished: float | None = None
+    error: str = ""
+    stage: int = 0
+    current: int = 0
+    total: int = 0
+    message: str = ""
+    owner: str = ""  # Узел, обрабатывающий задание
+    lease_until: float | None = None
+    attempts: int = 0  # Сколько раз задание брали в работу
+    max_minutes: float = 0  # Бюджет задания (processing.budget), 0 — из конфигурации
+    max_tokens: int = 0
+
+    def to_dict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
+class JobStore:
+    """Хранилище заданий (одно соединение на процесс, доступ под блокировкой).
+
+    shared=True — база в общей сетевой папке: журнал отката вместо WAL
+    (WAL требует общей памяти и не работает на сетевых дисках).
+    """
+
+    def __init__(self, db_path: Path, shared: bool = False,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self._conn = sqlite3.connect(
+            str(db_path), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(f"PRAGMA journal_mode={'DELETE' if shared else 'WAL'}")
+            self._conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, statement in _MIGRATIONS.items():
+                if column not in columns:
+                    self._conn.execute(statement)
+
+    def create(self, name: str, job_id: str | None = None,
+               max_minutes: float = 0, max_tokens: int = 0) -> JobRecord:
+        job = JobRecord(id=job_id or new_job_id(), name=name, status=QUEUED, created=time.time(),
+                        max_minutes=max_minutes, max_tokens=max_tokens)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, name, status, created, max_minutes, max_tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job.id, job.name, job.status, job.created, job.max_minutes, job.max_tokens),
+            )
+        return job
+
+    def get(self, job_id: str) -> JobRecord | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return JobRecord(**dict(row)) if row else None
+
+    def list(self, limit: int = 200) -> list[JobRecord]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [JobRecord(**dict(row)) for row in rows]
+
+    def claim_next(self, owner: str) -> JobRecord | None:
+        """Взять в аренду самое раннее ожидающее задание или задание с истёкшей арендой."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Задания, исчерпавшие попытки, не захватывать повторно
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, finished = ?, owner = '', lease_until = NULL, "
+                    "error = 'задание прерывалось ' || attempts || ' раз (сбой узлов)' "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (FAILED, now, RUNNING, now, self.max_attempts),
+                )
+                row = self._conn.execute(
+                    "SELECT id, owner FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) "
+                    "ORDER BY created LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1, "
+                    "started = ?, error = '' WHERE id = ?",
+                    (RUNNING, owner, now + self.lease_seconds, now, row["id"]),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = self.get(row["id"])
+        if row["owner"]:
+            logger.warning(f"Задание {job.id}: аренда узла {row['owner']} истекла, задание взял {owner}")
+        return job
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        """Продлить аренду. False — аренда потеряна (задание отдано другому узлу или отменено)."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = ?",
+                (time.time() + self.lease_seconds, job_id, owner, RUNNING),
+            )
+        return cursor.rowcount > 0
+
+    def update_progress(self, job_id: str, owner: str, stage: int, current: int, total: int,
+                        message: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET stage = ?, current = ?, total = ?, message = ? "
+                "WHERE id = ? AND owner = ?",
+                (stage, current, total, message, job_id, owner),
+            )
+
+    def finish(self, job_id: str, owner: str, status: str, error: str = "") -> bool:
+        """Записать итог задания. False — узел уже не владеет заданием."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, error = ?, lease_until = NULL "
+                "WHERE id = ? AND owner = ? AND status = ?",
+                (status, time.time(), error, job_id, owner, RUNNING),
+            )
+        return cursor.rowcount > 0
+
+    def cancel_queued(self, job_id: str) -> bool:
+        """Отменить задание, если оно ещё в очереди."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED),
+            )
+        return cursor.rowcount > 0
+
+    def request_cancel(self, job_id: str) -> bool:
+        """Отменить задание в работе на любом узле: владелец увидит это при heartbeat."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, lease_until = NULL "
+                "WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, RUNNING),
+            )
+        return cursor.rowcount > 0
+
+    def release(self, job_id: str, owner: str) -> None:
+        """Вернуть задание в очередь (остановка узла во время обработки)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = '', lease_until = NULL, "
+                "attempts = MAX(attempts - 1, 0) WHERE id = ? AND owner = ? AND status = ?",
+                (QUEUED, job_id, owner, RUNNING),
+            )
@@ -0,0 +1,6 @@
+"""Модули проекта импортируются из корня репозитория."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,50 @@
+"""Тесты инкрементальной агрегации (processing.aggregator)."""
+
+from chunking.chunk_manager import Chunk
+from gemini.schema import ChunkExtraction, ExtractedValue, SourceRef
+from processing.aggregator import IncrementalAggregator
+
+
+def _chunk(start=1, end=7, name="passport.pdf"):
+    return Chunk(name, "Паспорт", "PDF", start, end, b"", "application/pdf")
+
+
+def _value(value, page=1):
+    return ExtractedValue(value=value, source=SourceRef(page=page, quote=value))
+
+
+def test_second_extraction_of_same_chunk_is_merged():
+    aggregator = IncrementalAggregator()
+    chunk = _chunk()
+    aggregator.add(chunk, ChunkExtraction(a1_name=_value("Станок")))
+    aggregator.add(chunk, ChunkExtraction(d2_voltage=_value("400 В", page=2)))
+
+    resolved = aggregator.resolve()
+    assert resolved["a1_name"].value == "Станок"
+    assert resolved["d2_voltage"].value == "400 В"
+    assert resolved["d2_voltage"].source.page == 2
+
+
+def test_explicit_replace_drops_previous_extractions():
+    aggregator = IncrementalAggregator()
+    chunk = _chunk()
+    aggregator.add(chunk, ChunkExtraction(a1_name=_value("Станок")))
+    aggregator.add(chunk, ChunkExtraction(d2_voltage=_value("400 В")), replace=True)
+
+    resolved = aggregator.resolve()
+    assert resolved["a1_name"] is None
+    assert resolved["d2_voltage"].value == "400 В"
+
+
+def test_retract_removes_all_extractions_of_chunk():
+    aggregator = IncrementalAggregator()
+    chunk = _chunk()
+    key = aggregator.add(chunk, ChunkExtraction(a1_name=_value("Станок")))
+    aggregator.add(chunk, ChunkExtraction(d2_voltage=_value("400 В")))
+    aggregator.add(_chunk(6, 12), ChunkExtraction(b3_weight=_value("1200 кг")))
+
+    aggregator.retract(key)
+    resolved = aggregator.resolve()
+    assert resolved["a1_name"] is None
+    assert resolved["d2_voltage"] is None
+    assert resolved["b3_weight"].value == "1200 кг"
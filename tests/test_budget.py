@@ -0,0 +1,55 @@
+"""Тесты бюджета задания (processing.budget)."""
+
+from chunking.chunk_manager import Chunk
+from processing.budget import JobBudget
+
+
+def _chunk(start=1, end=10, name="manual.pdf"):
+    return Chunk(name, "Руководство", "PDF", start, end, b"", "application/pdf")
+
+
+def test_budget_without_limits_allows_everything():
+    budget = JobBudget.from_config({})
+    assert not budget.enabled
+    assert budget.allows_chunk(tokens=10**9, in_flight=100)
+    assert not budget.exhausted(10**9)
+    assert not budget.should_downgrade(10**9)
+    assert budget.notes() == []
+
+
+def test_token_budget_stops_chunks_before_reserve():
+    budget = JobBudget(max_tokens=10_000, reserve_share=0.2, downgrade_share=0.5)
+    for _ in range(3):
+        budget.record_chunk(seconds=1.0)
+    # 3 чанка по 2000 токенов: следующий уложится в 8000 (80% бюджета) ...
+    assert budget.allows_chunk(tokens=6_000, in_flight=0)
+    # ... но не вместе с чанком, который ещё в работе
+    assert not budget.allows_chunk(tokens=6_000, in_flight=1)
+    assert budget.should_downgrade(tokens=6_000)
+    assert not budget.exhausted(tokens=9_999)
+    assert budget.exhausted(tokens=10_000)
+
+
+def test_time_budget_uses_average_chunk_duration():
+    budget = JobBudget(max_seconds=100, reserve_share=0.2)
+    budget.started -= 60
+    budget.record_chunk(seconds=15.0)
+    assert budget.allows_chunk(tokens=0, in_flight=0)
+    budget.record_chunk(seconds=35.0)  # В среднем 25 с: 60 + 25 > 80
+    assert not budget.allows_chunk(tokens=0, in_flight=0)
+    assert not budget.exhausted(0)
+    budget.started -= 40
+    assert budget.exhausted(0)
+
+
+def test_notes_merge_skipped_page_ranges():
+    budget = JobBudget(max_seconds=30 * 60, max_tokens=200_000)
+    budget.skip(_chunk(21, 30))
+    budget.skip(_chunk(11, 20))
+    budget.skip(_chunk(41, 41))
+    budget.skip(Chunk("drawing.png", "Чертёж", "Изображение", None, None, b"", "image/png"))
+
+    assert budget.describe() == "время 30 мин, токены 200 000"
+    (note,) = budget.notes()
+    assert "drawing.png — весь файл" in note
+    assert "manual.pdf — стр. 11–30, стр. 41" in note
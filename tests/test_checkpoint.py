@@ -0,0 +1,83 @@
+"""Тесты контрольных точек pipeline (processing.checkpoint)."""
+
+import os
+
+from chunking.chunk_manager import Chunk
+from gemini.schema import ChunkExtraction, ExtractedValue, SourceRef
+from processing.checkpoint import JobCheckpoint, chunk_key, job_id_for, restore_parts
+from scanner.folder_scanner import ScannedFile
+
+
+def _chunk(start=1, end=10):
+    return Chunk("passport.pdf", "Паспорт", "PDF", start, end, b"", "application/pdf", total_pages=20)
+
+
+def _value(value, page=1):
+    return ExtractedValue(value=value, source=SourceRef(page=page, quote=value))
+
+
+def _files(tmp_path, text="Паспорт"):
+    path = tmp_path / "passport.txt"
+    path.write_text(text, encoding="utf-8")
+    return [ScannedFile(path, path.name, "txt", "Текст", path.stat().st_size)]
+
+
+def test_resume_restores_recorded_steps(tmp_path):
+    checkpoint = JobCheckpoint(tmp_path / "job")
+    checkpoint.reset(_files(tmp_path))
+    chunk = _chunk(1, 10)
+    # Чанк делился на две части — восстанавливаются обе
+    checkpoint.record_context({"name": "Станок"})
+    checkpoint.record_chunk(chunk, [
+        (_chunk(1, 5), ChunkExtraction(a1_name=_value("Станок", page=2))),
+        (_chunk(6, 10), ChunkExtraction(d2_voltage=_value("400 В", page=8))),
+    ])
+
+    state = JobCheckpoint(tmp_path / "job").load()
+    assert state.has_progress and not state.done
+    assert state.context == {"name": "Станок"}
+    assert state.verification is None
+
+    restored = restore_parts(chunk, state.chunks[chunk_key(chunk)])
+    assert [(part.page_start, part.page_end) for part, _ in restored] == [(1, 5), (6, 10)]
+    assert restored[0][1].a1_name.value == "Станок"
+    assert restored[1][1].d2_voltage.source.page == 8
+
+
+def test_torn_last_line_is_skipped_and_journal_continues(tmp_path):
+    checkpoint = JobCheckpoint(tmp_path / "job")
+    checkpoint.reset(_files(tmp_path))
+    checkpoint.record_context({"name": "Станок"})
+    with open(checkpoint.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"k":"chunk","c":["passport.pdf",1,')  # Сбой посреди записи
+    checkpoint.record_verification({"notes": []})
+
+    state = checkpoint.load()
+    assert state.context == {"name": "Станок"}
+    assert state.chunks == {}
+    assert state.verification == {"notes": []}
+
+
+def test_finished_job_has_no_progress_and_reset_clears_it(tmp_path):
+    files = _files(tmp_path)
+    checkpoint = JobCheckpoint(tmp_path / "job")
+    checkpoint.reset(files)
+    checkpoint.record_context({"name": "Станок"})
+    checkpoint.finish()
+    assert checkpoint.load().done
+    assert not checkpoint.load().has_progress
+
+    checkpoint.reset(files)
+    assert checkpoint.load().context is None
+
+
+def test_job_id_changes_with_files_and_chunking(tmp_path):
+    files = _files(tmp_path)
+    job_id = job_id_for(files, 10, 1)
+    assert job_id == job_id_for(files, 10, 1)
+    assert job_id != job_id_for(files, 20, 1)
+
+    path = files[0].path
+    path.write_text("Паспорт, исправленный", encoding="utf-8")
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 1_000_000))
+    assert job_id != job_id_for(files, 10, 1)
@@ -0,0 +1,93 @@
+"""Тесты автомата защиты API (gemini.errors) и его влияния на запросы клиента."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import gemini.client
+import gemini.errors
+from gemini.client import GeminiClient
+from gemini.errors import ApiError, CircuitBreaker, CircuitOpenError
+
+
+def test_breaker_opens_after_threshold_and_closes_after_probe():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05)
+    breaker.record_failure("503")
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure("503")
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert not isinstance(error.value, ApiError)
+    assert 0 < error.value.retry_after <= 0.05
+
+    time.sleep(0.06)
+    assert breaker.before_call() is True  # Пробный запрос
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # Второй запрос ждёт итога пробного
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.before_call() is False
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    breaker.record_failure("503")
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+    breaker.record_failure("503 снова")
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_abandoned_probe_allows_next_probe():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.0)
+    breaker.record_failure("503")
+    assert breaker.before_call() is True
+    breaker.abandon_probe()
+    assert breaker.before_call() is True
+
+
+class _ServerError(Exception):
+    code = 503
+
+
+def _fake_api(client: GeminiClient, failures: int) -> list[float]:
+    """Подменить API: первые failures запросов — 503, дальше ответ с JSON."""
+    calls: list[float] = []
+
+    async def generate_content(**kwargs):
+        calls.append(time.monotonic())
+        if len(calls) <= failures:
+            raise _ServerError("503 UNAVAILABLE")
+        return SimpleNamespace(text='{"ok": true}', candidates=[], usage_metadata=None)
+
+    client.client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+    return calls
+
+
+def test_job_survives_open_breaker_cooldown(monkeypatch):
+    cooldown = 0.2
+    monkeypatch.setattr(gemini.errors, "_breaker", CircuitBreaker(failure_threshold=2, cooldown=cooldown))
+    monkeypatch.setattr(gemini.client, "RETRY_DELAY_BASE", 0)
+    client = GeminiClient("test-key")
+    calls = _fake_api(client, failures=2)
+
+    async def job():
+        # Серия сбоев размыкает автомат: пропускается только этот запрос
+        first = await client._call_with_retry("system", [], "model")
+        assert first is None
+        assert client.last_error_kind == gemini.errors.TRANSIENT
+        # Следующий запрос задания ждёт паузу и проходит пробным запросом
+        started = time.monotonic()
+        second = await client._call_with_retry("system", [], "model")
+        return second, time.monotonic() - started
+
+    second, waited = asyncio.run(job())
+    assert second == {"ok": True}
+    assert waited >= cooldown * 0.9
+    assert len(calls) == 3
+    assert gemini.errors.get_breaker().state == CircuitBreaker.CLOSED
@@ -0,0 +1,71 @@
+"""Тесты планирования целевых запросов по пропускам (processing.gap_fill)."""
+
+import fitz
+
+from chunking.chunk_manager import Chunk
+from processing.gap_fill import plan_gap_requests
+from processing.page_index import PageIndex
+
+
+def _pdf(pages: int) -> bytes:
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"Page {i + 1}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _chunk(start=1, end=10, name="manual.pdf"):
+    return Chunk(name, "Руководство", "PDF", start, end, _pdf(end - start + 1), "application/pdf",
+                 total_pages=10)
+
+
+def _index(tmp_path):
+    index = PageIndex(tmp_path / "index.db", max_age_days=0)
+    index.add_document("fp-manual", "manual.pdf", {
+        1: "Введение",
+        4: "Напряжение питания 400 В",
+        5: "Частота сети 50 Гц",
+        9: "Масса станка 1200 кг",
+    })
+    return index
+
+
+def _pages(request) -> tuple[int, int]:
+    return request.chunk.page_start, request.chunk.page_end
+
+
+def test_neighbouring_candidate_pages_form_one_request(tmp_path):
+    chunks = [_chunk(1, 10)]
+    requests = plan_gap_requests(_index(tmp_path), {"manual.pdf": "fp-manual"}, chunks,
+                                 ["d2_voltage", "b3_weight", "h4_climate"])
+
+    by_pages = {_pages(r): r for r in requests}
+    assert set(by_pages) == {(4, 5), (9, 9)}
+    assert by_pages[(4, 5)].fields == ["d2_voltage"]
+    assert by_pages[(9, 9)].fields == ["b3_weight"]
+    # Страницы запроса вырезаны из PDF чанка
+    doc = fitz.open(stream=by_pages[(4, 5)].chunk.data, filetype="pdf")
+    assert doc.page_count == 2 and "Page 4" in doc[0].get_text()
+    doc.close()
+
+
+def test_requests_are_limited_by_span_and_count(tmp_path):
+    index = _index(tmp_path)
+    args = (index, {"manual.pdf": "fp-manual"}, [_chunk(1, 10)], ["d2_voltage", "b3_weight"])
+    requests = plan_gap_requests(*args, max_span=1)
+    assert sorted(_pages(r) for r in requests) == [(4, 4), (5, 5), (9, 9)]
+
+    best = plan_gap_requests(*args, max_span=1, max_requests=1)
+    assert [_pages(r) for r in best] == [_pages(max(requests, key=lambda r: r.score))]
+
+
+def test_already_extracted_range_and_non_pdf_files_are_skipped(tmp_path):
+    index = _index(tmp_path)
+    chunks = [_chunk(1, 8), _chunk(9, 9)]
+    requests = plan_gap_requests(index, {"manual.pdf": "fp-manual"}, chunks, ["b3_weight"])
+    assert requests == []
+
+    text_chunk = Chunk("manual.pdf", "Руководство", "Текст", None, None, "Масса 1200 кг", "text/plain")
+    assert plan_gap_requests(index, {"manual.pdf": "fp-manual"}, [text_chunk], ["b3_weight"]) == []
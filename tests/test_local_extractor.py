@@ -0,0 +1,28 @@
+"""Тесты локального извлечения по текстовому слою (processing.local_extractor)."""
+
+from chunking.chunk_manager import Chunk
+from processing.local_extractor import extract_local
+
+_DATA = (
+    "Технические характеристики\n"
+    "Напряжение питания 3 ф 400 В, 50 Гц\n"
+    "Установленная мощность 15 кВт\n"
+    "Степень защиты IP54\n"
+)
+
+
+def _chunk(text):
+    return Chunk("spec.txt", "Паспорт", "Текст", 3, 3, text, "text/plain")
+
+
+def test_chunk_with_only_parsed_values_is_self_sufficient():
+    local = extract_local(_chunk(_DATA))
+    assert {"d2_voltage", "d1_power", "d6_protection"} <= local.covered
+    assert local.self_sufficient(_chunk(_DATA))
+
+
+def test_checklist_text_without_numbers_needs_model():
+    text = _DATA + "Система заземления TN-S\nТребования к фундаменту — по чертежу\n"
+    local = extract_local(_chunk(text))
+    assert {"d7_grounding", "c2_foundation"} <= set(local.other_fields)
+    assert not local.self_sufficient(_chunk(text))
@@ -0,0 +1,69 @@
+"""Тесты полнотекстового индекса страниц (processing.page_index)."""
+
+import time
+
+from chunking.chunk_manager import Chunk
+from processing.page_index import PageIndex, match_query
+from scanner.folder_scanner import ScannedFile
+
+
+def _index(tmp_path):
+    index = PageIndex(tmp_path / "index.db", max_age_days=0)
+    index.add_document("fp-passport", "passport.pdf", {
+        1: "Паспорт станка CTX 450",
+        2: "Напряжение питания 400 В, частота 50 Гц",
+        3: "Масса станка 1200 кг",
+        4: "   ",
+    })
+    index.add_document("fp-manual", "manual.pdf", {12: "Подключить к сети напряжением 400 В"})
+    return index
+
+
+def test_query_escapes_fts_syntax():
+    assert match_query(['напряжение "OR" (x)', "IP54", "IP54"]) == '"напряжение OR x" OR "IP54"'
+    assert match_query(["напряж"], prefix=True) == '"напряж"*'
+    assert match_query(["***"]) == ""
+
+
+def test_search_finds_pages_within_job_documents(tmp_path):
+    index = _index(tmp_path)
+    hits = index.search(["напряжение"], prefix=True)
+    assert {(h.file, h.page) for h in hits} == {("passport.pdf", 2), ("manual.pdf", 12)}
+
+    hits = index.search(["напряжение", "Гц"], fingerprints=["fp-passport"], prefix=True)
+    assert [(h.file, h.page) for h in hits] == [("passport.pdf", 2)]
+    assert "[" in hits[0].snippet
+    assert index.search(["масса"], fingerprints=[]) == []
+
+
+def test_empty_pages_are_not_stored_and_document_is_replaced(tmp_path):
+    index = _index(tmp_path)
+    assert set(index.pages("fp-passport")) == {1, 2, 3}
+    assert index.page_text("fp-passport", 3) == "Масса станка 1200 кг"
+
+    index.add_document("fp-passport", "passport.pdf", {1: "Новый текст"})
+    assert index.pages("fp-passport") == {1: "Новый текст"}
+    assert index.search(["масса"]) == []
+
+
+def test_update_reads_only_new_files(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("Питание 230 В", encoding="utf-8")
+    files = [ScannedFile(path, path.name, "txt", "Текст", path.stat().st_size)]
+    chunks = [Chunk(path.name, "Документ", "Текст", None, None, "Питание 230 В", "text/plain")]
+    index = PageIndex(tmp_path / "index.db", max_age_days=0)
+
+    fingerprints, indexed = index.update(files, chunks)
+    assert indexed == 1
+    assert index.pages(fingerprints["notes.txt"]) == {None: "Питание 230 В"}
+    assert index.update(files, chunks) == (fingerprints, 0)
+
+
+def test_prune_removes_unused_documents(tmp_path):
+    index = _index(tmp_path)
+    with index._lock:
+        index._conn.execute("UPDATE documents SET used = ? WHERE fingerprint = 'fp-manual'",
+                            (time.time() - 100 * 86400,))
+    assert index.prune(90) == 1
+    assert not index.has("fp-manual") and index.has("fp-passport")
+    assert index.pages("fp-manual") == {}
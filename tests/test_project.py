@@ -0,0 +1,41 @@
+"""Тесты повторного анализа проекта карточки (processing.project)."""
+
+from config import DEFAULT_CONFIG
+from processing.project import ProjectState, analysis_version
+from scanner.folder_scanner import ScannedFile
+
+
+def _saved_project(tmp_path, model, version):
+    path = tmp_path / "passport.txt"
+    path.write_text("Напряжение 400 В", encoding="utf-8")
+    files = [ScannedFile(path, path.name, "txt", "Текст", path.stat().st_size)]
+    project = ProjectState(tmp_path / "project")
+    project.save(files, 10, 2, [], {}, None, None, {}, model, version)
+    return ProjectState(tmp_path / "project").load(), files
+
+
+def test_unchanged_project_reuses_files(tmp_path):
+    version = analysis_version(DEFAULT_CONFIG)
+    project, files = _saved_project(tmp_path, "flash → pro", version)
+
+    delta = project.delta(files, 10, 2, "flash → pro", version)
+    assert delta.kept == ["passport.txt"]
+    assert not delta.stale
+
+
+def test_other_model_means_full_rerun(tmp_path):
+    version = analysis_version(DEFAULT_CONFIG)
+    project, files = _saved_project(tmp_path, "flash → pro", version)
+
+    delta = project.delta(files, 10, 2, "pro", version)
+    assert delta.added == ["passport.txt"]
+    assert delta.stale
+
+
+def test_other_extraction_settings_mean_full_rerun(tmp_path):
+    project, files = _saved_project(tmp_path, "pro", analysis_version(DEFAULT_CONFIG))
+    version = analysis_version({**DEFAULT_CONFIG, "local_extraction": "off"})
+
+    delta = project.delta(files, 10, 2, "pro", version)
+    assert delta.added == ["passport.txt"]
+    assert delta.stale
@@ -0,0 +1,87 @@
+"""Тесты общего планировщика запросов (gemini.quota)."""
+
+import asyncio
+import time
+
+from gemini.quota import PRIORITY_BATCH, PRIORITY_INTERACTIVE, RequestScheduler, is_rate_limited
+
+
+async def _serve_in_order(scheduler: RequestScheduler, holder, requests) -> list[str]:
+    """Пока holder держит единственный слот, поставить запросы в очередь; вернуть порядок выдачи."""
+    served: list[str] = []
+
+    async def request(job):
+        async with scheduler.aslot(job):
+            served.append(job.name)
+            await asyncio.sleep(0)
+
+    await scheduler.acquire_async(holder)
+    tasks = []
+    for job in requests:
+        tasks.append(asyncio.create_task(request(job)))
+        await asyncio.sleep(0)  # Заявки встают в очередь в порядке списка
+    scheduler.release(holder)
+    await asyncio.gather(*tasks)
+    return served
+
+
+def test_interactive_job_is_served_before_batch():
+    scheduler = RequestScheduler(max_concurrency=1)
+    holder = scheduler.register("holder", PRIORITY_BATCH)
+    batch = scheduler.register("batch", PRIORITY_BATCH)
+    interactive = scheduler.register("gui", PRIORITY_INTERACTIVE)
+
+    served = asyncio.run(_serve_in_order(scheduler, holder, [batch, batch, interactive]))
+    assert served == ["gui", "batch", "batch"]
+
+
+def test_fair_share_within_priority_class():
+    scheduler = RequestScheduler(max_concurrency=1)
+    busy = scheduler.register("busy", PRIORITY_BATCH)
+    other = scheduler.register("other", PRIORITY_BATCH)
+
+    # Задание, только что получившее слот, уступает ждущему заданию того же класса
+    served = asyncio.run(_serve_in_order(scheduler, busy, [busy, busy, other]))
+    assert served == ["other", "busy", "busy"]
+    assert busy.requests == 3 and other.requests == 1
+    assert busy.in_flight == 0 and other.in_flight == 0
+
+
+def test_backoff_pauses_all_jobs():
+    scheduler = RequestScheduler(max_concurrency=2)
+    job = scheduler.register("job")
+    scheduler.backoff(0.1)
+    started = time.monotonic()
+    with scheduler.slot(job):
+        waited = time.monotonic() - started
+    assert waited >= 0.09
+    assert job.waited_seconds >= 0.09
+
+
+def test_cancelled_waiter_does_not_hold_the_queue():
+    scheduler = RequestScheduler(max_concurrency=1)
+    holder = scheduler.register("holder")
+    cancelled = scheduler.register("cancelled")
+    next_job = scheduler.register("next")
+
+    async def scenario():
+        await scheduler.acquire_async(holder)
+        waiter = asyncio.create_task(scheduler.acquire_async(cancelled))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release(holder)
+        await asyncio.wait_for(scheduler.acquire_async(next_job), 1)
+        scheduler.release(next_job)
+
+    asyncio.run(scenario())
+    assert cancelled.requests == 0 and next_job.requests == 1
+
+
+def test_rate_limit_detection():
+    class _Error(Exception):
+        code = 429
+
+    assert is_rate_limited(_Error("quota"))
+    assert is_rate_limited(Exception("RESOURCE_EXHAUSTED: quota exceeded"))
+    assert not is_rate_limited(Exception("503 UNAVAILABLE"))
@@ -0,0 +1,66 @@
+"""Тесты локальной проверки цитат по текстовому слою (processing.quote_check)."""
+
+from gemini.schema import ConflictEntry, ExtractedValue, SourceRef
+from processing.page_text import PageTextStore
+from processing.quote_check import (
+    CONFIRMED, MOVED, NOT_FOUND, UNVERIFIABLE, check_value, needs_model_check, quote_score, verify_quotes,
+)
+
+
+def _store():
+    store = PageTextStore()
+    store.add("passport.pdf", 1, "Паспорт станка. Модель CTX 450.")
+    store.add("passport.pdf", 2, "Технические данные.\nНапряжение питания: 400 В, 50 Гц.")
+    store.add("passport.pdf", 3, "Масса станка 1200 кг.")
+    return store
+
+
+def _value(value, quote, page, file="passport.pdf"):
+    return ExtractedValue(value=value, source=SourceRef(file=file, page=page, quote=quote, confidence="high"))
+
+
+def test_quote_on_stated_page_is_confirmed():
+    check = check_value("d2_voltage", _value("400 В", "Напряжение питания: 400 В", 2), _store())
+    assert check.status == CONFIRMED and check.page == 2 and check.confirmed
+
+
+def test_quote_on_neighbouring_page_moves_page():
+    resolved = {"b3_weight": _value("1200 кг", "Масса станка 1200 кг", 1)}
+    checks = verify_quotes(resolved, _store())
+    assert checks["b3_weight"].status == MOVED
+    assert resolved["b3_weight"].source.page == 3
+
+
+def test_ocr_noise_matches_fuzzily_but_numbers_must_be_on_page():
+    store = _store()
+    # Похожие латинские буквы и лишние пробелы — совпадение
+    noisy = _value("400 В", "Hапряжение  питaния: 400 B", 2)
+    assert check_value("d2_voltage", noisy, store).status == CONFIRMED
+    # Цитата найдена, но числа значения на странице нет
+    wrong_number = _value("380 В", "Напряжение питания: 400 В", 2)
+    assert check_value("d2_voltage", wrong_number, store).status == NOT_FOUND
+    assert quote_score("", "текст") == 0.0
+
+
+def test_not_found_lowers_confidence_and_needs_model_check():
+    resolved = {"a2_model": _value("CTX 999", "Модель CTX 999", 1)}
+    checks = verify_quotes(resolved, _store())
+    value = resolved["a2_model"]
+    assert checks["a2_model"].status == NOT_FOUND
+    assert value.source.confidence == "medium"
+    assert "[ЦИТАТА НЕ НАЙДЕНА]" in value.note
+    assert needs_model_check(value, checks["a2_model"])
+
+
+def test_unverifiable_without_quote_or_text_layer():
+    store = _store()
+    assert check_value("a1_name", _value("Станок", "", 1), store).status == UNVERIFIABLE
+    assert check_value("a1_name", _value("Станок", "Станок", 1, file="scan.png"), store).status == UNVERIFIABLE
+
+
+def test_confirmed_value_with_conflict_still_needs_model_check():
+    value = _value("400 В", "Напряжение питания: 400 В", 2)
+    check = check_value("d2_voltage", value, _store())
+    assert not needs_model_check(value, check)
+    value.conflict_values = [ConflictEntry(value="380 В", source=SourceRef(file="manual.pdf", page=5))]
+    assert needs_model_check(value, check)
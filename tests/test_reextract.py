@@ -0,0 +1,51 @@
+"""Тесты замены групп после повторного извлечения (gemini.client)."""
+
+from chunking.chunk_manager import Chunk
+from gemini.client import _replace_group_values
+from gemini.schema import ChunkExtraction, ExtractedValue, SourceRef
+
+
+def _chunk(start, end, name="passport.pdf"):
+    return Chunk(name, "Паспорт", "PDF", start, end, b"", "application/pdf")
+
+
+def _value(value, page=1):
+    return ExtractedValue(value=value, source=SourceRef(page=page, quote=value))
+
+
+def test_fresh_values_replace_group_in_same_part():
+    part = _chunk(1, 7)
+    results = [(part, ChunkExtraction(a1_name=_value("Станок"), d2_voltage=_value("220 В")))]
+    fresh = [(_chunk(1, 7), ChunkExtraction(d2_voltage=_value("400 В", page=3)))]
+
+    merged = _replace_group_values(results, fresh, {"d2_voltage", "d1_power"})
+
+    assert len(merged) == 1
+    extraction = merged[0][1]
+    assert extraction.a1_name.value == "Станок"
+    assert extraction.d2_voltage.value == "400 В"
+    assert extraction.d2_voltage.source.page == 3
+
+
+def test_resplit_fresh_values_go_to_part_with_their_page():
+    first, second = _chunk(1, 4), _chunk(5, 8)
+    results = [(first, ChunkExtraction(d1_power=_value("5 кВт"))), (second, ChunkExtraction())]
+    # Повтор обработал чанк целиком: страница 6 чанка — вторая страница второй части
+    fresh = [(_chunk(1, 8), ChunkExtraction(d1_power=_value("7,5 кВт", page=6)))]
+
+    merged = _replace_group_values(results, fresh, {"d1_power"})
+
+    assert [part for part, _ in merged] == [first, second]
+    assert merged[0][1].d1_power is None
+    assert merged[1][1].d1_power.value == "7,5 кВт"
+    assert merged[1][1].d1_power.source.page == 2
+
+
+def test_cleared_group_when_fresh_has_no_value():
+    part = _chunk(1, 7)
+    results = [(part, ChunkExtraction(d2_voltage=_value("220 В")))]
+
+    merged = _replace_group_values(results, [(part, ChunkExtraction())], {"d2_voltage"})
+
+    assert len(merged) == 1
+    assert merged[0][1].d2_voltage is None
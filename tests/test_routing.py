@@ -0,0 +1,40 @@
+"""Тесты маршрутизации моделей при обрезанном ответе (gemini.client)."""
+
+import asyncio
+
+from chunking.chunk_manager import Chunk
+from gemini.client import GeminiClient
+from gemini.routing import ModelRouter
+from gemini.schema import ChunkExtraction, ExtractedValue, SourceRef
+
+
+class _FakeClient(GeminiClient):
+    """Быстрая модель обрезает ответ, сильная отвечает."""
+
+    def __init__(self):
+        super().__init__("test-key", model="strong",
+                         router=ModelRouter(fast_model="fast", strong_model="strong"))
+        self.calls: list[tuple[str, str]] = []
+
+    async def extract_from_chunk(self, chunk, equipment_context="", groups=None, model=None,
+                                 skip_fields=None, fields=None):
+        self.calls.append((model, chunk.page_range_display))
+        self.last_error = ""
+        self.last_error_kind = ""
+        self.last_truncated = model == "fast"
+        if self.last_truncated:
+            return None
+        value = ExtractedValue(value="400 В", source=SourceRef(page=1, quote="400 В"))
+        return ChunkExtraction(d2_voltage=value)
+
+
+def test_truncated_fast_pass_escalates_without_resplitting():
+    client = _FakeClient()
+    chunk = Chunk("passport.pdf", "Паспорт", "PDF", 1, 8, b"", "application/pdf")
+
+    results = asyncio.run(client.extract_chunk(chunk))
+
+    assert client.calls == [("fast", chunk.page_range_display), ("strong", chunk.page_range_display)]
+    assert [part for part, _ in results] == [chunk]
+    assert client.router.decisions[-1].escalated
+    assert "обрезан" in client.router.decisions[-1].reason
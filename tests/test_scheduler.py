@@ -0,0 +1,31 @@
+"""Тесты порядка обработки чанков (processing.scheduler)."""
+
+from chunking.chunk_manager import Chunk
+from processing.scheduler import density_score, order_chunks
+
+
+def _chunk(source_type="Руководство", start=1, total=20, text="Общие сведения о станке."):
+    return Chunk("doc.txt", source_type, "Текст", start, start, text, "text/plain", total_pages=total)
+
+
+def test_passport_goes_before_manual():
+    chunks = [_chunk("Руководство"), _chunk("Документ"), _chunk("Паспорт")]
+    assert order_chunks(chunks) == [2, 0, 1]
+
+
+def test_first_pages_go_before_tail():
+    chunks = [_chunk(start=18), _chunk(start=1), _chunk(start=10)]
+    assert order_chunks(chunks) == [1, 2, 0]
+
+
+def test_dense_technical_page_goes_first_within_document():
+    dense = "Напряжение 400 В, 50 Гц, мощность 7,5 кВт, масса 1200 кг, габариты 2000 мм, IP54. " * 4
+    chunks = [_chunk(start=2), _chunk(start=3, text=dense)]
+    assert density_score(chunks[1]) > density_score(chunks[0])
+    assert order_chunks(chunks) == [1, 0]
+
+
+def test_unknown_density_and_ties_keep_original_order():
+    scans = [Chunk("scan.png", "Документ", "Изображение", None, None, b"", "image/png") for _ in range(3)]
+    assert density_score(scans[0]) is None
+    assert order_chunks(scans) == [0, 1, 2]
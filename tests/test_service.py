@@ -0,0 +1,36 @@
+"""Тесты сервиса заданий (service.server)."""
+
+from pipeline import PipelineResult
+from service import server
+
+
+def test_uploads_with_same_safe_name_are_kept(tmp_path):
+    jobs = server.JobService(tmp_path, config={})
+    job = jobs.submit("станок", [("a/passport.pdf", b"1"), ("b\\passport.pdf", b"2"),
+                                 ("PASSPORT.pdf", b"3")])
+
+    input_dir = jobs.job_dir(job.id) / "input"
+    contents = {p.name: p.read_bytes() for p in input_dir.iterdir()}
+    assert contents == {"passport.pdf": b"1", "passport (2).pdf": b"2", "PASSPORT (3).pdf": b"3"}
+
+
+def test_service_jobs_do_not_keep_card_projects(tmp_path, monkeypatch):
+    created = []
+
+    class _Pipeline:
+        cancelled = False
+
+        def __init__(self, files, output_path, **kwargs):
+            created.append(kwargs)
+
+        def run(self):
+            return PipelineResult(False, "", "проверка")
+
+    monkeypatch.setattr(server, "Pipeline", _Pipeline)
+    jobs = server.JobService(tmp_path, config={"incremental_projects": True})
+    jobs.submit("станок", [("spec.txt", "Напряжение 400 В".encode("utf-8"))])
+
+    jobs._run(jobs.store.claim_next(jobs.node_id))
+
+    assert created[0]["incremental"] is False
+    assert created[0]["config"]["incremental_projects"] is False
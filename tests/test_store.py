@@ -0,0 +1,68 @@
+"""Тесты аренды заданий в общей базе несколькими процессами (service.store)."""
+
+import multiprocessing
+import time
+
+from service.store import DONE, RUNNING, JobStore
+
+
+def _worker(db_path, owner, lease_seconds, finish, claimed):
+    """Процесс-узел: забирает задания, пока очередь не опустеет."""
+    store = JobStore(db_path, lease_seconds=lease_seconds)
+    while True:
+        job = store.claim_next(owner)
+        if job is None:
+            break
+        claimed.put((job.id, owner))
+        time.sleep(0.01)  # Обработка: другие узлы в это время тоже захватывают
+        if finish:
+            store.finish(job.id, owner, DONE)
+
+
+def _run_workers(db_path, owners, lease_seconds=60.0, finish=True):
+    context = multiprocessing.get_context("spawn")
+    claimed = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(db_path, owner, lease_seconds, finish, claimed))
+        for owner in owners
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+    result = []
+    while not claimed.empty():
+        result.append(claimed.get())
+    return result
+
+
+def test_each_job_is_leased_exactly_once(tmp_path):
+    db_path = tmp_path / "jobs.db"
+    store = JobStore(db_path)
+    job_ids = [store.create(f"станок {n}").id for n in range(30)]
+
+    claimed = _run_workers(db_path, ["node-1", "node-2", "node-3"])
+
+    assert sorted(job_id for job_id, _ in claimed) == sorted(job_ids)
+    assert all(store.get(job_id).status == DONE for job_id in job_ids)
+    assert all(store.get(job_id).attempts == 1 for job_id in job_ids)
+
+
+def test_expired_lease_is_taken_back(tmp_path):
+    db_path = tmp_path / "jobs.db"
+    store = JobStore(db_path)
+    job_id = store.create("станок").id
+
+    # Узел взял задание и «упал»: итог не записан, аренда не продлевается
+    assert _run_workers(db_path, ["crashed"], lease_seconds=0.3, finish=False) == [(job_id, "crashed")]
+    assert store.get(job_id).status == RUNNING
+    time.sleep(0.4)
+
+    claimed = _run_workers(db_path, ["node-1", "node-2"])
+
+    assert len(claimed) == 1 and claimed[0][0] == job_id
+    job = store.get(job_id)
+    assert job.status == DONE
+    assert job.owner == claimed[0][1]
+    assert job.attempts == 2
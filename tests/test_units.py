@@ -0,0 +1,33 @@
+"""Тесты сравнения значений с единицами измерения (processing.units)."""
+
+import pytest
+
+from processing.units import same_value
+
+
+@pytest.mark.parametrize("a, b", [
+    ("400 В", "0,4 кВ"),
+    ("50 Гц, 400 В", "400 V, 50 Hz"),
+    ("2500 × 1800 × 2100 мм", "2,5 x 1,8 x 2,1 м"),
+    ("7,5 кВт", "7500 Вт"),
+    ("IP54, 400 В", "IP54, 0,4 кВ"),
+    ("от −5 до +40 °C", "от -5 до 40 °C"),
+    ("Класс 0,5, 24 В", "Класс 0.5, 24 В"),
+])
+def test_same_quantities_match(a, b):
+    assert same_value(a, b)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("IP54, 400 В", "IP55, 400 В"),
+    ("Класс 1, 24 В", "Класс 2, 24 В"),
+    ("М20, 10 кВт", "М24, 10 кВт"),
+    ("24 В пост. тока", "24 В перем. тока"),
+    ("2500 × 1800 × 2100 мм", "1800 × 2500 × 2100 мм"),
+    ("IP54", "IP55"),
+    ("от -5 до +40 °C", "от 5 до +40 °C"),
+    ("Класс 0,5, 24 В", "Класс 5, 24 В"),
+    ("Класс 0,5, 24 В", "Класс 0,6, 24 В"),
+])
+def test_different_values_do_not_match(a, b):
+    assert not same_value(a, b)
@@ -0,0 +1,83 @@
+"""Тесты компактного формата обмена (gemini.wire), разбора ответа и учёта токенов."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from gemini.client import STAGE_EXTRACTION, STAGE_VERIFICATION, GeminiClient
+from gemini.json_salvage import salvage_json
+from gemini.schema import ChunkExtraction, ExtractedValue, SourceRef
+from gemini.wire import decode_extraction, encode_extraction, encode_resolved
+
+
+def _value(value, page=1, confidence="high", file=""):
+    return ExtractedValue(value=value, source=SourceRef(page=page, quote=value, confidence=confidence,
+                                                        file=file))
+
+
+def test_compact_extraction_round_trip():
+    extraction = ChunkExtraction(
+        a1_name=_value("Станок", page=1),
+        d2_voltage=_value("400 В", page=12, confidence="medium"),
+    )
+    compact = encode_extraction(extraction)
+    assert set(compact) == {"A.1", "D.2"}
+    assert compact["D.2"]["c"] == "m"
+
+    decoded = ChunkExtraction.model_validate(decode_extraction(compact))
+    assert decoded.a1_name.value == "Станок"
+    assert decoded.d2_voltage.source.page == 12
+    assert decoded.d2_voltage.source.confidence == "medium"
+    assert decoded.b1_dimensions is None
+
+
+def test_decoder_accepts_verbose_and_list_forms():
+    verbose = {"a1_name": {"value": "Станок", "source": {"page": 3}}}
+    assert decode_extraction(verbose)["a1_name"]["source"]["page"] == 3
+
+    listed = [{"param_id": "A.1", "v": "Станок", "p": 2}, {"param_id": "Z.9", "v": "?"}]
+    assert decode_extraction(listed) == {"a1_name": {"value": "Станок", "source": {"page": 2}}}
+
+
+def test_resolved_encoding_lists_missing_and_confirmed():
+    resolved = {"a1_name": _value("Станок", file="passport.pdf"),
+                "d2_voltage": _value("400 В", file="passport.pdf")}
+    data = json.loads(encode_resolved(resolved, confirmed={"a1_name"}))
+    assert data["ok"] == {"A.1": "Станок"}
+    assert data["val"]["D.2"]["f"] == 0
+    assert data["src"] == ["passport.pdf"]
+    assert "A.1" not in data["missing"] and "B.1" in data["missing"]
+
+
+def test_salvage_repairs_fenced_and_truncated_json():
+    fenced = salvage_json('Ответ:\n```json\n{"A.1": {"v": "Станок",},}\n```')
+    assert fenced.data == {"A.1": {"v": "Станок"}}
+    assert fenced.repairs
+
+    truncated = salvage_json('{"A.1": {"v": "Станок"}, "D.2": {"v": "40')
+    assert truncated.data == {"A.1": {"v": "Станок"}}
+
+
+def test_usage_is_measured_per_stage():
+    client = GeminiClient("test-key")
+
+    def response(prompt_tokens, output_tokens):
+        meta = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=output_tokens)
+        return SimpleNamespace(text="{}", candidates=[], usage_metadata=meta)
+
+    responses = iter([response(1000, 80), response(1200, 100), response(3000, 200)])
+
+    async def generate_content(**kwargs):
+        return next(responses)
+
+    client.client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+
+    async def job():
+        await client._call_with_retry("system", [], "model")
+        await client._call_with_retry("system", [], "model")
+        await client._call_with_retry("system", [], "model", stage=STAGE_VERIFICATION)
+
+    asyncio.run(job())
+    assert client.usage == {"calls": 3, "input_tokens": 5200, "output_tokens": 380}
+    assert client.usage_by_stage[STAGE_EXTRACTION] == {"calls": 2, "input_tokens": 2200, "output_tokens": 180}
+    assert client.usage_by_stage[STAGE_VERIFICATION] == {"calls": 1, "input_tokens": 3000, "output_tokens": 200}